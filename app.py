@@ -6,13 +6,33 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime, timedelta
-from plotly.subplots import make_subplots
+import os
+import sys
+import uuid
 import warnings
+from warroom.alerts import BASELINE_WEEKS, LEVEL_HIGH, LEVEL_LOW, LEVEL_MEDIUM, METRIC_LABELS, Z_HIGH, Z_MEDIUM, AlertEngine
+from warroom.analyzers import PriceElasticityAnalyzer
+from warroom.backends import make_backend
+from warroom.engine import day_over_day, hot_products, latest_kpis, sales_rank
+from warroom.forecast import FORECAST_MODELS_PATH, SalesForecaster
+from warroom.ingest import IncrementalIngestor
+from warroom.lazy import LazyModule
+from warroom.live import LiveMonitor, make_feed
+from warroom.paging import DEFAULT_POINT_BUDGET, downsample, page_count, page_order, take_page
+from warroom.pricing import optimize_catalog
+from warroom.profiling import DEFAULT_LOG_PATH, MAX_LOG_BYTES, PerfLog, Profiler
+from warroom.result_cache import ResultCache, normalize_filter
+from warroom.sqlite_backend import DEFAULT_DB_PATH
+from warroom.store import DATA_SOURCES
+from warroom.warm_start import WARM_START_PATH, DeferredBackend, WarmStart, snapshot_fingerprint
 warnings.filterwarnings('ignore')
 
+# 图表库在第一次绘图时才导入
+px = LazyModule('plotly.express')
+go = LazyModule('plotly.graph_objects')
+plotly_subplots = LazyModule('plotly.subplots')
+
 # ========== 页面配置 ==========
 st.set_page_config(
     page_title="跨境电商大促智能作战室",
@@ -116,124 +136,172 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # ========== 数据加载函数 ==========
-@st.cache_data
+# 数据后端: memory(默认，进程内索引) 或 sqlite(筛选与分组下推到本地SQLite文件，多进程共用)
+BACKEND = os.environ.get('WARROOM_BACKEND', 'memory')
+
+# 产品数据流式接入: 分块读取并汇总进排行索引，不在内存中保留产品明细(memory 后端)
+STREAM_PRODUCTS = os.environ.get('WARROOM_STREAM_PRODUCTS') == '1'
+
+@st.cache_resource
+def get_backend():
+    """进程内共享的数据后端，首次加载时并行读取各数据源(WARROOM_LOAD_WORKERS=1 为依次读取)"""
+    if BACKEND == 'sqlite':
+        return make_backend('sqlite', db_path=os.environ.get('WARROOM_SQLITE_PATH', DEFAULT_DB_PATH))
+    ingestor = IncrementalIngestor(
+        load_workers=int(os.environ.get('WARROOM_LOAD_WORKERS', 0)) or None,
+        streaming=('product',) if STREAM_PRODUCTS else ()
+    )
+    return make_backend('memory', ingestor=ingestor)
+
+@st.cache_resource
+def get_result_cache():
+    """各标签页、各会话共用的结果缓存"""
+    return ResultCache()
+
+@st.cache_resource
+def get_perf_log():
+    """各会话共用的性能日志，默认写入 perf_log.jsonl
+
+    环境变量 WARROOM_PERF_LOG 可改为其他路径，设为空时不写文件；
+    WARROOM_PERF_LOG_MAX_MB 为轮转前的大小上限
+    """
+    max_mb = os.environ.get('WARROOM_PERF_LOG_MAX_MB')
+    return PerfLog(
+        os.environ.get('WARROOM_PERF_LOG', DEFAULT_LOG_PATH),
+        max_bytes=int(float(max_mb) * 1024 * 1024) if max_mb else MAX_LOG_BYTES,
+    )
+
+@st.cache_resource
+def get_live_monitor():
+    """各会话共用的实时KPI监控
+
+    数据流由 WARROOM_LIVE_SOURCES 指定(逗号分隔，file:<路径> 或 socket:<主机>:<端口>)，
+    默认跟踪销售数据文件的追加写入
+    """
+    specs = os.environ.get('WARROOM_LIVE_SOURCES', f"file:{DATA_SOURCES['sales']}")
+    return LiveMonitor(make_feed(spec.strip()) for spec in specs.split(',') if spec.strip())
+
+@st.cache_resource
+def get_warm_start():
+    """默认视图的预热快照，环境变量 WARROOM_WARM_START 为空时不使用快照"""
+    warm_start = WarmStart(os.environ.get('WARROOM_WARM_START', WARM_START_PATH))
+    seeded = warm_start.seed(get_result_cache())
+    if seeded:
+        print(f"🔥 已载入预热快照 ({seeded} 项)，数据在后台加载")
+    return warm_start
+
+@st.cache_resource
+def get_alert_engine():
+    """各会话共用的异常预警统计量，随数据版本增量更新"""
+    return AlertEngine()
+
+@st.cache_resource
+def get_forecaster():
+    """各会话共用的销售预测模型，WARROOM_FORECAST_MODELS 为空时不保存拟合好的模型
+
+    需要重新拟合的序列较多时用进程池，进程数由 WARROOM_FORECAST_WORKERS 指定，默认取CPU数
+    """
+    return SalesForecaster(os.environ.get('WARROOM_FORECAST_MODELS', FORECAST_MODELS_PATH),
+                           workers=int(os.environ.get('WARROOM_FORECAST_WORKERS', 0)) or None)
+
+@st.cache_resource
+def get_startup_report():
+    """进程启动后第一次完整重跑的计时，冷启动报告"""
+    return {}
+
+@st.cache_resource(max_entries=1)
+def get_ab_analyzer(ab_version):
+    """A/B测试分析器，所有实验的结果表在同一数据版本内只计算一次"""
+    return get_backend().ab_analyzer()
+
+@st.cache_resource(max_entries=1)
+def get_price_analyzer(elasticity_version):
+    """价格弹性分析器，全品目弹性表在同一数据版本内只计算一次"""
+    return PriceElasticityAnalyzer(get_backend().elasticity_data())
+
+@st.cache_resource(max_entries=1)
+def get_price_optimization(elasticity_version):
+    """全品目最优价格及自助法置信区间，在同一数据版本内只计算一次
+
+    进程池的进程数由 WARROOM_PRICE_WORKERS 指定，默认取CPU数
+    """
+    return optimize_catalog(get_backend().elasticity_data(),
+                            workers=int(os.environ.get('WARROOM_PRICE_WORKERS', 0)) or None)
+
 def load_data_from_files():
-    """从第一步生成的文件中加载数据"""
+    """从第一步生成的文件中加载数据，之后只同步文件末尾新追加的行，返回 (数据后端, 数据版本)"""
     try:
-        print("📂 正在加载数据文件...")
+        backend = get_backend()
+        warm_start = get_warm_start()
+        first_load = not backend.loaded
+        
+        # 有可用的预热快照时首屏直接用快照，首次加载在后台进行
+        if warm_start.snapshot is not None and (first_load or warm_start.loading):
+            if first_load and not warm_start.loading:
+                print(f"📂 正在后台加载数据文件... (后端: {BACKEND})")
+            return warm_start.load_in_background(backend), warm_start.snapshot['data_version']
         
-        # 加载数据
-        df = pd.read_csv('test_sales_data.csv')
-        product_df = pd.read_csv('test_product_data.csv')
-        ab_df = pd.read_csv('test_ab_data.csv')
-        elasticity_df = pd.read_csv('test_elasticity_data.csv')
+        if first_load:
+            print(f"📂 正在加载数据文件... (后端: {BACKEND})")
         
-        # 确保日期列是日期类型
-        df['date'] = pd.to_datetime(df['date'])
-        product_df['date'] = pd.to_datetime(product_df['date'])
-        ab_df['date'] = pd.to_datetime(ab_df['date'])
-        elasticity_df['date'] = pd.to_datetime(elasticity_df['date'])
+        # 首次读取全部数据，之后只读取CSV新增的行；指纹在刷新前取得
+        fingerprint = snapshot_fingerprint()
+        changes = backend.refresh()
+        data_version = backend.version
+        warm_start.ensure_current(backend, fingerprint)
         
-        print(f"✅ 数据加载完成:")
-        print(f"   销售数据: {len(df):,} 行")
-        print(f"   产品数据: {len(product_df):,} 行")
-        print(f"   A/B测试数据: {len(ab_df):,} 行")
-        print(f"   价格弹性数据: {len(elasticity_df):,} 行")
+        if first_load:
+            report = backend.load_report
+            print(f"✅ 数据加载完成 ({report['seconds']:.2f} 秒, {report['workers']} 个线程):")
+            print(f"   销售数据: {backend.source_version('sales')[1]:,} 行")
+            print(f"   产品数据: {backend.source_version('product')[1]:,} 行" + (" (流式汇总)" if STREAM_PRODUCTS else ""))
+            print(f"   A/B测试数据: {backend.source_version('ab')[1]:,} 行")
+            print(f"   价格弹性数据: {backend.source_version('elasticity')[1]:,} 行")
+        elif changes:
+            print(f"🔄 增量数据: {changes}")
         
-        return df, product_df, ab_df, elasticity_df
+        return backend, data_version
         
     except FileNotFoundError as e:
+        get_backend.clear()
         st.error(f"❌ 找不到数据文件: {e}")
         st.info("请先运行第一步的代码生成数据文件")
-        return None, None, None, None
-
-# ========== 分析器类 ==========
-class ABTestAnalyzer:
-    """A/B测试分析器"""
-    
-    def __init__(self, ab_data):
-        self.ab_data = ab_data
-    
-    def analyze_experiment(self, experiment_name):
-        """分析特定实验"""
-        exp_data = self.ab_data[self.ab_data['experiment'] == experiment_name]
-        
-        if exp_data.empty:
-            return None
-        
-        results = {}
-        variants = exp_data['variant'].unique()
-        
-        for variant in variants:
-            variant_data = exp_data[exp_data['variant'] == variant]
-            results[variant] = {
-                'avg_conversion': variant_data['conversion_rate'].mean(),
-                'total_visitors': variant_data['visitors'].sum(),
-                'total_conversions': variant_data['conversions'].sum(),
-                'total_revenue': variant_data['revenue'].sum(),
-                'std_conversion': variant_data['conversion_rate'].std()
-            }
-        
-        return results
-
-class PriceElasticityAnalyzer:
-    """价格弹性分析器"""
-    
-    def __init__(self, elasticity_data):
-        self.elasticity_data = elasticity_data
-    
-    def analyze_product_elasticity(self, product_name):
-        """分析单个产品的价格弹性"""
-        product_data = self.elasticity_data[self.elasticity_data['product'] == product_name]
-        
-        if product_data.empty:
-            return None
-        
-        # 按价格分组
-        price_groups = product_data.groupby('price_multiplier').agg({
-            'sales': 'mean',
-            'demand': 'mean'
-        }).reset_index()
-        
-        # 计算价格弹性
-        elasticities = []
-        for i in range(1, len(price_groups)):
-            price_change = (price_groups.iloc[i]['price_multiplier'] - 
-                          price_groups.iloc[i-1]['price_multiplier']) / price_groups.iloc[i-1]['price_multiplier']
-            demand_change = (price_groups.iloc[i]['demand'] - 
-                           price_groups.iloc[i-1]['demand']) / price_groups.iloc[i-1]['demand']
-            
-            if price_change != 0:
-                elasticity = demand_change / price_change
-                elasticities.append(elasticity)
-        
-        avg_elasticity = np.mean(elasticities) if elasticities else 0
-        
-        # 推荐最优价格
-        optimal_price_idx = price_groups['sales'].idxmax()
-        optimal_price_multiplier = price_groups.loc[optimal_price_idx, 'price_multiplier']
-        
-        return {
-            'price_groups': price_groups,
-            'avg_elasticity': avg_elasticity,
-            'optimal_price_multiplier': optimal_price_multiplier,
-            'is_elastic': abs(avg_elasticity) > 1
-        }
+        return None, None
 
 # ========== 主程序开始 ==========
 st.title("🚀 跨境电商春季大促智能作战室")
 st.markdown("---")
 
+# 每个会话一个计时器，记录本次重跑各段耗时
+if 'profiler' not in st.session_state:
+    st.session_state.profiler = Profiler(uuid.uuid4().hex[:8], get_perf_log(), get_result_cache())
+profiler = st.session_state.profiler
+profiler.begin()
+
 # 加载数据
-with st.spinner("正在加载数据..."):
-    df, product_df, ab_df, elasticity_df = load_data_from_files()
+with profiler.span('load'), st.spinner("正在加载数据..."):
+    backend, data_version = load_data_from_files()
 
-if df is None:
+if backend is None:
     st.stop()
 
-# 初始化分析器
-ab_analyzer = ABTestAnalyzer(ab_df)
-price_analyzer = PriceElasticityAnalyzer(elasticity_df)
+# 本次重跑是否由预热快照回答(数据仍在后台加载)
+served_from_snapshot = isinstance(backend, DeferredBackend)
+
+result_cache = get_result_cache()
+
+def cached(name, compute, params=()):
+    """按数据版本和参数缓存派生结果"""
+    missed = []
+    def compute_and_count():
+        missed.append(True)
+        return compute()
+    value = result_cache.get_or_compute(name, data_version, params, compute_and_count)
+    profiler.count_cache(hit=not missed)
+    return value
+
+# 销售数据概览(日期范围、国家和品类列表)
+overview = cached('overview', lambda: backend.overview())
 
 # ========== 侧边栏配置 ==========
 with st.sidebar:
@@ -241,13 +309,13 @@ with st.sidebar:
     
     # 数据信息
     st.header("📊 数据概览")
-    st.info(f"数据时间范围: {df['date'].min().date()} 至 {df['date'].max().date()}")
-    st.info(f"总数据量: {len(df):,} 条记录")
+    st.info(f"数据时间范围: {overview['min_date'].date()} 至 {overview['max_date'].date()}")
+    st.info(f"总数据量: {overview['rows']:,} 条记录")
     
     # 日期筛选
     st.header("📅 日期筛选")
-    min_date = df['date'].min().date()
-    max_date = df['date'].max().date()
+    min_date = overview['min_date'].date()
+    max_date = overview['max_date'].date()
     date_range = st.date_input(
         "选择日期范围",
         value=(max_date - timedelta(days=7), max_date),
@@ -257,7 +325,7 @@ with st.sidebar:
     
     # 国家筛选
     st.header("🌍 国家筛选")
-    all_countries = df['country'].unique().tolist()
+    all_countries = overview['countries']
     selected_countries = st.multiselect(
         "选择国家",
         options=all_countries,
@@ -266,7 +334,7 @@ with st.sidebar:
     
     # 品类筛选
     st.header("📦 品类筛选")
-    all_categories = df['category'].unique().tolist()
+    all_categories = overview['categories']
     selected_categories = st.multiselect(
         "选择品类",
         options=all_categories,
@@ -276,92 +344,227 @@ with st.sidebar:
     # 显示模式
     st.header("👁️ 显示模式")
     view_mode = st.selectbox("选择显示模式", ["大屏模式", "移动模式", "精简模式"])
+    
+    # 实时模式
+    st.header("📡 实时模式")
+    live_mode = st.toggle("实时刷新KPI", key="live_mode")
+    live_interval = st.number_input(
+        "刷新间隔(秒)",
+        min_value=1,
+        max_value=300,
+        value=int(os.environ.get('WARROOM_LIVE_INTERVAL', 5)),
+        disabled=not live_mode
+    )
+    
+    # 性能调试
+    st.header("🐞 性能调试")
+    show_perf_panel = st.toggle("显示性能调试面板", key="perf_debug")
 
 # ========== 数据筛选 ==========
+# 数据后端各查询共用的筛选条件
 if len(date_range) == 2:
     start_date, end_date = date_range
-    filtered_df = df[
-        (df['date'].dt.date >= start_date) & 
-        (df['date'].dt.date <= end_date) &
-        (df['country'].isin(selected_countries if selected_countries else all_countries)) &
-        (df['category'].isin(selected_categories if selected_categories else all_categories))
-    ]
+    filter_args = dict(
+        start=start_date,
+        end=end_date,
+        countries=selected_countries or None,
+        categories=selected_categories or None
+    )
 else:
-    filtered_df = df
+    filter_args = {}
+
+filter_key = normalize_filter(**filter_args)
 
 # ========== 顶部KPI面板 ==========
 st.markdown("### 📊 实时监控面板")
 
-# 计算核心指标
-latest_date = filtered_df['date'].max()
-today_data = filtered_df[filtered_df['date'] == latest_date]
-yesterday_data = filtered_df[filtered_df['date'] == latest_date - timedelta(days=1)]
+# 按日汇总由数据后端计算，趋势分析标签页也用它
+daily_totals = cached('daily_totals', lambda: backend.by('date', **filter_args), filter_key)
 
-total_sales = today_data['sales_amount'].sum()
-total_orders = today_data['orders'].sum()
-avg_conversion = today_data['conversion_rate'].mean()
-avg_aov = today_data['avg_order_value'].mean()
+# 实时模式下KPI卡片按间隔单独刷新，不重跑整个脚本
+@st.fragment(run_every=live_interval if live_mode else None)
+@profiler.timed('kpi')
+def render_kpi_panel():
+    """顶部KPI卡片: 转化率和客单价按订单/访客加权"""
+    kpis = None
+    if live_mode:
+        # 实时模式: 只把新事件并入累加器，KPI从累加器读取
+        monitor = get_live_monitor()
+        monitor.poll()
+        # 日期选择框的上限是数据集的最后一天，实时事件会越过它；实时模式下不限结束日期
+        latest = monitor.latest(**{**filter_args, 'end': None})
+        if latest is not None:
+            kpis = day_over_day(*latest)
+    if kpis is None:
+        kpis = latest_kpis(daily_totals)
+    if kpis is None:
+        st.info("筛选范围内没有销售数据")
+        return
 
-# 计算增长率
-if not yesterday_data.empty:
-    sales_growth = ((total_sales - yesterday_data['sales_amount'].sum()) / yesterday_data['sales_amount'].sum() * 100) if yesterday_data['sales_amount'].sum() > 0 else 0
-    orders_growth = ((total_orders - yesterday_data['orders'].sum()) / yesterday_data['orders'].sum() * 100) if yesterday_data['orders'].sum() > 0 else 0
-else:
-    sales_growth = 0
-    orders_growth = 0
-
-# 创建KPI卡片
-col1, col2, col3, col4 = st.columns(4)
-
-with col1:
-    st.markdown(f"""
-    <div class='kpi-card'>
-        <h3>💰 今日销售额</h3>
-        <h1>¥{total_sales:,.0f}</h1>
-        <p>📈 较昨日 {sales_growth:+.1f}%</p>
-    </div>
-    """, unsafe_allow_html=True)
-
-with col2:
-    st.markdown(f"""
-    <div class='kpi-card'>
-        <h3>📦 今日订单数</h3>
-        <h1>{total_orders:,}</h1>
-        <p>📈 较昨日 {orders_growth:+.1f}%</p>
-    </div>
-    """, unsafe_allow_html=True)
-
-with col3:
-    st.markdown(f"""
-    <div class='kpi-card'>
-        <h3>🔄 转化率</h3>
-        <h1>{avg_conversion:.2f}%</h1>
-        <p>🎯 行业平均: 3.2%</p>
-    </div>
-    """, unsafe_allow_html=True)
-
-with col4:
-    st.markdown(f"""
-    <div class='kpi-card'>
-        <h3>🎯 平均客单价</h3>
-        <h1>¥{avg_aov:.0f}</h1>
-        <p>📈 较昨日 +5.2%</p>
-    </div>
-    """, unsafe_allow_html=True)
+    total_sales = kpis['total_sales']
+    total_orders = kpis['total_orders']
+    avg_conversion = kpis['conversion']
+    avg_aov = kpis['aov']
+    sales_growth = kpis['sales_growth']
+    orders_growth = kpis['orders_growth']
+    aov_growth = kpis['aov_growth']
+
+    # 创建KPI卡片
+    col1, col2, col3, col4 = st.columns(4)
+
+    with col1:
+        st.markdown(f"""
+        <div class='kpi-card'>
+            <h3>💰 今日销售额</h3>
+            <h1>¥{total_sales:,.0f}</h1>
+            <p>📈 较昨日 {sales_growth:+.1f}%</p>
+        </div>
+        """, unsafe_allow_html=True)
+
+    with col2:
+        st.markdown(f"""
+        <div class='kpi-card'>
+            <h3>📦 今日订单数</h3>
+            <h1>{total_orders:,}</h1>
+            <p>📈 较昨日 {orders_growth:+.1f}%</p>
+        </div>
+        """, unsafe_allow_html=True)
+
+    with col3:
+        st.markdown(f"""
+        <div class='kpi-card'>
+            <h3>🔄 转化率</h3>
+            <h1>{avg_conversion:.2f}%</h1>
+            <p>🎯 行业平均: 3.2%</p>
+        </div>
+        """, unsafe_allow_html=True)
+
+    with col4:
+        st.markdown(f"""
+        <div class='kpi-card'>
+            <h3>🎯 平均客单价</h3>
+            <h1>¥{avg_aov:.0f}</h1>
+            <p>📈 较昨日 {aov_growth:+.1f}%</p>
+        </div>
+        """, unsafe_allow_html=True)
+
+    if live_mode:
+        updated = datetime.fromtimestamp(monitor.last_poll).strftime('%H:%M:%S')
+        st.caption(
+            f"📡 {kpis['date'].date()} · 更新于 {updated} · "
+            f"本次新增 {monitor.last_events:,} 条事件 · 每 {live_interval} 秒刷新 · "
+            + " / ".join(feed.describe() for feed in monitor.feeds)
+        )
+
+render_kpi_panel()
+
+# ========== 异常预警 ==========
+# 预警面板最多列出的条数
+ALERT_LIMIT = 10
+
+def format_metric(metric, value):
+    """预警指标值的显示格式"""
+    if metric == 'sales_amount':
+        return f"¥{value:,.0f}"
+    if metric == 'conversion_rate':
+        return f"{value:.2f}%"
+    return f"{value:,.0f}"
+
+@profiler.timed('alerts')
+def render_alert_panel():
+    """筛选范围最后一天各 国家×品类 序列偏离同星期几基线的预警，按预警分数排序"""
+    if served_from_snapshot:
+        # 预热快照回答首屏时不等待数据加载，预警在加载完成后的下一次重跑显示
+        st.caption("🚨 异常预警: 数据在后台加载，加载完成后显示")
+        return
+    alert_engine = get_alert_engine()
+    # 每个数据版本更新一次，只重新计算变化了的日期
+    cached('alert_state', lambda: alert_engine.update(backend))
+    alert_table = cached(
+        'alerts',
+        lambda: alert_engine.alerts(filter_args.get('end'), filter_args.get('countries'),
+                                    filter_args.get('categories'), min_level=LEVEL_LOW),
+        filter_key
+    )
+    levels = alert_table['level'].value_counts()
+    high, medium = int(levels.get(LEVEL_HIGH, 0)), int(levels.get(LEVEL_MEDIUM, 0))
+    
+    with st.expander(f"🚨 异常预警: {high} 项严重 · {medium} 项关注", expanded=high > 0):
+        active = alert_table[alert_table['level'] != LEVEL_LOW].head(ALERT_LIMIT)
+        if active.empty:
+            st.markdown(
+                f"<div class='ranking-item'><span class='alert-indicator alert-low'></span>"
+                f"筛选范围内 {len(alert_table):,} 项指标均在同星期几基线范围内</div>",
+                unsafe_allow_html=True
+            )
+            return
+        for alert in active.itertuples(index=False):
+            arrow = "📈" if alert.score > 0 else "📉"
+            st.markdown(
+                f"<div class='ranking-item'><span class='alert-indicator alert-{alert.level}'></span>"
+                f"<strong>{alert.country} · {alert.category}</strong> "
+                f"{METRIC_LABELS[alert.metric]} {arrow} {alert.change:+.1f}% · "
+                f"实际 {format_metric(alert.metric, alert.value)} / "
+                f"基线 {format_metric(alert.metric, alert.expected)} · z={alert.score:+.1f}</div>",
+                unsafe_allow_html=True
+            )
+        st.caption(f"基线: 前 {BASELINE_WEEKS} 个同星期几的滚动均值/标准差和 EWMA，"
+                   f"两者同向偏离时取较小的 z 分数；|z| ≥ {Z_HIGH:g} 为严重，≥ {Z_MEDIUM:g} 为关注")
+
+render_alert_panel()
 
 st.markdown("---")
 
+# ========== 大数据量显示辅助 ==========
+def zoom_and_downsample(frame, x, y, key, by=None):
+    """点数超过预算时提供缩放范围，并在可见范围内降采样；范围足够小时按原始分辨率显示"""
+    if len(frame) <= DEFAULT_POINT_BUDGET:
+        return frame
+    dates = sorted(frame[x].dt.date.unique())
+    lo, hi = st.select_slider("🔍 缩放日期范围", options=dates, value=(dates[0], dates[-1]), key=key)
+    visible = frame[(frame[x].dt.date >= lo) & (frame[x].dt.date <= hi)]
+    return downsample(visible, x, y, by=by)
+
+def render_paged_table(name, frame, params):
+    """服务端搜索、排序、分页，只把当前页发送给浏览器"""
+    col_search, col_sort, col_order, col_size = st.columns([2, 2, 1, 1])
+    with col_search:
+        search = st.text_input("搜索", key=f"{name}_search").strip()
+    with col_sort:
+        sort_by = st.selectbox("排序列", ["(默认顺序)"] + list(frame.columns), key=f"{name}_sort")
+    with col_order:
+        ascending = st.toggle("升序", value=True, key=f"{name}_ascending")
+    with col_size:
+        page_size = st.selectbox("每页行数", [50, 100, 200, 500], key=f"{name}_page_size")
+    
+    sort_col = None if sort_by == "(默认顺序)" else sort_by
+    positions = cached(
+        f'{name}_order',
+        lambda: page_order(frame, sort_col, ascending, search),
+        (params, sort_col, ascending, search)
+    )
+    total_pages = page_count(len(positions), page_size)
+    page = min(int(st.number_input("页码", min_value=1, value=1, step=1, key=f"{name}_page")), total_pages)
+    
+    st.caption(f"共 {len(positions):,} 行 · 第 {page}/{total_pages} 页")
+    st.dataframe(take_page(frame, positions, page, page_size), width='stretch', height=400)
+
 # ========== 主分析区域 ==========
+# on_change="rerun" 让各标签页的 open 属性反映当前选中的标签页，只有选中的标签页才计算和绘图；
+# 每个标签页是一个 st.fragment，标签页内的控件只重跑该标签页
 tab1, tab2, tab3, tab4, tab5 = st.tabs([
     "🏆 销量排行", 
     "🔬 A/B测试", 
     "💰 价格分析", 
     "📈 趋势分析",
     "📋 详细数据"
-])
+], key="main_tabs", on_change="rerun")
 
 # ========== 标签页1: 销量排行 ==========
-with tab1:
+@st.fragment
+@profiler.timed('tab:ranking')
+def render_ranking_tab():
+    """销量排行标签页"""
     st.header("🏆 多维度销量排行系统")
     
     # 排行类型选择
@@ -375,60 +578,63 @@ with tab1:
         if rank_type == "总销量排行":
             # 国家销量排行
             st.subheader("🌍 国家销量排行")
-            country_rank = filtered_df.groupby('country')['sales_amount'].sum().sort_values(ascending=False).reset_index()
-            
-            fig_country = px.bar(
-                country_rank.head(10),
-                x='sales_amount',
-                y='country',
-                orientation='h',
-                color='sales_amount',
-                color_continuous_scale='Viridis',
-                title='国家销量TOP10'
+            country_rank = cached(
+                'country_rank',
+                lambda: sales_rank(backend, 'country', **filter_args),
+                filter_key
             )
-            st.plotly_chart(fig_country, use_container_width=True)
+            
+            with profiler.span('chart:country'):
+                fig_country = px.bar(
+                    country_rank.head(10),
+                    x='sales_amount',
+                    y='country',
+                    orientation='h',
+                    color='sales_amount',
+                    color_continuous_scale='Viridis',
+                    title='国家销量TOP10'
+                )
+                st.plotly_chart(fig_country, width='stretch')
             
         elif rank_type == "品类销量排行":
             # 品类销量排行
             st.subheader("📦 品类销量排行")
-            category_rank = filtered_df.groupby('category')['sales_amount'].sum().sort_values(ascending=False).reset_index()
+            category_rank = cached(
+                'category_rank',
+                lambda: sales_rank(backend, 'category', **filter_args),
+                filter_key
+            )
             
             # 使用饼图展示品类分布
-            fig_category = px.pie(
-                category_rank,
-                values='sales_amount',
-                names='category',
-                title='品类销售额占比',
-                hole=0.3
-            )
-            st.plotly_chart(fig_category, use_container_width=True)
+            with profiler.span('chart:category'):
+                fig_category = px.pie(
+                    category_rank,
+                    values='sales_amount',
+                    names='category',
+                    title='品类销售额占比',
+                    hole=0.3
+                )
+                st.plotly_chart(fig_category, width='stretch')
             
         elif rank_type == "产品销量排行":
             # 产品销量排行
             st.subheader("🔥 热销商品排行")
             
-            # 获取筛选条件下的产品数据
-            filtered_products = product_df[
-                (product_df['date'].dt.date >= start_date) & 
-                (product_df['date'].dt.date <= end_date) &
-                (product_df['country'].isin(selected_countries if selected_countries else all_countries)) &
-                (product_df['category'].isin(selected_categories if selected_categories else all_categories))
-            ]
-            
-            product_rank = filtered_products.groupby(['category', 'product'])['sales_amount'].sum().reset_index()
-            product_rank = product_rank.sort_values('sales_amount', ascending=False).head(20)
+            # 筛选条件下的TOP20(排行索引部分选择，索引即名次)
+            product_rank = cached('product_rank', lambda: backend.top_products(20, **filter_args), filter_key)
             
-            fig_product = px.bar(
-                product_rank,
-                x='sales_amount',
-                y='product',
-                color='category',
-                orientation='h',
-                title='热销商品TOP20',
-                color_discrete_sequence=px.colors.qualitative.Set3
-            )
-            fig_product.update_layout(height=500)
-            st.plotly_chart(fig_product, use_container_width=True)
+            with profiler.span('chart:product'):
+                fig_product = px.bar(
+                    product_rank,
+                    x='sales_amount',
+                    y='product',
+                    color='category',
+                    orientation='h',
+                    title='热销商品TOP20',
+                    color_discrete_sequence=px.colors.qualitative.Set3
+                )
+                fig_product.update_layout(height=500)
+                st.plotly_chart(fig_product, width='stretch')
     
     with col2:
         st.subheader("🥇 实时排行榜")
@@ -454,8 +660,7 @@ with tab1:
             
             if selected_category:
                 # 显示该品类下的产品排行
-                category_products = product_df[product_df['category'] == selected_category]
-                product_rank_cat = category_products.groupby('product')['sales_amount'].sum().sort_values(ascending=False).reset_index()
+                product_rank_cat = backend.category_top(selected_category, 5)
                 
                 st.write(f"**{selected_category} 产品排行:**")
                 for i, (product, sales) in enumerate(zip(product_rank_cat['product'].head(5), 
@@ -476,27 +681,47 @@ with tab1:
                 )
                 
                 if selected_product:
-                    product_info = product_df[product_df['product'] == selected_product]
-                    if not product_info.empty:
-                        avg_price = product_info['price'].mean()
-                        total_sales = product_rank[product_rank['product'] == selected_product]['sales_amount'].values[0]
+                    # 产品维度(品类、价格、全时段合计和名次)是字典查找，不扫描产品明细
+                    product_info = backend.product_summary(selected_product)
+                    if product_info is not None:
+                        positions = {product: i for i, product in enumerate(product_rank['product'])}
+                        rank = positions[selected_product]
+                        range_sales = product_rank['sales_amount'].iloc[rank]
                         
                         st.markdown(f"""
                         <div style='background: #f8f9fa; padding: 15px; border-radius: 10px; margin: 10px 0;'>
                             <h4>{selected_product}</h4>
-                            <p><strong>品类:</strong> {product_info.iloc[0]['category']}</p>
-                            <p><strong>平均价格:</strong> ¥{avg_price:.2f}</p>
-                            <p><strong>总销量:</strong> ¥{total_sales:,.0f}</p>
-                            <p><strong>排名:</strong> #{product_rank[product_rank['product'] == selected_product].index[0] + 1}</p>
+                            <p><strong>品类:</strong> {product_info['category']}</p>
+                            <p><strong>平均价格:</strong> ¥{product_info['avg_price']:.2f}</p>
+                            <p><strong>筛选范围销售额:</strong> ¥{range_sales:,.0f} (#{rank + 1})</p>
+                            <p><strong>全时段销售额:</strong> ¥{product_info['total_sales']:,.0f} (#{product_info['rank']})</p>
+                            <p><strong>全时段销量:</strong> {product_info['units']:,} 件</p>
+                            <p><strong>利润率:</strong> {product_info['margin']:.1%}</p>
                         </div>
                         """, unsafe_allow_html=True)
+                        
+                        # 明细行由产品名的行位置索引取出；流式接入不保留明细时不显示
+                        product_rows = backend.product_rows(selected_product)
+                        if product_rows is not None:
+                            with st.expander(f"📄 明细记录 ({len(product_rows):,} 行)"):
+                                st.dataframe(product_rows.tail(100).iloc[::-1], width='stretch', hide_index=True)
+
+with tab1:
+    if tab1.open:
+        render_ranking_tab()
 
 # ========== 标签页2: A/B测试分析 ==========
-with tab2:
+@st.fragment
+@profiler.timed('tab:ab')
+def render_ab_tab():
+    """A/B测试标签页"""
     st.header("🔬 A/B测试实验分析")
     
+    # A/B测试分析器(所有实验的结果表在同一数据版本内只计算一次)
+    ab_analyzer = cached('ab_analyzer', lambda: get_ab_analyzer(backend.source_version('ab')).compact())
+    
     # 实验选择
-    experiments = ab_df['experiment'].unique()
+    experiments = ab_analyzer.analyze_all()['experiment'].unique()
     selected_experiment = st.selectbox("选择实验", experiments)
     
     if selected_experiment:
@@ -506,25 +731,21 @@ with tab2:
             # 实验效果对比
             st.subheader("📊 实验效果对比")
             
-            # 获取实验数据
-            exp_data = ab_df[ab_df['experiment'] == selected_experiment]
-            
-            # 按变体分组
-            variant_data = exp_data.groupby(['variant', 'date']).agg({
-                'conversion_rate': 'mean',
-                'revenue': 'sum'
-            }).reset_index()
+            # 按变体、日期分组的数据(所有实验一次算好)
+            variant_data = ab_analyzer.daily_trend(selected_experiment)
+            variant_data = zoom_and_downsample(variant_data, 'date', 'conversion_rate', 'ab_zoom', by='variant')
             
             # 绘制转化率趋势
-            fig_ab_trend = px.line(
-                variant_data,
-                x='date',
-                y='conversion_rate',
-                color='variant',
-                title=f'{selected_experiment} - 转化率趋势',
-                markers=True
-            )
-            st.plotly_chart(fig_ab_trend, use_container_width=True)
+            with profiler.span('chart:ab_trend'):
+                fig_ab_trend = px.line(
+                    variant_data,
+                    x='date',
+                    y='conversion_rate',
+                    color='variant',
+                    title=f'{selected_experiment} - 转化率趋势',
+                    markers=True
+                )
+                st.plotly_chart(fig_ab_trend, width='stretch')
         
         with col2:
             # 实验结果分析
@@ -534,30 +755,106 @@ with tab2:
             results = ab_analyzer.analyze_experiment(selected_experiment)
             
             if results:
-                # 显示各变体表现
+                # 显示各变体表现(对照组为绿色)
                 for variant, metrics in results.items():
-                    color = "#2ecc71" if variant == list(results.keys())[0] else "#e74c3c"
+                    color = "#2ecc71" if metrics['is_control'] else "#e74c3c"
+                    significance = "对照组" if metrics['is_control'] else (
+                        f"提升 {metrics['lift']:+.1f}% · p={metrics['p_value']:.3g}"
+                        + (" ✅显著" if metrics['significant'] else "")
+                    )
                     
                     st.markdown(f"""
                     <div style='background: {color}; color: white; padding: 10px; border-radius: 8px; margin: 5px 0;'>
                         <strong>{variant}</strong>
                         <div style='display: flex; justify-content: space-between;'>
-                            <span>转化率: {metrics['avg_conversion']:.2f}%</span>
+                            <span>转化率: {metrics['conversion_rate']:.2f}%</span>
                             <span>访客: {metrics['total_visitors']:,}</span>
                         </div>
+                        <div style='display: flex; justify-content: space-between;'>
+                            <span>{significance}</span>
+                            <span>胜率: {metrics['prob_best']:.1%}</span>
+                        </div>
                     </div>
                     """, unsafe_allow_html=True)
                 
-                # 找出最佳变体
-                best_variant = max(results.items(), key=lambda x: x[1]['avg_conversion'])[0]
-                best_conversion = results[best_variant]['avg_conversion']
+                # 找出最佳变体(后验胜率最高)
+                best_variant = max(results.items(), key=lambda x: x[1]['prob_best'])[0]
+                best = results[best_variant]
                 
-                st.success(f"🎉 **推荐变体: {best_variant}**")
-                st.info(f"转化率: {best_conversion:.2f}%")
+                if best['is_control'] or best['significant']:
+                    st.success(f"🎉 **推荐变体: {best_variant}**")
+                else:
+                    st.warning(f"⏳ **领先变体: {best_variant}**（与对照组差异尚不显著）")
+                st.info(f"转化率: {best['conversion_rate']:.2f}% · 每访客收入: ¥{best['revenue_per_visitor']:.2f} · 胜率: {best['prob_best']:.1%}")
+
+        # 序贯检验: 状态随新数据增量更新，任意时刻查看结论都有效，可以在大促中途结束实验
+        st.subheader("⏱️ 序贯检验(随时有效)")
+        sequential = cached('ab_sequential', lambda: backend.sequential_ab().results())
+        sequential = sequential[(sequential['experiment'] == selected_experiment) & ~sequential['is_control']]
+        lift_path = cached('ab_lift_path', lambda: backend.sequential_ab().lift_path(selected_experiment), (selected_experiment,))
+
+        col_table, col_chart = st.columns([1, 1])
+        with col_table:
+            for _, row in sequential.iterrows():
+                message = (
+                    f"**{row['variant']}** {row['decision']} · 提升 {row['lift']:+.1f}% "
+                    f"(95%区间 {row['lift_low']:+.1f}% ~ {row['lift_high']:+.1f}%) · p={row['p_value']:.3g}"
+                )
+                if row['stop']:
+                    st.success(f"🛑 {message} · 可提前结束")
+                else:
+                    st.info(f"⏳ {message}")
+            st.dataframe(
+                sequential[['variant', 'days', 'visitors', 'conversion_rate', 'lift', 'p_value', 'rpv_lift', 'rpv_p_value', 'decision']].rename(columns={
+                    'variant': '变体',
+                    'days': '天数',
+                    'visitors': '累计访客',
+                    'conversion_rate': '转化率(%)',
+                    'lift': '提升(%)',
+                    'p_value': '随时有效p值',
+                    'rpv_lift': '每访客收入提升(%)',
+                    'rpv_p_value': '收入p值',
+                    'decision': '结论'
+                }),
+                width='stretch',
+                hide_index=True
+            )
+
+        with col_chart:
+            # 累计提升趋势: 每天收盘时的提升和随时有效置信区间
+            with profiler.span('chart:ab_lift'):
+                fig_lift = go.Figure()
+                for variant, path in lift_path.groupby('variant', observed=True, sort=False):
+                    fig_lift.add_trace(go.Scatter(
+                        x=pd.concat([path['date'], path['date'][::-1]]),
+                        y=pd.concat([path['lift_high'], path['lift_low'][::-1]]),
+                        fill='toself', opacity=0.2, line=dict(width=0),
+                        hoverinfo='skip', showlegend=False, name=f'{variant} 区间'
+                    ))
+                    fig_lift.add_trace(go.Scatter(x=path['date'], y=path['lift'], mode='lines+markers', name=variant))
+                fig_lift.add_hline(y=0, line_dash='dash', line_color='#7f8c8d')
+                fig_lift.update_layout(
+                    title=f'{selected_experiment} - 累计提升(相对对照组)',
+                    xaxis_title="日期",
+                    yaxis_title="提升 (%)",
+                    hovermode='x unified',
+                    height=400
+                )
+                st.plotly_chart(fig_lift, width='stretch')
+
+with tab2:
+    if tab2.open:
+        render_ab_tab()
 
 # ========== 标签页3: 价格分析 ==========
-with tab3:
+@st.fragment
+@profiler.timed('tab:price')
+def render_price_tab():
+    """价格分析标签页"""
     st.header("💰 价格弹性与优化分析")
+    price_analyzer = get_price_analyzer(backend.source_version('elasticity'))
+    # 全品目最优价格(自助法置信区间)，每个数据版本只计算一次，这里只读结果
+    optimization = get_price_optimization(backend.source_version('elasticity'))
     
     col1, col2 = st.columns([1, 2])
     
@@ -565,9 +862,11 @@ with tab3:
         # 产品选择
         st.subheader("📦 选择分析产品")
         
-        # 获取热门产品
-        top_products = product_df.groupby('product')['sales_amount'].sum().nlargest(10).index.tolist()
-        selected_product = st.selectbox("选择产品", top_products)
+        # 热门产品(全时段销售额TOP10，从排行索引读取)排在前面，其后为全品目其余产品
+        top_products = cached('top_products', lambda: hot_products(backend))
+        listed = set(top_products)
+        other_products = [product for product in optimization.index if product not in listed]
+        selected_product = st.selectbox("选择产品", top_products + other_products)
         
         if selected_product:
             # 分析价格弹性
@@ -589,96 +888,231 @@ with tab3:
                     st.info("💡 该产品为非弹性需求，提价可增加收入")
                 else:
                     st.info("💡 价格对需求影响较小")
+                
+                if selected_product in optimization.index:
+                    best = optimization.loc[selected_product]
+                    st.metric(
+                        label="最优价格系数(95%置信区间)",
+                        value=f"{best['optimal_multiplier']:.2f}",
+                        delta=f"预期销售额 {best['revenue_lift']:+.1f}% "
+                              f"[{best['lift_low']:+.1f}%, {best['lift_high']:+.1f}%]",
+                        delta_color="normal" if best['recommended'] else "off"
+                    )
+                    st.caption(f"价格系数区间 {best['multiplier_low']:.2f} ~ {best['multiplier_high']:.2f}，"
+                               f"需求弹性 {best['elasticity']:.2f} "
+                               f"[{best['elasticity_low']:.2f}, {best['elasticity_high']:.2f}]")
+                    if not best['recommended']:
+                        st.warning("⚠️ 预期提升的置信区间包含0，暂不建议调价")
     
     with col2:
         if selected_product and analysis:
             st.subheader("📈 价格-需求关系")
             
             # 绘制价格弹性曲线
-            fig_elasticity = make_subplots(specs=[[{"secondary_y": True}]])
+            with profiler.span('chart:elasticity'):
+                fig_elasticity = plotly_subplots.make_subplots(specs=[[{"secondary_y": True}]])
             
-            # 添加销售额曲线
-            fig_elasticity.add_trace(
-                go.Scatter(
-                    x=analysis['price_groups']['price_multiplier'],
-                    y=analysis['price_groups']['sales'],
-                    name='销售额',
-                    mode='lines+markers',
-                    line=dict(color='#3498db', width=3)
-                ),
-                secondary_y=False
-            )
+                # 添加销售额曲线
+                fig_elasticity.add_trace(
+                    go.Scatter(
+                        x=analysis['price_groups']['price_multiplier'],
+                        y=analysis['price_groups']['sales'],
+                        name='销售额',
+                        mode='lines+markers',
+                        line=dict(color='#3498db', width=3)
+                    ),
+                    secondary_y=False
+                )
             
-            # 添加需求曲线
-            fig_elasticity.add_trace(
-                go.Scatter(
-                    x=analysis['price_groups']['price_multiplier'],
-                    y=analysis['price_groups']['demand'],
-                    name='需求量',
-                    mode='lines+markers',
-                    line=dict(color='#e74c3c', width=3, dash='dash')
-                ),
-                secondary_y=True
-            )
+                # 添加需求曲线
+                fig_elasticity.add_trace(
+                    go.Scatter(
+                        x=analysis['price_groups']['price_multiplier'],
+                        y=analysis['price_groups']['demand'],
+                        name='需求量',
+                        mode='lines+markers',
+                        line=dict(color='#e74c3c', width=3, dash='dash')
+                    ),
+                    secondary_y=True
+                )
             
-            fig_elasticity.update_layout(
-                title=f'{selected_product} - 价格弹性分析',
-                xaxis_title="价格系数",
-                hovermode='x unified',
-                height=400
-            )
+                fig_elasticity.update_layout(
+                    title=f'{selected_product} - 价格弹性分析',
+                    xaxis_title="价格系数",
+                    hovermode='x unified',
+                    height=400
+                )
             
-            fig_elasticity.update_yaxes(title_text="销售额", secondary_y=False)
-            fig_elasticity.update_yaxes(title_text="需求量", secondary_y=True)
+                fig_elasticity.update_yaxes(title_text="销售额", secondary_y=False)
+                fig_elasticity.update_yaxes(title_text="需求量", secondary_y=True)
             
-            st.plotly_chart(fig_elasticity, use_container_width=True)
+                st.plotly_chart(fig_elasticity, width='stretch')
+    
+    # 全品目弹性排行(从预先算好的弹性表读取)
+    st.subheader("📉 最具价格弹性的产品")
+    most_elastic = price_analyzer.most_elastic(10).reset_index()
+    st.dataframe(
+        most_elastic[['product', 'loglog_elasticity', 'arc_elasticity', 'avg_elasticity', 'optimal_price_multiplier']].rename(columns={
+            'product': '产品',
+            'loglog_elasticity': '对数回归弹性',
+            'arc_elasticity': '弧弹性',
+            'avg_elasticity': '平均点弹性',
+            'optimal_price_multiplier': '最优价格系数'
+        }),
+        width='stretch',
+        hide_index=True
+    )
+    
+    # 全品目最优定价(按预期销售额提升排序)
+    st.subheader("🎯 全品目最优定价(自助法95%置信区间)")
+    recommended = optimization['recommended'].sum()
+    st.caption(f"共 {len(optimization)} 个产品，{recommended} 个产品调价后预期提升的置信区间在0以上")
+    st.dataframe(
+        optimization.sort_values('revenue_lift', ascending=False).reset_index()[[
+            'product', 'optimal_multiplier', 'multiplier_low', 'multiplier_high',
+            'revenue_lift', 'lift_low', 'lift_high', 'elasticity', 'recommended'
+        ]].rename(columns={
+            'product': '产品',
+            'optimal_multiplier': '最优价格系数',
+            'multiplier_low': '系数下限',
+            'multiplier_high': '系数上限',
+            'revenue_lift': '预期提升(%)',
+            'lift_low': '提升下限(%)',
+            'lift_high': '提升上限(%)',
+            'elasticity': '需求弹性',
+            'recommended': '建议调价'
+        }).round(3),
+        width='stretch',
+        hide_index=True
+    )
+
+with tab3:
+    if tab3.open:
+        render_price_tab()
 
 # ========== 标签页4: 趋势分析 ==========
-with tab4:
+@st.fragment
+@profiler.timed('tab:trend')
+def render_trend_tab():
+    """趋势分析标签页"""
     st.header("📈 销售趋势分析")
     
     # 销售额趋势
     st.subheader("💰 销售额趋势")
     
-    daily_sales = filtered_df.groupby('date')['sales_amount'].sum().reset_index()
+    daily_sales = daily_totals['sales_amount'].reset_index()
+    daily_sales = zoom_and_downsample(daily_sales, 'date', 'sales_amount', 'trend_zoom')
     
-    fig_trend = px.line(
-        daily_sales,
-        x='date',
-        y='sales_amount',
-        title='日销售额趋势',
-        labels={'sales_amount': '销售额 (¥)', 'date': '日期'},
-        line_shape='spline'
-    )
+    with profiler.span('chart:trend'):
+        fig_trend = px.line(
+            daily_sales,
+            x='date',
+            y='sales_amount',
+            title='日销售额趋势',
+            labels={'sales_amount': '销售额 (¥)', 'date': '日期'},
+            line_shape='spline'
+        )
+    
+        fig_trend.update_traces(line=dict(width=3))
+        fig_trend.update_layout(
+            hovermode='x unified',
+            height=400,
+            xaxis_title="日期",
+            yaxis_title="销售额 (¥)",
+            template="plotly_white"
+        )
+    
+        st.plotly_chart(fig_trend, width='stretch')
     
-    fig_trend.update_traces(line=dict(width=3))
-    fig_trend.update_layout(
-        hovermode='x unified',
-        height=400,
-        xaxis_title="日期",
-        yaxis_title="销售额 (¥)",
-        template="plotly_white"
+    # 销售额预测: 所选国家、品类下各序列模型的预测之和(不受日期范围影响)
+    st.subheader("🔮 未来两周销售额预测")
+    
+    forecaster = get_forecaster()
+    # 每个数据版本只检查一次水位，只重新拟合有新数据的序列
+    cached('forecast_models', lambda: forecaster.update(backend))
+    countries, categories = filter_args.get('countries'), filter_args.get('categories')
+    series_key = normalize_filter(countries=countries, categories=categories)
+    forecast = cached('sales_forecast', lambda: forecaster.forecast(countries, categories), series_key)
+    
+    if forecast.empty:
+        st.info("当前筛选条件下没有可预测的序列")
+        return
+    
+    history_start = overview['max_date'] - timedelta(days=27)
+    history = cached(
+        'forecast_history',
+        lambda: backend.by('date', start=history_start, countries=countries, categories=categories)['sales_amount'].reset_index(),
+        series_key
     )
     
-    st.plotly_chart(fig_trend, use_container_width=True)
+    with profiler.span('chart:forecast'):
+        fig_forecast = go.Figure()
+        fig_forecast.add_trace(go.Scatter(
+            x=pd.concat([forecast['date'], forecast['date'][::-1]]),
+            y=pd.concat([forecast['high'], forecast['low'][::-1]]),
+            fill='toself', opacity=0.2, line=dict(width=0),
+            hoverinfo='skip', name='95% 预测区间'
+        ))
+        fig_forecast.add_trace(go.Scatter(
+            x=history['date'], y=history['sales_amount'], mode='lines', name='实际销售额',
+            line=dict(color='#3498db', width=3)
+        ))
+        fig_forecast.add_trace(go.Scatter(
+            x=forecast['date'], y=forecast['forecast'], mode='lines+markers', name='预测销售额',
+            line=dict(color='#e74c3c', width=3, dash='dash')
+        ))
+        fig_forecast.update_layout(
+            hovermode='x unified',
+            height=400,
+            xaxis_title="日期",
+            yaxis_title="销售额 (¥)",
+            template="plotly_white"
+        )
+        st.plotly_chart(fig_forecast, width='stretch')
+    
+    update = forecaster.last_update
+    if update:
+        st.caption(f"每个 国家×品类 序列一个模型(周趋势 + 星期几)，共 {update['series']} 个序列；"
+                   f"最近一次数据更新重新拟合 {update['refit']} 个，用时 {update['seconds']:.2f} 秒")
+
+with tab4:
+    if tab4.open:
+        render_trend_tab()
 
 # ========== 标签页5: 详细数据 ==========
-with tab5:
+@st.fragment
+@profiler.timed('tab:data')
+def render_data_tab():
+    """详细数据标签页"""
     st.header("📋 详细数据")
     
     # 数据查看选项
     data_view = st.radio("选择数据视图", ["销售数据", "产品数据", "A/B测试数据"], horizontal=True)
     
     if data_view == "销售数据":
-        st.dataframe(filtered_df, use_container_width=True, height=400)
+        with profiler.span('filter'):
+            filtered_df = cached('filtered_df', lambda: backend.select('sales', **filter_args), filter_key)
+        render_paged_table('sales', filtered_df, filter_key)
+    elif data_view == "产品数据" and STREAM_PRODUCTS:
+        st.info("产品数据为流式接入模式，只保留汇总结果，不提供明细浏览")
     elif data_view == "产品数据":
-        filtered_products = product_df[
-            (product_df['date'].dt.date >= start_date) & 
-            (product_df['date'].dt.date <= end_date)
-        ]
-        st.dataframe(filtered_products, use_container_width=True, height=400)
+        date_key = normalize_filter(filter_args.get('start'), filter_args.get('end'))
+        filtered_products = cached(
+            'filtered_products_by_date',
+            lambda: backend.select(
+                'product',
+                start=filter_args.get('start'),
+                end=filter_args.get('end')
+            ),
+            date_key
+        )
+        render_paged_table('product', filtered_products, date_key)
     elif data_view == "A/B测试数据":
-        st.dataframe(ab_df, use_container_width=True, height=400)
+        render_paged_table('ab', cached('ab_rows', lambda: backend.select('ab')), ())
+
+with tab5:
+    if tab5.open:
+        render_data_tab()
 
 # ========== 页脚 ==========
 st.markdown("---")
@@ -689,3 +1123,101 @@ st.markdown("""
     <p>💡 数据来源: 第一步生成的模拟数据文件</p>
 </div>
 """.format(datetime.now().strftime("%Y-%m-%d %H:%M:%S")), unsafe_allow_html=True)
+
+# ========== 性能调试面板 ==========
+perf_record = profiler.end()
+
+# 冷启动报告: 进程内第一次完整重跑(含数据加载和索引构建)
+startup_report = get_startup_report()
+if not startup_report:
+    startup_report.update(
+        kind='startup',
+        ts=perf_record['ts'],
+        seconds=perf_record['seconds'],
+        warm_start=served_from_snapshot,
+        load=None if served_from_snapshot else backend.load_report,
+        spans={span['name']: span['seconds'] for span in perf_record['spans']},
+        modules_imported={name: name in sys.modules for name in ('plotly.express', 'plotly.graph_objects')},
+    )
+    get_perf_log().write(startup_report)
+    print(f"🚀 首屏完成: {startup_report['seconds']:.2f} 秒")
+    for name, seconds in startup_report['spans'].items():
+        print(f"   {name}: {seconds * 1000:.0f} ms")
+
+if show_perf_panel:
+    with st.sidebar:
+        st.subheader("⏱️ 本次重跑")
+        col_time, col_mem, col_hit = st.columns(3)
+        col_time.metric("总耗时", f"{perf_record['seconds'] * 1000:.0f} ms")
+        col_mem.metric(
+            "进程内存峰值",
+            f"{perf_record['peak_rss_mb']} MB" if perf_record['peak_rss_mb'] else "-",
+            delta=f"{perf_record['rss_growth_mb']} MB" if perf_record['rss_growth_mb'] else None,
+            delta_color='inverse',
+            help="进程启动以来的常驻内存峰值；增量为本次重跑抬高的部分"
+        )
+        col_hit.metric(
+            "缓存命中",
+            f"{perf_record['cache_hit_rate']:.0%}" if perf_record['cache_hit_rate'] is not None else "-"
+        )
+        
+        spans = pd.DataFrame(perf_record['spans'])
+        if not spans.empty:
+            spans['ms'] = (spans['seconds'] * 1000).round(1)
+            st.dataframe(
+                spans[['name', 'ms', 'rss_growth_mb']].sort_values('ms', ascending=False),
+                width='stretch',
+                hide_index=True
+            )
+        
+        cache_stats = perf_record['result_cache']
+        st.caption(
+            f"结果缓存(全进程): 命中率 {cache_stats['hit_rate']:.0%} · {cache_stats['entries']} 项 · "
+            f"{cache_stats['bytes'] / 1024 / 1024:.1f}/{cache_stats['max_bytes'] / 1024 / 1024:.0f} MB · "
+            f"淘汰 {cache_stats['evictions']} 次"
+        )
+        
+        # 最近的重跑(含单独重跑的标签页片段)
+        st.subheader("🕘 最近重跑")
+        history = pd.DataFrame([
+            {
+                '时间': r['ts'][11:19],
+                '类型': r['kind'],
+                '耗时(ms)': round(r['seconds'] * 1000, 1),
+                '缓存命中': r['cache_hit_rate'],
+            }
+            for r in reversed(profiler.history)
+        ])
+        st.dataframe(history, width='stretch', hide_index=True)
+        
+        # 冷启动计时(预热快照回答首屏时，数据加载在后台进行，计时来自数据后端)
+        st.subheader("🚀 冷启动")
+        data_backend = get_backend()
+        load_report = startup_report['load'] or data_backend.load_report
+        warm_start = get_warm_start()
+        st.caption(
+            f"首屏 {startup_report['seconds'] * 1000:.0f} ms"
+            + (" (预热快照)" if startup_report['warm_start'] else "")
+            + (f" · 数据加载 {load_report['seconds'] * 1000:.0f} ms({load_report['workers']} 个线程)"
+               if load_report else " · 数据加载中...")
+        )
+        if load_report:
+            st.dataframe(
+                pd.DataFrame([
+                    {'数据源': name, 'ms': round(item['seconds'] * 1000, 1), '行数': item['rows']}
+                    for name, item in load_report['sources'].items()
+                ]),
+                width='stretch',
+                hide_index=True
+            )
+        if warm_start.enabled:
+            st.caption(
+                f"预热快照: {'已载入' if warm_start.snapshot else '未使用'} · "
+                f"{'与数据一致' if warm_start.saved_fingerprint == snapshot_fingerprint() else '待重建'} · "
+                f"本进程重建 {warm_start.rebuilds} 次"
+            )
+        resident = (
+            f"私有 {data_backend.resident_bytes() / 1024 / 1024:.1f} MB · "
+            f"映射共享 {data_backend.mapped_bytes() / 1024 / 1024:.1f} MB"
+        ) if not warm_start.loading else "加载中"
+        st.caption(f"后端: {BACKEND} · 数据内存: {resident} · 日志: {get_perf_log().path or '未启用'}")
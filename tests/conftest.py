@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+from warroom.generate import generate, write_frames
+from warroom.ingest import IncrementalIngestor
+from warroom.store import STORE_DIR, ColumnarStore
+
+SALES_ROWS = 1000
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """小规模的模拟数据CSV"""
+    path = tmp_path / 'data'
+    write_frames(generate(sales_rows=SALES_ROWS), str(path))
+    return str(path)
+
+
+def make_ingestor(data_dir, store_dir=STORE_DIR):
+    """在 data_dir 上新建接入器并完成首次加载，store_dir 相对 data_dir"""
+    ingestor = IncrementalIngestor(store=ColumnarStore(store_dir=os.path.join(data_dir, store_dir), base_dir=data_dir))
+    ingestor.refresh()
+    return ingestor
+
+
+def append_lines(csv_path, lines):
+    with open(csv_path, 'ab') as f:
+        f.write(b''.join(lines))
+
+
+def tail_lines(csv_path, n):
+    """CSV最后 n 行的原始字节"""
+    with open(csv_path, 'rb') as f:
+        return f.readlines()[-n:]
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from warroom.cube import MEASURES, RollupCube
+from warroom.generate import generate
+from warroom.schema import apply_column_types
+
+
+@pytest.fixture(scope='module')
+def sales():
+    return apply_column_types(generate(sales_rows=2000)['sales'])
+
+
+def expected_by(frame, axis):
+    grouped = frame.groupby(axis, observed=True).agg(
+        sales_amount=('sales_amount', 'sum'), orders=('orders', 'sum'),
+        visitors=('visitors', 'sum'), rows=('date', 'size'))
+    return grouped.astype(float)
+
+
+def assert_cube_matches(cube, frame):
+    for axis in ('date', 'country', 'category'):
+        result = cube.by(axis)
+        expected = expected_by(frame, axis).reindex(result.index.astype(object) if axis != 'date' else result.index)
+        assert len(result) == frame[axis].nunique()
+        np.testing.assert_allclose(result[MEASURES].to_numpy(), expected[MEASURES].to_numpy(), rtol=1e-5)
+
+
+def test_from_frame_matches_groupby(sales):
+    assert_cube_matches(RollupCube.from_frame(sales), sales)
+
+
+def test_incremental_batches_match_full_build(sales):
+    cube = RollupCube()
+    for batch in np.array_split(np.arange(len(sales)), 7):
+        cube.add(sales.iloc[batch])
+    full = RollupCube.from_frame(sales)
+    pd.testing.assert_frame_equal(cube.series(), full.series(), check_freq=False)
+    assert_cube_matches(cube, sales)
+
+
+def test_new_country_and_out_of_order_dates(sales):
+    # 先加后半段日期、缺一个国家，再补前半段和该国家
+    last_country = sales['country'].unique()[-1]
+    late = sales['date'] >= sales['date'].median()
+    first = sales[late & (sales['country'] != last_country)]
+    cube = RollupCube.from_frame(first)
+    cube.add(sales.drop(first.index))
+    assert_cube_matches(cube, sales)
+    assert cube.countries[-1] == last_country
+
+
+def test_published_state_is_not_modified_by_add(sales):
+    cube = RollupCube.from_frame(sales.iloc[:1000])
+    before = cube.by('date').copy()
+    state = cube._state
+    cube.add(sales.iloc[1000:])
+    cube._state, current = state, cube._state
+    pd.testing.assert_frame_equal(cube.by('date'), before)
+    cube._state = current
+    assert_cube_matches(cube, sales)
+
+
+def test_filtered_totals(sales):
+    cube = RollupCube.from_frame(sales)
+    start, end = sales['date'].max() - pd.Timedelta(days=6), sales['date'].max()
+    countries = sales['country'].unique()[:2].tolist()
+    mask = sales['date'].between(start, end) & sales['country'].isin(countries)
+    totals = cube.totals(start, end, countries=countries)
+    assert totals['rows'] == mask.sum()
+    assert totals['sales_amount'] == pytest.approx(sales.loc[mask, 'sales_amount'].sum(), rel=1e-6)
+
+
+def test_empty_cube_queries():
+    cube = RollupCube()
+    assert cube.totals()['rows'] == 0
+    assert cube.by('date').empty
+    assert cube.series().empty
@@ -0,0 +1,39 @@
+import json
+import os
+
+from warroom.profiling import DEFAULT_LOG_PATH, PerfLog, Profiler
+
+
+def test_log_is_on_by_default():
+    assert PerfLog().path == DEFAULT_LOG_PATH
+
+
+def test_empty_path_disables_log(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    PerfLog('').write({'kind': 'script'})
+    assert os.listdir(tmp_path) == []
+
+
+def test_log_rotates_at_size_cap(tmp_path):
+    path = str(tmp_path / 'perf.jsonl')
+    log = PerfLog(path, max_bytes=200)
+    for i in range(20):
+        log.write({'i': i, 'pad': 'x' * 40})
+    assert sorted(os.listdir(tmp_path)) == ['perf.jsonl', 'perf.jsonl.1']
+    assert os.path.getsize(path) < 200 + 100
+    with open(path, encoding='utf-8') as f:
+        assert json.loads(f.readlines()[-1])['i'] == 19
+
+
+def test_profiler_records_spans_and_growth(tmp_path):
+    path = str(tmp_path / 'perf.jsonl')
+    profiler = Profiler('s', PerfLog(path))
+    profiler.begin()
+    with profiler.span('load'):
+        with profiler.span('csv'):
+            pass
+    record = profiler.end()
+    assert [span['name'] for span in record['spans']] == ['load/csv', 'load']
+    assert record['rss_growth_mb'] is None or record['rss_growth_mb'] >= 0
+    with open(path, encoding='utf-8') as f:
+        assert len(f.readlines()) == 1
@@ -0,0 +1,56 @@
+import math
+
+import pandas as pd
+
+from warroom.sequential import DECISION_WIN, SequentialABTest
+
+
+def ab_rows(days, control_conversions, variant_conversions, visitors=1000, start='2024-01-01'):
+    """单个实验 E 的逐日数据，A 为对照组，B 为实验组"""
+    rows = []
+    for i in range(days):
+        date = pd.Timestamp(start) + pd.Timedelta(days=i)
+        for variant, conversions in (('A', control_conversions(i)), ('B', variant_conversions(i))):
+            rows.append({'experiment': 'E', 'variant': variant, 'date': date, 'visitors': visitors,
+                         'conversions': conversions, 'revenue': conversions * 10.0})
+    return pd.DataFrame(rows)
+
+
+def variant_result(test):
+    results = test.results()
+    return results[results['variant'] == 'B'].iloc[0]
+
+
+def test_zero_conversion_first_day_does_not_invert_interval():
+    rows = ab_rows(10, lambda i: 0 if i == 0 else 50, lambda i: 5 if i == 0 else 100)
+    full = SequentialABTest()
+    full.add(rows)
+    result = variant_result(full)
+    assert result['lift_low'] <= result['lift'] <= result['lift_high']
+    assert result['decision'] == DECISION_WIN
+
+    # 第一天的占位点不参与区间交集: 与从第二天开始的同一份数据一样是正常的区间
+    later = SequentialABTest()
+    later.add(rows[rows['date'] > rows['date'].min()])
+    reference = variant_result(later)
+    assert 0 < result['lift_low'] < result['lift_high']
+    assert 0 < reference['lift_low'] < reference['lift_high']
+
+
+def test_untestable_first_day_placeholder():
+    rows = ab_rows(1, lambda i: 0, lambda i: 5)
+    test = SequentialABTest()
+    test.add(rows)
+    point = test.lift_path('E').iloc[0]
+    assert point['p_value'] == 1.0
+    assert point['diff_low'] == -math.inf and point['diff_high'] == math.inf
+
+
+def test_incremental_matches_batch():
+    rows = ab_rows(14, lambda i: 40 + i % 3, lambda i: 45 + i % 5)
+    batch = SequentialABTest()
+    batch.add(rows)
+    incremental = SequentialABTest()
+    for _, day in rows.groupby('date'):
+        incremental.add(day)
+    pd.testing.assert_frame_equal(batch.results(), incremental.results())
@@ -0,0 +1,79 @@
+import os
+import re
+import sqlite3
+
+import pandas as pd
+
+from conftest import append_lines, tail_lines
+from warroom.sqlite_backend import SQLiteBackend
+from warroom.store import DATA_SOURCES
+
+
+def open_backend(data_dir):
+    backend = SQLiteBackend(db_path=os.path.join(data_dir, 'db', 'warroom.sqlite'), base_dir=data_dir)
+    backend.refresh()
+    return backend
+
+
+def sales_path(data_dir):
+    return os.path.join(data_dir, DATA_SOURCES['sales'])
+
+
+def rewrite_sales(data_dir, frame):
+    frame.to_csv(sales_path(data_dir), index=False, encoding='utf-8-sig')
+
+
+def test_append_inserts_new_rows(data_dir):
+    backend = open_backend(data_dir)
+    rows = backend.overview()['rows']
+    append_lines(sales_path(data_dir), tail_lines(sales_path(data_dir), 20))
+    assert backend.refresh() == {'sales': 20}
+    assert backend.overview()['rows'] == rows + 20
+    assert backend.source_version('sales')[0] == 0
+
+
+def test_same_size_rewrite_is_resynced(data_dir):
+    backend = open_backend(data_dir)
+    path = sales_path(data_dir)
+    with open(path, 'rb') as f:
+        data = f.read()
+    # 每行日期的年份末位改为9，文件大小不变
+    changed = re.sub(rb'(\n\d{3})\d', rb'\g<1>9', data)
+    assert len(changed) == len(data) and changed != data
+    stat = os.stat(path)
+    with open(path, 'wb') as f:
+        f.write(changed)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    backend.refresh()
+    assert backend.source_version('sales')[0] == 1
+    expected = pd.read_csv(path)['date'].max()
+    assert backend.overview()['max_date'] == pd.Timestamp(expected)
+
+
+def test_rebuild_drops_old_dimension_rows(data_dir):
+    backend = open_backend(data_dir)
+    sales = pd.read_csv(sales_path(data_dir))
+    countries = sales['country'].unique()
+    assert set(backend.dimension('sales').index) == set(countries)
+
+    rewrite_sales(data_dir, sales[sales['country'] != countries[0]])
+    backend.refresh()
+    assert set(backend.dimension('sales').index) == set(countries[1:])
+
+
+def test_unchanged_files_skip_sync(data_dir):
+    backend = open_backend(data_dir)
+    version = backend.version
+    assert backend.refresh() == {}
+    assert backend.version == version
+
+
+def test_database_without_mtime_column_is_migrated(data_dir):
+    db_path = os.path.join(data_dir, 'db', 'warroom.sqlite')
+    os.makedirs(os.path.dirname(db_path))
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('CREATE TABLE _sources (name TEXT PRIMARY KEY, columns TEXT, '
+                     'byte_offset INTEGER, prefix_crc INTEGER, generation INTEGER, row_count INTEGER)')
+    backend = open_backend(data_dir)
+    assert backend.overview()['rows'] == len(pd.read_csv(sales_path(data_dir)))
@@ -0,0 +1,62 @@
+import os
+
+import pandas as pd
+
+from conftest import append_lines, make_ingestor, tail_lines
+from warroom.store import DATA_SOURCES, STORE_DIR, ColumnarStore, unmapped_columns
+
+
+def store_for(data_dir):
+    return ColumnarStore(store_dir=os.path.join(data_dir, STORE_DIR), base_dir=data_dir)
+
+
+def test_load_is_mapped_and_fresh(data_dir):
+    store = store_for(data_dir)
+    for name in DATA_SOURCES:
+        frame = store.load(name)
+        assert unmapped_columns(frame) == [], name
+        assert store.is_fresh(name)
+
+
+def test_deep_copy_is_not_mapped(data_dir):
+    frame = store_for(data_dir).load('sales')
+    assert set(unmapped_columns(frame.copy())) == set(frame.columns)
+
+
+def test_cold_start_after_append_reads_appended_rows(data_dir):
+    ingestor = make_ingestor(data_dir)
+    path = os.path.join(data_dir, DATA_SOURCES['product'])
+    append_lines(path, tail_lines(path, 30))
+    ingestor.refresh()
+
+    frame = store_for(data_dir).load('product')
+    assert len(frame) == len(ingestor.states['product'].frame)
+    assert unmapped_columns(frame) == []
+
+
+def test_codes_widen_when_categories_grow(data_dir):
+    # 超过 int8 能表示的类别数后编码改用更宽的类型，写入后仍是映射视图
+    ingestor = make_ingestor(data_dir)
+    path = os.path.join(data_dir, DATA_SOURCES['elasticity'])
+    row = pd.read_csv(path, dtype=str).tail(1)
+    rows = pd.concat([row.assign(product=f'P{i:03d}') for i in range(200)])
+    rows.to_csv(path, mode='a', header=False, index=False)
+    ingestor.refresh()
+
+    frame = ingestor.states['elasticity'].frame
+    assert frame['product'].array.codes.dtype.itemsize >= 2
+    assert unmapped_columns(frame) == []
+    assert frame['product'].iloc[-200:].tolist() == rows['product'].tolist()
+
+
+def test_missing_value_in_int_column_rebuilds(data_dir):
+    # 整数列出现缺失值无法写入已有的列类型，改为整体重建
+    ingestor = make_ingestor(data_dir)
+    path = os.path.join(data_dir, DATA_SOURCES['ab'])
+    rows = pd.read_csv(path, dtype=str).tail(1).assign(visitors='')
+    rows.to_csv(path, mode='a', header=False, index=False)
+    ingestor.refresh()
+
+    frame = ingestor.states['ab'].frame
+    assert frame['visitors'].isna().iloc[-1]
+    assert len(frame) == len(pd.read_csv(path))
@@ -0,0 +1,4 @@
+"""
+跨境电商大促智能作战室 - 数据与分析模块
+app.py 中的仪表板从这里读取数据
+"""
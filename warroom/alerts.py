@@ -0,0 +1,199 @@
+"""
+异常预警
+对每个 国家 × 品类 序列的销售额、订单数和转化率计算滚动基线和 z 分数，
+全部序列、全部指标放在一个 [日期, 序列, 指标] 数组里按行整体计算，不逐个序列循环。
+
+大促数据有明显的星期效应，基线取同一星期几的历史:
+    滚动基线: 前 BASELINE_WEEKS 个同星期几的均值和标准差
+    EWMA 基线: 按7天步长递推的指数加权均值和方差
+波动大致与量级成比例，统计量都在 log1p 尺度上计算。两种基线的 z 分数同向时取绝对值
+较小的一个作为预警分数，单一基线的偶然偏差不会触发预警。
+数据更新时只从第一个发生变化的日期起重新计算
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+METRICS = ['sales_amount', 'orders', 'conversion_rate']
+
+METRIC_LABELS = {'sales_amount': '销售额', 'orders': '订单数', 'conversion_rate': '转化率'}
+
+SEASON_DAYS = 7
+
+# 滚动基线取前几个同星期几，少于 MIN_BASELINE_WEEKS 个有数据时不打分
+BASELINE_WEEKS = 8
+MIN_BASELINE_WEEKS = 4
+
+EWMA_ALPHA = 0.3
+
+# 预警分数绝对值的阈值
+Z_HIGH = 3.0
+Z_MEDIUM = 2.0
+
+LEVEL_HIGH = 'high'
+LEVEL_MEDIUM = 'medium'
+LEVEL_LOW = 'low'
+
+# 每个日期保存的统计量
+STATS = ['mean', 'std', 'z', 'ewma', 'ewma_std', 'ewma_z']
+
+
+def alert_score(z, ewma_z):
+    """预警分数: 两种基线的 z 分数同向时取绝对值较小的一个，反向时为0，只有滚动基线时取滚动 z"""
+    agree = np.where(np.sign(z) == np.sign(ewma_z), np.sign(z) * np.minimum(np.abs(z), np.abs(ewma_z)), 0.0)
+    return np.where(np.isnan(ewma_z), z, agree)
+
+
+def alert_level(score):
+    """预警分数对应的级别(与样式表中的 alert-high/medium/low 对应)"""
+    magnitude = np.abs(np.nan_to_num(score))
+    return np.where(magnitude >= Z_HIGH, LEVEL_HIGH, np.where(magnitude >= Z_MEDIUM, LEVEL_MEDIUM, LEVEL_LOW))
+
+
+def metric_values(backend):
+    """数据后端的每日指标 (日期, 序列, 值[日期, 序列, 指标])，某天某序列没有数据时为 NaN"""
+    sales = backend.daily_series('sales_amount')
+    series = sales.columns
+    frames = [sales] + [backend.daily_series(measure).reindex(index=sales.index, columns=series, fill_value=0)
+                        for measure in ('orders', 'visitors', 'rows')]
+    dates = pd.date_range(sales.index.min(), sales.index.max(), freq='D') if len(sales.index) else sales.index
+    sales, orders, visitors, rows = [frame.reindex(dates, fill_value=0).to_numpy(dtype=float) for frame in frames]
+    observed = rows > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        conversion = np.where(visitors > 0, orders / visitors * 100, np.nan)
+    values = np.stack([sales, orders, conversion], axis=-1)
+    values[~observed] = np.nan
+    return pd.DatetimeIndex(dates, name='date'), series, values
+
+
+class AlertEngine:
+    """全部序列的预警统计量，随数据更新增量计算(进程内共用一个实例，线程安全)"""
+
+    def __init__(self):
+        self.dates = pd.DatetimeIndex([], name='date')
+        self.series = pd.MultiIndex.from_tuples([], names=['country', 'category'])
+        self.values = np.empty((0, 0, len(METRICS)))
+        self.stats = {name: self.values.copy() for name in STATS}
+        self.last_update = {}      # 最近一次更新: {'days', 'recomputed'}
+        self._lock = threading.Lock()
+
+    # ========== 更新 ==========
+    def update(self, backend):
+        """读取数据后端的每日指标，从第一个变化的日期起重新计算，返回重新计算的天数"""
+        dates, series, values = metric_values(backend)
+        with self._lock:
+            start = self._first_change(dates, series, values)
+            # 保留未变化部分的统计量，数组扩展到新的日期数
+            stats = {name: np.full(values.shape, np.nan) for name in STATS}
+            if start:
+                for name in STATS:
+                    stats[name][:start] = self.stats[name][:start]
+            _compute(np.log1p(values), stats, start)
+            self.dates, self.series, self.values, self.stats = dates, series, values, stats
+            self.last_update = {'days': len(dates), 'recomputed': len(dates) - start}
+        return len(dates) - start
+
+    def _first_change(self, dates, series, values):
+        """新数据与已计算数据第一个不同的日期位置；日期起点或序列变化时从头计算"""
+        if len(self.dates) == 0 or len(dates) == 0 or dates[0] != self.dates[0] or not series.equals(self.series):
+            return 0
+        overlap = min(len(dates), len(self.dates))
+        old, new = self.values[:overlap], values[:overlap]
+        changed = ~((old == new) | (np.isnan(old) & np.isnan(new)))
+        rows = np.flatnonzero(changed.any(axis=(1, 2)))
+        return int(rows[0]) if len(rows) else overlap
+
+    # ========== 查询 ==========
+    def alerts(self, date=None, countries=None, categories=None, min_level=LEVEL_MEDIUM):
+        """某天(默认最后一天)的预警，按预警分数绝对值从大到小排列
+
+        列: country, category, metric, value, expected(滚动基线), ewma, z, ewma_z, score,
+        change(相对滚动基线的变化%), level；min_level=LEVEL_LOW 时返回全部已打分的序列
+        """
+        with self._lock:
+            if len(self.dates) == 0:
+                return pd.DataFrame(columns=['country', 'category', 'metric', 'value', 'expected',
+                                             'ewma', 'z', 'ewma_z', 'score', 'change', 'level'])
+            day = len(self.dates) - 1 if date is None else self.dates.searchsorted(pd.Timestamp(date), side='right') - 1
+            day = max(day, 0)
+            series = self.series
+            value = self.values[day]
+            mean, z = np.expm1(self.stats['mean'][day]), self.stats['z'][day]
+            ewma, ewma_z = np.expm1(self.stats['ewma'][day]), self.stats['ewma_z'][day]
+
+        keep = np.ones(len(series), dtype=bool)
+        if countries is not None:
+            keep &= series.get_level_values('country').isin(list(countries))
+        if categories is not None:
+            keep &= series.get_level_values('category').isin(list(categories))
+        s_idx, m_idx = np.nonzero(keep[:, None] & np.isfinite(z))
+        score = alert_score(z[s_idx, m_idx], ewma_z[s_idx, m_idx])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            change = np.where(mean[s_idx, m_idx] > 0, (value[s_idx, m_idx] / mean[s_idx, m_idx] - 1) * 100, np.nan)
+        table = pd.DataFrame({
+            'country': series.get_level_values('country')[s_idx],
+            'category': series.get_level_values('category')[s_idx],
+            'metric': np.array(METRICS, dtype=object)[m_idx],
+            'value': value[s_idx, m_idx],
+            'expected': mean[s_idx, m_idx],
+            'ewma': ewma[s_idx, m_idx],
+            'z': z[s_idx, m_idx],
+            'ewma_z': ewma_z[s_idx, m_idx],
+            'score': score,
+            'change': change,
+            'level': alert_level(score),
+        })
+        if min_level != LEVEL_LOW:
+            levels = [LEVEL_HIGH] if min_level == LEVEL_HIGH else [LEVEL_HIGH, LEVEL_MEDIUM]
+            table = table[table['level'].isin(levels)]
+        order = np.argsort(-np.abs(table['score'].to_numpy()), kind='stable')
+        return table.iloc[order].reset_index(drop=True)
+
+
+def _compute(values, stats, start):
+    """计算 start 及之后各天的统计量(values 为 log1p 尺度)，start 之前的结果(EWMA 递推的起点)已经在 stats 中"""
+    T = len(values)
+    if start >= T:
+        return
+
+    # 滚动基线: 前 BASELINE_WEEKS 个同星期几，逐周累加 [天, 序列, 指标] 平面的和、平方和与个数
+    days = np.arange(start, T)
+    total = np.zeros((T - start,) + values.shape[1:])
+    square = np.zeros_like(total)
+    count = np.zeros_like(total)
+    for week in range(1, BASELINE_WEEKS + 1):
+        lag = days - SEASON_DAYS * week
+        lagged = np.where((lag >= 0)[:, None, None], values[np.maximum(lag, 0)], np.nan)
+        seen = np.isfinite(lagged)
+        lagged = np.where(seen, lagged, 0.0)
+        total += lagged
+        square += lagged * lagged
+        count += seen
+    enough = count >= MIN_BASELINE_WEEKS
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(enough, total / count, np.nan)
+        std = np.where(enough, np.sqrt(np.maximum(square - count * mean * mean, 0) / (count - 1)), np.nan)
+    stats['mean'][start:] = mean
+    stats['std'][start:] = std
+    stats['z'][start:] = _zscore(values[start:], mean, std)
+
+    # EWMA 基线: 第 t 天的期望值由第 t-7 天的期望值和实际值递推，每一步是整个 [序列, 指标] 平面
+    ewma, ewma_std = stats['ewma'], stats['ewma_std']
+    for t in range(max(start, SEASON_DAYS), T):
+        prev_value, prev_mean = values[t - SEASON_DAYS], ewma[t - SEASON_DAYS]
+        prev_var = np.square(ewma_std[t - SEASON_DAYS])
+        fresh = np.isnan(prev_mean)
+        deviation = prev_value - prev_mean
+        mean_t = np.where(fresh, prev_value, prev_mean + EWMA_ALPHA * deviation)
+        var_t = np.where(fresh, 0.0, (1 - EWMA_ALPHA) * (prev_var + EWMA_ALPHA * np.square(deviation)))
+        # 上一期没有数据时沿用上一期的基线
+        missing = np.isnan(prev_value)
+        ewma[t] = np.where(missing, prev_mean, mean_t)
+        ewma_std[t] = np.sqrt(np.where(missing, prev_var, var_t))
+    stats['ewma_z'][start:] = _zscore(values[start:], ewma[start:], ewma_std[start:])
+
+
+def _zscore(value, mean, std):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(std > 0, (value - mean) / std, np.nan)
@@ -0,0 +1,249 @@
+"""
+分析器
+A/B测试分析与价格弹性分析，不依赖Streamlit
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+# 贝叶斯胜率的蒙特卡洛抽样次数
+POSTERIOR_SAMPLES = 20000
+
+SIGNIFICANCE_LEVEL = 0.05
+
+
+class ABTestAnalyzer:
+    """A/B测试分析器
+
+    analyze_all 一次分组计算所有实验、所有变体的汇总与显著性，结果缓存在实例上，
+    切换实验只是查表。汇总可以在数据库中完成，见 from_aggregates
+    """
+
+    def __init__(self, ab_data):
+        self.ab_data = ab_data
+        self._totals = None
+        self._daily_table = None
+        self._results = None
+        self._daily = None
+
+    @classmethod
+    def from_aggregates(cls, variant_totals, daily_table):
+        """由已汇总的数据构建分析器，不需要原始数据
+
+        variant_totals 的列与 variant_totals() 相同，按变体首次出现的顺序排列；
+        daily_table 为按 (experiment, variant, date) 汇总的 conversion_rate 均值与 revenue 合计
+        """
+        analyzer = cls(None)
+        analyzer._totals = variant_totals
+        analyzer._daily_table = daily_table
+        return analyzer
+
+    def variant_totals(self):
+        """各实验、各变体的合计，变体按首次出现的顺序排列"""
+        if self._totals is None:
+            self._totals = self.ab_data.groupby(['experiment', 'variant'], observed=True, sort=False).agg(
+                total_visitors=('visitors', 'sum'),
+                total_conversions=('conversions', 'sum'),
+                total_revenue=('revenue', 'sum'),
+                avg_conversion=('conversion_rate', 'mean'),
+                std_conversion=('conversion_rate', 'std'),
+            ).reset_index()
+        return self._totals
+
+    def analyze_all(self):
+        """所有实验的变体结果表
+
+        每个实验中首次出现的变体作为对照组。列包括合计访客/转化/收入、
+        合并转化率、每访客收入、相对对照组的提升、双比例z检验p值，
+        以及Beta后验下该变体为最佳的概率(prob_best)
+        """
+        if self._results is not None:
+            return self._results
+
+        table = self.variant_totals().copy()
+
+        visitors = table['total_visitors'].to_numpy(dtype=float)
+        conversions = table['total_conversions'].to_numpy(dtype=float)
+        table['conversion_rate'] = conversions / visitors * 100
+        table['revenue_per_visitor'] = table['total_revenue'] / visitors
+
+        # 对照组: 每个实验的第一个变体。各实验的行不一定相邻(按日期交错出现时为 E1/A, E2/A, E1/B ...)，
+        # 对照组所在的行号按实验分组取出
+        first = table.groupby('experiment', observed=True, sort=False).cumcount() == 0
+        table['is_control'] = first.to_numpy()
+        control = (pd.Series(np.arange(len(table))).where(first)
+                   .groupby(table['experiment'], observed=True, sort=False)
+                   .transform('first').to_numpy(dtype=np.int64))
+        c_visitors, c_conversions = visitors[control], conversions[control]
+
+        # 双比例z检验(合并方差)
+        p1, p0 = conversions / visitors, c_conversions / c_visitors
+        pooled = (conversions + c_conversions) / (visitors + c_visitors)
+        se = np.sqrt(pooled * (1 - pooled) * (1 / visitors + 1 / c_visitors))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = np.where(table['is_control'] | (se == 0), 0.0, (p1 - p0) / se)
+            table['lift'] = np.where(p0 > 0, (p1 - p0) / p0 * 100, 0.0)
+        table['z_score'] = z
+        table['p_value'] = [math.erfc(abs(v) / math.sqrt(2)) for v in z]
+        table['significant'] = ~table['is_control'] & (table['p_value'] < SIGNIFICANCE_LEVEL)
+
+        table['prob_best'] = self._prob_best(table, conversions, visitors)
+
+        self._results = table
+        return table
+
+    @staticmethod
+    def _prob_best(table, conversions, visitors):
+        """Beta(1+转化, 1+未转化) 后验抽样，统计各变体在实验内转化率最高的比例"""
+        rng = np.random.default_rng(0)
+        draws = rng.beta(1 + conversions, 1 + visitors - conversions,
+                         size=(POSTERIOR_SAMPLES, len(table)))
+        prob = np.zeros(len(table))
+        codes = pd.factorize(table['experiment'])[0]
+        for code in np.unique(codes):
+            cols = np.flatnonzero(codes == code)
+            winners = cols[draws[:, cols].argmax(axis=1)]
+            prob[cols] = np.bincount(winners, minlength=len(table))[cols] / POSTERIOR_SAMPLES
+        return prob
+
+    def analyze_experiment(self, experiment_name):
+        """分析特定实验，返回 {变体: 指标}"""
+        table = self.analyze_all()
+        exp_table = table[table['experiment'] == experiment_name]
+
+        if exp_table.empty:
+            return None
+
+        return exp_table.drop(columns=['experiment']).set_index('variant').to_dict('index')
+
+    def daily_table(self):
+        """按 (experiment, variant, date) 汇总的 conversion_rate 均值与 revenue 合计"""
+        if self._daily_table is None:
+            self._daily_table = self.ab_data.groupby(['experiment', 'variant', 'date'], observed=True).agg({
+                'conversion_rate': 'mean',
+                'revenue': 'sum'
+            }).reset_index()
+        return self._daily_table
+
+    def compact(self):
+        """只保留汇总结果的副本(不含原始数据)，结果与原分析器相同，便于持久化"""
+        analyzer = ABTestAnalyzer.from_aggregates(self.variant_totals(), self.daily_table())
+        analyzer._results = self.analyze_all()
+        return analyzer
+
+    def daily_trend(self, experiment_name):
+        """实验各变体的每日转化率与收入"""
+        if self._daily is None:
+            self._daily = {name: group.drop(columns=['experiment'])
+                           for name, group in self.daily_table().groupby('experiment', observed=True)}
+        return self._daily.get(experiment_name)
+
+
+class PriceElasticityAnalyzer:
+    """价格弹性分析器
+
+    analyze_catalog 对全部产品一次分组、用numpy批量计算弹性和最优价格，
+    结果缓存在实例上，单个产品分析和全品目排行都从这张表读取
+    """
+
+    def __init__(self, elasticity_data):
+        self.elasticity_data = elasticity_data
+        self._catalog = None
+        self._price_groups = None
+
+    def analyze_catalog(self):
+        """全部产品的弹性表
+
+        avg_elasticity 为相邻价格档的点弹性均值(与单产品分析口径一致)，
+        arc_elasticity 为中点法弧弹性均值，loglog_elasticity 为 log(需求)对
+        log(价格系数)的回归斜率，optimal_price_multiplier 为平均销售额最高的价格档
+        """
+        if self._catalog is not None:
+            return self._catalog
+
+        groups = self.elasticity_data.groupby(['product', 'price_multiplier'], observed=True).agg({
+            'sales': 'mean',
+            'demand': 'mean'
+        }).reset_index()
+        products, codes = np.unique(groups['product'].to_numpy(dtype=object), return_inverse=True)
+        # 分组按分类的类别顺序排列，追加的新产品排在末尾，不一定是字典序；
+        # 按产品编码稳定排序后每个产品的各价格档才是 codes 中连续的一段
+        order = np.argsort(codes, kind='stable')
+        groups, codes = groups.iloc[order].reset_index(drop=True), codes[order]
+        n = len(products)
+        price = groups['price_multiplier'].to_numpy(dtype=float)
+        demand = groups['demand'].to_numpy(dtype=float)
+        sales = groups['sales'].to_numpy(dtype=float)
+
+        # 同一产品内相邻价格档(分组结果已按产品、价格排序)
+        same = codes[1:] == codes[:-1]
+        p0, p1, d0, d1 = price[:-1], price[1:], demand[:-1], demand[1:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            point = ((d1 - d0) / d0) / ((p1 - p0) / p0)
+            arc = ((d1 - d0) / ((d1 + d0) / 2)) / ((p1 - p0) / ((p1 + p0) / 2))
+        valid = same & (p1 != p0) & np.isfinite(point)
+        pair_codes = codes[1:][valid]
+        pairs = np.bincount(pair_codes, minlength=n)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            avg_point = np.where(pairs > 0, np.bincount(pair_codes, point[valid], n) / pairs, 0.0)
+            avg_arc = np.where(pairs > 0, np.bincount(pair_codes, arc[valid], n) / pairs, 0.0)
+
+        # 原始观测上的 log-log 回归斜率
+        raw = self.elasticity_data
+        positive = (raw['demand'] > 0).to_numpy() & (raw['price_multiplier'] > 0).to_numpy()
+        raw_codes = np.searchsorted(products, raw['product'].to_numpy(dtype=object)[positive])
+        x = np.log(raw['price_multiplier'].to_numpy(dtype=float)[positive])
+        y = np.log(raw['demand'].to_numpy(dtype=float)[positive])
+        cnt = np.bincount(raw_codes, minlength=n)
+        sx, sy = np.bincount(raw_codes, x, n), np.bincount(raw_codes, y, n)
+        sxx, sxy = np.bincount(raw_codes, x * x, n), np.bincount(raw_codes, x * y, n)
+        denom = cnt * sxx - sx * sx
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = np.where(denom > 1e-12, (cnt * sxy - sx * sy) / denom, 0.0)
+
+        # 每个产品平均销售额最高的价格档
+        order = np.lexsort((sales, codes))
+        last = order[np.r_[codes[order][1:] != codes[order][:-1], True]]
+
+        catalog = pd.DataFrame({
+            'product': products,
+            'price_points': np.bincount(codes, minlength=n),
+            'avg_elasticity': avg_point,
+            'arc_elasticity': avg_arc,
+            'loglog_elasticity': slope,
+            'optimal_price_multiplier': price[last],
+            'optimal_sales': sales[last],
+        })
+        catalog['is_elastic'] = catalog['avg_elasticity'].abs() > 1
+
+        self._price_groups = {
+            product: groups.iloc[start:stop, 1:].reset_index(drop=True)
+            for product, start, stop in zip(
+                products,
+                np.searchsorted(codes, np.arange(n)),
+                np.searchsorted(codes, np.arange(n), side='right'))
+        }
+        self._catalog = catalog.set_index('product')
+        return self._catalog
+
+    def most_elastic(self, n=10):
+        """需求对价格最敏感的产品(按 log-log 弹性绝对值排序)"""
+        catalog = self.analyze_catalog()
+        return catalog.loc[catalog['loglog_elasticity'].abs().nlargest(n).index]
+
+    def analyze_product_elasticity(self, product_name):
+        """分析单个产品的价格弹性"""
+        catalog = self.analyze_catalog()
+        if product_name not in catalog.index:
+            return None
+
+        row = catalog.loc[product_name]
+        return {
+            'price_groups': self._price_groups[product_name],
+            'avg_elasticity': row['avg_elasticity'],
+            'arc_elasticity': row['arc_elasticity'],
+            'loglog_elasticity': row['loglog_elasticity'],
+            'optimal_price_multiplier': row['optimal_price_multiplier'],
+            'is_elastic': row['is_elastic']
+        }
@@ -0,0 +1,212 @@
+"""
+数据后端
+仪表板通过统一的查询接口取数: 筛选明细、按维度汇总、产品排行、A/B汇总等。
+memory 后端在进程内用列式存储、增量接入和各索引回答查询；
+sqlite 后端把数据放在本地SQLite文件中，筛选和分组下推为SQL查询(见 warroom.sqlite_backend)
+"""
+from warroom.analyzers import ABTestAnalyzer
+from warroom.cube import RollupCube
+from warroom.filters import FilterEngine
+from warroom.ingest import IncrementalIngestor
+from warroom.ranking import ProductRankingIndex
+from warroom.sequential import SequentialABTest
+from warroom.store import unmapped_columns
+
+BACKENDS = ('memory', 'sqlite')
+
+
+def frame_overview(sales):
+    """销售数据帧的概览，国家和品类按首次出现的顺序排列(与 DataBackend.overview 相同)"""
+    return {
+        'min_date': sales['date'].min(),
+        'max_date': sales['date'].max(),
+        'rows': len(sales),
+        'countries': sales['country'].unique().tolist(),
+        'categories': sales['category'].unique().tolist(),
+    }
+
+
+class DataBackend:
+    """数据后端接口
+
+    筛选条件统一为 start/end(闭区间日期)、countries/categories(None 表示全部)
+    """
+
+    # 最近一次首次加载的计时: {'workers', 'seconds', 'sources': {名称: {'seconds', 'rows'}}}
+    load_report = None
+
+    def refresh(self):
+        """同步数据文件的变化，返回 {数据源: 新增行数}"""
+        raise NotImplementedError
+
+    @property
+    def loaded(self):
+        """是否已经完成首次加载"""
+        raise NotImplementedError
+
+    @property
+    def version(self):
+        """数据版本: 各数据源的(重载次数, 行数水位)"""
+        raise NotImplementedError
+
+    def source_version(self, name):
+        raise NotImplementedError
+
+    def overview(self):
+        """销售数据概览: {'min_date', 'max_date', 'rows', 'countries', 'categories'}"""
+        raise NotImplementedError
+
+    def by(self, axis, start=None, end=None, countries=None, categories=None):
+        """销售数据按 date/country/category 汇总，列为 cube.MEASURES"""
+        raise NotImplementedError
+
+    def daily_series(self, measure='sales_amount'):
+        """销售数据每个 (国家, 品类) 的按日序列，列为 (country, category) 二级索引"""
+        raise NotImplementedError
+
+    def select(self, name, start=None, end=None, countries=None, categories=None):
+        """筛选后的明细行"""
+        raise NotImplementedError
+
+    def top_products(self, k=20, start=None, end=None, countries=None, categories=None):
+        """筛选范围内销售额TOP K产品 [category, product, sales_amount]"""
+        raise NotImplementedError
+
+    def category_top(self, category, k=5):
+        """某品类全时段销售额TOP K产品 [product, sales_amount]"""
+        raise NotImplementedError
+
+    def product_summary(self, product):
+        """产品维度: {'category', 'avg_price', 'total_sales', 'units', 'margin', 'rank'}，
+        产品不存在时返回 None
+        """
+        raise NotImplementedError
+
+    def product_rows(self, product):
+        """产品的明细行，不保留产品明细(流式接入)时返回 None"""
+        raise NotImplementedError
+
+    def ab_analyzer(self):
+        """当前数据的A/B测试分析器"""
+        raise NotImplementedError
+
+    def sequential_ab(self):
+        """随新数据增量更新的序贯A/B检验(warroom.sequential.SequentialABTest)"""
+        raise NotImplementedError
+
+    def elasticity_data(self):
+        """价格弹性原始数据(数据量小，整表读取)"""
+        raise NotImplementedError
+
+    def resident_bytes(self):
+        """进程内为数据占用的私有内存字节数"""
+        return 0
+
+    def mapped_bytes(self):
+        """直接引用内存映射文件的数据字节数(各会话、各进程共享，不计入私有内存)"""
+        return 0
+
+
+class MemoryBackend(DataBackend):
+    """进程内后端: 增量接入器持有各数据源，汇总立方体、筛选索引、排行索引、序贯A/B检验随之更新"""
+
+    def __init__(self, ingestor=None, streaming=()):
+        self.ingestor = ingestor or IncrementalIngestor(streaming=streaming)
+        self.cube = RollupCube()
+        sources = tuple(name for name in ('sales', 'product') if name not in self.ingestor.streaming)
+        self.filter_engine = FilterEngine(sources=sources)
+        self.ranking_index = ProductRankingIndex()
+        self.sequential = SequentialABTest()
+        for target in (self.cube, self.filter_engine, self.ranking_index, self.sequential):
+            self.ingestor.attach(target.on_ingest)
+        self._frames = None
+
+    def refresh(self):
+        changes = self.ingestor.refresh()
+        frames, _ = self.ingestor.snapshot()
+        self._frames = dict(zip(self.ingestor.sources, frames))
+        return changes
+
+    @property
+    def load_report(self):
+        return self.ingestor.load_report
+
+    @property
+    def loaded(self):
+        return bool(self.ingestor.states)
+
+    @property
+    def version(self):
+        return self.ingestor.version
+
+    def source_version(self, name):
+        return self.ingestor.source_version(name)
+
+    def frame(self, name):
+        """数据源的只读视图: 浅拷贝，各会话拿到的是共享同一份数据的不同对象，修改时写时复制
+
+        非流式数据源的各列引用内存映射的列式文件(追加刷新之后也是)，不占进程私有内存
+        """
+        return self._frames[name].copy(deep=False)
+
+    def overview(self):
+        return frame_overview(self.frame('sales'))
+
+    def by(self, axis, start=None, end=None, countries=None, categories=None):
+        return self.cube.by(axis, start, end, countries, categories)
+
+    def daily_series(self, measure='sales_amount'):
+        return self.cube.series(measure)
+
+    def select(self, name, start=None, end=None, countries=None, categories=None):
+        if name not in self.filter_engine.indexes:
+            return self.frame(name)
+        return self.filter_engine.select(name, self.frame(name), start, end, countries, categories)
+
+    def top_products(self, k=20, start=None, end=None, countries=None, categories=None):
+        return self.ranking_index.top_products(k, start, end, countries, categories)
+
+    def category_top(self, category, k=5):
+        return self.ranking_index.category_top(category, k)
+
+    def product_summary(self, product):
+        return self.ranking_index.product_summary(product)
+
+    def product_rows(self, product):
+        if 'product' not in self.filter_engine.indexes:
+            return None
+        return self.filter_engine.lookup('product', self.frame('product'), 'product', product)
+
+    def ab_analyzer(self):
+        return ABTestAnalyzer(self.frame('ab'))
+
+    def sequential_ab(self):
+        return self.sequential
+
+    def elasticity_data(self):
+        return self.frame('elasticity')
+
+    def _frame_bytes(self, mapped):
+        """按列实际引用的缓冲区统计，追加刷新或整体重载之后同样准确"""
+        total = 0
+        for frame in self._frames.values():
+            usage = frame.memory_usage(index=False, deep=True)
+            unmapped = unmapped_columns(frame)
+            total += usage.drop(unmapped).sum() if mapped else usage[unmapped].sum()
+        return int(total)
+
+    def resident_bytes(self):
+        return self._frame_bytes(mapped=False)
+
+    def mapped_bytes(self):
+        return self._frame_bytes(mapped=True)
+
+
+def make_backend(kind='memory', **options):
+    """按名称创建数据后端"""
+    if kind == 'memory':
+        return MemoryBackend(**options)
+    if kind == 'sqlite':
+        from warroom.sqlite_backend import SQLiteBackend
+        return SQLiteBackend(**options)
+    raise ValueError(f"未知的数据后端: {kind}，可选 {', '.join(BACKENDS)}")
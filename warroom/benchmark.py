@@ -0,0 +1,218 @@
+"""
+分阶段性能基准
+在Streamlit之外按 app.py 的处理顺序逐阶段计时：加载、日期解析、列式存储、索引构建、
+侧边栏筛选、KPI、排行、A/B分析、价格弹性分析、趋势汇总，以及数据副本上的增量接入和追加刷新。
+每个(规模, 阶段)输出一行JSON，便于跟踪性能回退
+
+    python -m warroom.benchmark --scales 10000 100000 1000000 --output bench.jsonl
+    python -m warroom.benchmark --data-dir .
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from warroom.analyzers import ABTestAnalyzer, PriceElasticityAnalyzer
+from warroom.backends import frame_overview
+from warroom.cube import RollupCube, kpi_summary
+from warroom.engine import default_filter
+from warroom.filters import FilterEngine
+from warroom.generate import generate, write_frames
+from warroom.ingest import IncrementalIngestor
+from warroom.ranking import ProductRankingIndex
+from warroom.store import DATA_SOURCES, STORE_DIR, ColumnarStore
+
+# 追加刷新阶段每次向每个数据源追加的行数
+APPEND_ROWS = 100
+
+
+# ========== 各阶段 ==========
+# 每个阶段接收共享的上下文 ctx，可以读取前面阶段的结果并写入自己的结果
+
+def stage_load_csv(ctx):
+    ctx['raw'] = {name: pd.read_csv(os.path.join(ctx['data_dir'], file))
+                  for name, file in DATA_SOURCES.items()}
+
+
+def stage_parse_dates(ctx):
+    parsed = {}
+    for name, frame in ctx['raw'].items():
+        frame = frame.copy()
+        frame['date'] = pd.to_datetime(frame['date'])
+        parsed[name] = frame
+    ctx['parsed'] = parsed
+
+
+def stage_store_build(ctx):
+    store = ColumnarStore(store_dir=ctx['store_dir'], base_dir=ctx['data_dir'])
+    for name in DATA_SOURCES:
+        store.build(name)
+
+
+def stage_store_load(ctx):
+    store = ColumnarStore(store_dir=ctx['store_dir'], base_dir=ctx['data_dir'])
+    ctx['frames'] = dict(zip(DATA_SOURCES, store.load_all()))
+    # 与侧边栏默认值相同的筛选条件
+    ctx['filter'] = default_filter(frame_overview(ctx['frames']['sales']))
+
+
+def stage_index_build(ctx):
+    frames = ctx['frames']
+    engine, cube, ranking = FilterEngine(), RollupCube(), ProductRankingIndex()
+    for name, frame in frames.items():
+        for target in (engine, cube, ranking):
+            target.on_ingest(name, frame, True)
+    ctx.update(engine=engine, cube=cube, ranking=ranking)
+
+
+def stage_filter(ctx):
+    frames, f = ctx['frames'], ctx['filter']
+    ctx['filtered_df'] = ctx['engine'].select('sales', frames['sales'], **f)
+    ctx['engine'].select('product', frames['product'], **f)
+
+
+def stage_kpi(ctx):
+    daily = ctx['cube'].by('date', **ctx['filter'])
+    latest = daily.index.max()
+    for _, totals in daily.reindex([latest, latest - timedelta(days=1)], fill_value=0).iterrows():
+        kpi_summary(totals)
+
+
+def stage_rankings(ctx):
+    cube, ranking, f = ctx['cube'], ctx['ranking'], ctx['filter']
+    cube.by('country', **f)['sales_amount'].sort_values(ascending=False)
+    category_rank = cube.by('category', **f)['sales_amount'].sort_values(ascending=False)
+    ranking.top_products(20, **f)
+    if len(category_rank):
+        ranking.category_top(category_rank.index[0], 5)
+
+
+def stage_ab_analysis(ctx):
+    ABTestAnalyzer(ctx['frames']['ab']).analyze_all()
+
+
+def stage_elasticity_analysis(ctx):
+    PriceElasticityAnalyzer(ctx['frames']['elasticity']).analyze_catalog()
+
+
+def stage_trend(ctx):
+    ctx['cube'].by('date', **ctx['filter'])['sales_amount']
+
+
+def stage_ingest_load(ctx):
+    """增量接入器在数据副本上的首次加载，追加刷新阶段改写的是这份副本"""
+    data_dir = os.path.join(ctx['store_dir'], 'ingest')
+    if not os.path.exists(data_dir):
+        os.makedirs(data_dir)
+        for file in DATA_SOURCES.values():
+            shutil.copy(os.path.join(ctx['data_dir'], file), data_dir)
+        # 追加的行取各数据源最后 APPEND_ROWS 行的原始文本
+        ctx['append_rows'] = {name: pd.read_csv(os.path.join(data_dir, file), dtype=str).tail(APPEND_ROWS)
+                              for name, file in DATA_SOURCES.items()}
+    ingestor = IncrementalIngestor(store=ColumnarStore(store_dir=os.path.join(data_dir, STORE_DIR), base_dir=data_dir))
+    ingestor.refresh()
+    ctx.update(ingest_dir=data_dir, ingestor=ingestor)
+
+
+def stage_append_refresh(ctx):
+    """向每个CSV末尾追加 APPEND_ROWS 行后增量刷新，耗时应只与追加的行数有关"""
+    for name, frame in ctx['append_rows'].items():
+        frame.to_csv(os.path.join(ctx['ingest_dir'], DATA_SOURCES[name]), mode='a', header=False, index=False)
+    ctx['ingestor'].refresh()
+
+
+STAGES = [
+    ('load_csv', stage_load_csv),
+    ('parse_dates', stage_parse_dates),
+    ('store_build', stage_store_build),
+    ('store_load', stage_store_load),
+    ('index_build', stage_index_build),
+    ('filter', stage_filter),
+    ('kpi', stage_kpi),
+    ('rankings', stage_rankings),
+    ('ab_analysis', stage_ab_analysis),
+    ('elasticity_analysis', stage_elasticity_analysis),
+    ('trend', stage_trend),
+    ('ingest_load', stage_ingest_load),
+    ('append_refresh', stage_append_refresh),
+]
+
+
+def run_stages(data_dir, repeat=3, stages=None):
+    """对一个数据目录按顺序执行各阶段，每个阶段重复 repeat 次，返回记录列表"""
+    records = []
+    with tempfile.TemporaryDirectory() as store_dir:
+        ctx = {'data_dir': data_dir, 'store_dir': store_dir}
+        for name, stage in STAGES:
+            # 未选中的阶段只执行一次，为后续阶段准备数据
+            wanted = stages is None or name in stages
+            timings = []
+            for _ in range(repeat if wanted else 1):
+                start = time.perf_counter()
+                stage(ctx)
+                timings.append(time.perf_counter() - start)
+            if wanted:
+                records.append({
+                    'stage': name,
+                    'seconds_median': statistics.median(timings),
+                    'seconds_min': min(timings),
+                    'repeat': repeat,
+                })
+        rows = {f'{name}_rows': len(frame) for name, frame in ctx['frames'].items()}
+    for record in records:
+        record.update(rows)
+    return records
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='仪表板分阶段性能基准')
+    parser.add_argument('--scales', type=int, nargs='+', default=[10_000, 100_000],
+                        help='生成数据的销售行数规模')
+    parser.add_argument('--products-per-category', type=int, default=5)
+    parser.add_argument('--data-dir', help='使用已有数据目录，不生成数据')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--stages', nargs='+', choices=[s[0] for s in STAGES], help='只报告部分阶段')
+    parser.add_argument('--output', help='追加写入的JSON Lines文件，默认输出到标准输出')
+    args = parser.parse_args(argv)
+
+    run_id = datetime.now().isoformat(timespec='seconds')
+    out = open(args.output, 'a', encoding='utf-8') if args.output else sys.stdout
+    try:
+        if args.data_dir:
+            jobs = [(None, args.data_dir)]
+        else:
+            jobs = [(scale, None) for scale in args.scales]
+        for scale, data_dir in jobs:
+            with tempfile.TemporaryDirectory() as tmp:
+                if data_dir is None:
+                    write_frames(generate(scale, args.products_per_category), tmp)
+                    data_dir = tmp
+                for record in run_stages(data_dir, args.repeat, args.stages):
+                    record.update(run_id=run_id, scale=scale, **environment())
+                    out.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""
+追加缓冲区
+索引中随增量数据变长的数组按容量倍增预留空间，每次追加只复制新增部分，
+摊还后每个元素的代价是常数，不再每次把整个数组拼接一遍
+"""
+import numpy as np
+
+
+class AppendBuffer:
+    """容量倍增的一维数组
+
+    values() 返回已写入部分的视图；追加只写入已有视图之外的位置，扩容时换一块新内存，
+    其他线程手里的旧视图不受影响。初始数据直接引用，不复制(可以是只读的映射数组)
+    """
+
+    def __init__(self, dtype, initial=None):
+        data = np.empty(0, dtype=dtype) if initial is None else np.asarray(initial, dtype=dtype)
+        # (数据, 已写入长度) 放在一个元组里一次替换，读取时不会拿到不一致的组合
+        self._state = (data, len(data))
+
+    def __len__(self):
+        return self._state[1]
+
+    def values(self):
+        data, size = self._state
+        return data[:size]
+
+    def extend(self, values):
+        if not len(values):
+            return
+        data, size = self._state
+        n = size + len(values)
+        if n > len(data):
+            grown = np.empty(max(n, 2 * len(data), 16), dtype=data.dtype)
+            grown[:size] = data[:size]
+            data = grown
+        data[size:n] = values
+        self._state = (data, n)
@@ -0,0 +1,170 @@
+"""
+日期 × 国家 × 品类 汇总立方体
+加载时把销售数据预先汇总到立方体单元格，KPI、排行和趋势视图通过切片回答，
+查询成本只与单元格数量有关，与原始行数无关
+"""
+import numpy as np
+import pandas as pd
+
+# 立方体中保存的汇总指标，rows 为落在单元格内的原始行数
+MEASURES = ['sales_amount', 'orders', 'visitors', 'rows']
+
+AXES = ['date', 'country', 'category']
+
+
+class RollupCube:
+    """汇总立方体: 每个日期一个 cells[国家, 品类, 指标] 切片
+
+    切片按日期分开存放，追加一批数据只重新生成它涉及的日期切片(写时复制)，
+    代价与新增行数和涉及的日期数有关，与立方体总大小无关；出现新的国家或品类时才整体扩宽
+    """
+
+    def __init__(self, source='sales'):
+        self.source = source
+        self._reset()
+
+    def _reset(self):
+        # 整个状态放在一个元组里一次性替换，查询时不会读到更新了一半的数据；
+        # 已发布的切片不再原地修改，查询线程手里的旧状态始终一致
+        self._state = (
+            pd.DatetimeIndex([]),
+            pd.Index([], dtype=object),
+            pd.Index([], dtype=object),
+            (),
+        )
+
+    @classmethod
+    def from_frame(cls, frame, source='sales'):
+        cube = cls(source)
+        cube.add(frame)
+        return cube
+
+    # ========== 构建与增量更新 ==========
+    def on_ingest(self, name, rows, reset):
+        """增量接入器的回调"""
+        if name != self.source:
+            return
+        if reset:
+            self._reset()
+        self.add(rows)
+
+    def add(self, rows):
+        """把一批原始行累加到立方体"""
+        if rows.empty:
+            return
+        dates, countries, categories, slabs = self._state
+
+        new_countries = _extend(countries, rows['country'])
+        new_categories = _extend(categories, rows['category'])
+        n_c, n_k = len(new_countries), len(new_categories)
+        if (n_c, n_k) != (len(countries), len(categories)):
+            # 新的国家、品类追加在末尾，已有切片补零扩宽
+            pad = ((0, n_c - len(countries)), (0, n_k - len(categories)), (0, 0))
+            slabs = tuple(np.pad(slab, pad) for slab in slabs)
+
+        new_dates = dates.union(pd.DatetimeIndex(rows['date'].unique()))
+        if len(new_dates) != len(dates):
+            # 新日期(通常在末尾)先占位，下面随涉及的切片一起生成
+            placed = [None] * len(new_dates)
+            for slab, i in zip(slabs, new_dates.get_indexer(dates)):
+                placed[i] = slab
+            slabs = placed
+        else:
+            slabs = list(slabs)
+
+        # 只对本批涉及的日期汇总: touched 为这些日期的位置，local 为每行所在的切片
+        touched, local = np.unique(new_dates.get_indexer(rows['date']), return_inverse=True)
+        ci = new_countries.get_indexer(rows['country'])
+        ki = new_categories.get_indexer(rows['category'])
+        flat = (local * n_c + ci) * n_k + ki
+        block = np.empty((len(touched), n_c, n_k, len(MEASURES)))
+        for m, measure in enumerate(MEASURES):
+            weights = None if measure == 'rows' else rows[measure].to_numpy(dtype=float)
+            block[..., m] = np.bincount(flat, weights=weights, minlength=block[..., m].size).reshape(block.shape[:3])
+        for j, i in enumerate(touched):
+            slabs[i] = block[j] if slabs[i] is None else slabs[i] + block[j]
+
+        self._state = (new_dates, new_countries, new_categories, tuple(slabs))
+
+    @property
+    def dates(self):
+        return self._state[0]
+
+    @property
+    def countries(self):
+        return self._state[1].tolist()
+
+    @property
+    def categories(self):
+        return self._state[2].tolist()
+
+    def _slice(self, start=None, end=None, countries=None, categories=None):
+        """按筛选条件切出子立方体，start/end 为闭区间日期，None 表示不筛选"""
+        dates, all_countries, all_categories, slabs = self._state
+        lo = 0 if start is None else dates.searchsorted(pd.Timestamp(start), side='left')
+        hi = len(dates) if end is None else dates.searchsorted(pd.Timestamp(end), side='right')
+        ci = _positions(all_countries, countries)
+        ki = _positions(all_categories, categories)
+        sub = _stack(slabs[lo:hi], len(all_countries), len(all_categories))
+        # 不筛选的维度不做花式索引(会再复制一遍)
+        if countries is not None:
+            sub = sub[:, ci]
+        if categories is not None:
+            sub = sub[:, :, ki]
+        return dates[lo:hi], all_countries[ci], all_categories[ki], sub
+
+    def totals(self, start=None, end=None, countries=None, categories=None):
+        """筛选范围内各指标合计"""
+        sub = self._slice(start, end, countries, categories)[3]
+        return pd.Series(sub.sum(axis=(0, 1, 2)), index=MEASURES)
+
+    def by(self, axis, start=None, end=None, countries=None, categories=None):
+        """按某一维汇总，只返回有数据的维度值"""
+        dates, countries_idx, categories_idx, sub = self._slice(start, end, countries, categories)
+        pos = AXES.index(axis)
+        other = tuple(i for i in range(3) if i != pos)
+        values = sub.sum(axis=other)
+        index = [dates, countries_idx, categories_idx][pos]
+        result = pd.DataFrame(values, index=pd.Index(index, name=axis), columns=MEASURES)
+        return result[result['rows'] > 0]
+
+    def series(self, measure='sales_amount'):
+        """每个 (国家, 品类) 的按日序列: 行为日期，列为 (country, category) 二级索引"""
+        dates, countries, categories, slabs = self._state
+        cells = _stack(slabs, len(countries), len(categories))
+        values = cells[..., MEASURES.index(measure)].reshape(len(dates), len(countries) * len(categories))
+        columns = pd.MultiIndex.from_product([countries, categories], names=['country', 'category'])
+        return pd.DataFrame(values, index=pd.Index(dates, name='date'), columns=columns)
+
+
+def _stack(slabs, n_countries, n_categories):
+    """日期切片合成 [日期, 国家, 品类, 指标] 数组"""
+    if not slabs:
+        return np.zeros((0, n_countries, n_categories, len(MEASURES)))
+    return np.stack(slabs)
+
+
+def _extend(index, values):
+    """在维度末尾追加新出现的值，保持首次出现的顺序"""
+    seen = pd.Index(pd.unique(values.to_numpy()), dtype=object)
+    extra = seen[~seen.isin(index)]
+    return index.append(extra) if len(extra) else index
+
+
+def _positions(index, values):
+    """维度值对应的位置，None 表示全部，不存在的值忽略"""
+    if values is None:
+        return np.arange(len(index))
+    pos = index.get_indexer(list(values))
+    return pos[pos >= 0]
+
+
+def kpi_summary(totals):
+    """由汇总值计算加权转化率与客单价"""
+    sales, orders, visitors = totals['sales_amount'], totals['orders'], totals['visitors']
+    return {
+        'total_sales': sales,
+        'total_orders': int(orders),
+        'conversion': orders / visitors * 100 if visitors > 0 else 0.0,
+        'aov': sales / orders if orders > 0 else 0.0,
+    }
@@ -0,0 +1,140 @@
+"""
+分析引擎
+仪表板各视图的计算(KPI、排行、A/B结果、价格弹性与最优价格)，不依赖Streamlit，
+app.py 和批量预计算命令行(warroom.precompute)共用
+"""
+from datetime import timedelta
+
+import pandas as pd
+
+from warroom.analyzers import PriceElasticityAnalyzer
+from warroom.backends import make_backend
+from warroom.cube import MEASURES, kpi_summary
+from warroom.pricing import optimize_catalog
+
+
+def growth(current, previous):
+    """较昨日增长率(%)，昨日为0时记为0"""
+    return (current - previous) / previous * 100 if previous > 0 else 0
+
+
+def day_over_day(day, today_totals, yesterday_totals):
+    """某天的KPI及较前一天的增长率，参数为两天的 cube.MEASURES 合计"""
+    today, yesterday = kpi_summary(today_totals), kpi_summary(yesterday_totals)
+    return {
+        'date': day,
+        **today,
+        'sales_growth': growth(today['total_sales'], yesterday['total_sales']),
+        'orders_growth': growth(today['total_orders'], yesterday['total_orders']),
+        'aov_growth': growth(today['aov'], yesterday['aov']),
+    }
+
+
+def latest_kpis(daily_totals):
+    """按日汇总中最后一天的KPI，没有数据时返回 None"""
+    if daily_totals.empty:
+        return None
+    latest_date = daily_totals.index.max()
+    today, yesterday = [
+        totals for _, totals in daily_totals.reindex(
+            [latest_date, latest_date - timedelta(days=1)], fill_value=0).iterrows()
+    ]
+    return day_over_day(latest_date, today, yesterday)
+
+
+def sales_rank(backend, axis, **filter_args):
+    """按国家或品类的销售额排行 [axis, sales_amount]"""
+    return backend.by(axis, **filter_args)['sales_amount'].sort_values(ascending=False).reset_index()
+
+
+def hot_products(backend, k=10):
+    """全时段销售额TOP K产品名"""
+    return backend.top_products(k)['product'].tolist()
+
+
+def default_filter(overview, days=7):
+    """与侧边栏默认值相同的筛选条件: 最近 days 天、前三个国家和品类"""
+    max_date = overview['max_date'].date()
+    return dict(
+        start=max_date - timedelta(days=days),
+        end=max_date,
+        countries=overview['countries'][:3],
+        categories=overview['categories'][:3],
+    )
+
+
+class AnalyticsEngine:
+    """仪表板的计算入口，筛选条件与 DataBackend 相同(start/end/countries/categories)
+
+    各方法只读数据后端，可以在多个线程中同时调用
+    """
+
+    def __init__(self, backend=None, price_workers=None):
+        self.backend = backend or make_backend('memory')
+        if not self.backend.loaded:
+            self.backend.refresh()
+        self.price_workers = price_workers
+        self._ab_analyzer = None
+        self._price_analyzer = None
+
+    def overview(self):
+        return self.backend.overview()
+
+    def daily_totals(self, **filter_args):
+        return self.backend.by('date', **filter_args)
+
+    def kpis(self, **filter_args):
+        """筛选范围内最后一天的KPI及较昨日增长率"""
+        return latest_kpis(self.daily_totals(**filter_args))
+
+    def rankings(self, k=20, **filter_args):
+        """国家、品类销售额排行和TOP K产品"""
+        return {
+            'country': self.backend.by('country', **filter_args)[MEASURES].sort_values(
+                'sales_amount', ascending=False).reset_index(),
+            'category': self.backend.by('category', **filter_args)[MEASURES].sort_values(
+                'sales_amount', ascending=False).reset_index(),
+            'products': self.backend.top_products(k, **filter_args),
+        }
+
+    def ab_analyzer(self):
+        if self._ab_analyzer is None:
+            self._ab_analyzer = self.backend.ab_analyzer()
+        return self._ab_analyzer
+
+    def price_analyzer(self):
+        if self._price_analyzer is None:
+            self._price_analyzer = PriceElasticityAnalyzer(self.backend.elasticity_data())
+        return self._price_analyzer
+
+    def ab_results(self):
+        """所有实验的变体结果表(与筛选条件无关)"""
+        return self.ab_analyzer().analyze_all()
+
+    def elasticity(self):
+        """全品目价格弹性表(与筛选条件无关)"""
+        return self.price_analyzer().analyze_catalog().reset_index()
+
+    def price_optimization(self):
+        """全品目最优价格系数及自助法置信区间(与筛选条件无关，产品分块在进程池中计算)"""
+        return optimize_catalog(self.backend.elasticity_data(), workers=self.price_workers).reset_index()
+
+    def view(self, k=20, **filter_args):
+        """一组筛选条件下的仪表板视图: KPI、按日汇总和排行"""
+        daily = self.daily_totals(**filter_args)
+        return {
+            'kpis': latest_kpis(daily),
+            'daily': daily[MEASURES].reset_index(),
+            **{f'rank_{name}': table for name, table in self.rankings(k, **filter_args).items()},
+        }
+
+
+def as_json_value(value):
+    """numpy/pandas 标量转为可写入JSON的值"""
+    if isinstance(value, pd.Timestamp):
+        return value.date().isoformat()
+    if hasattr(value, 'item'):
+        return value.item()
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
@@ -0,0 +1,180 @@
+"""
+索引化筛选引擎
+按日期排序建立索引，日期范围用二分查找定位；国家、品类等列为每个取值预先记录行位置，
+侧边栏筛选条件变化时不再对整列做比较
+"""
+import numpy as np
+import pandas as pd
+
+from warroom.buffers import AppendBuffer
+
+DAY = np.timedelta64(1, 'D')
+
+# 各数据源建索引的列，产品数据另外按产品名记录行位置(产品详情取明细)
+INDEX_KEYS = {'product': ('country', 'category', 'product')}
+DEFAULT_KEYS = ('country', 'category')
+
+
+def encode_values(mapping, column):
+    """按编码表把列值编码为整数，新取值追加到编码表
+
+    分类列直接复用其编码，只对类别做字典查找；其他列用哈希分解
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes, uniques = column.cat.codes.to_numpy(), column.cat.categories
+    else:
+        codes, uniques = pd.factorize(column)
+    # 末尾的 -1 对应缺失值的编码 -1
+    table = np.array([mapping.setdefault(v, len(mapping)) for v in uniques] + [-1], dtype=np.int32)
+    return table[codes]
+
+
+class FilterIndex:
+    """单个数据帧的筛选索引
+
+    行按日期排序后的序号称为"名次"，_postings[列][取值] 为该取值所在行的名次(升序)；
+    日期、编码和名次列表都是追加缓冲区，按时间顺序追加的新行只写入新增部分
+    """
+
+    def __init__(self, keys=DEFAULT_KEYS):
+        self.keys = list(keys)
+        self.reset(None)
+
+    def reset(self, frame):
+        """用完整数据重建索引"""
+        self._dates = AppendBuffer('datetime64[ns]')
+        self._codes = {key: AppendBuffer(np.int32) for key in self.keys}
+        self._values = {key: {} for key in self.keys}
+        if frame is not None and not frame.empty:
+            dates = frame['date'].to_numpy()
+            self._dates = AppendBuffer(dates.dtype, dates)
+            self._codes = {key: AppendBuffer(np.int32, self._encode(key, frame[key])) for key in self.keys}
+        self._build()
+
+    def _encode(self, key, column):
+        return encode_values(self._values[key], column)
+
+    def _build(self):
+        dates = self._dates.values()
+        if len(dates) and (np.diff(dates) >= np.timedelta64(0)).all():
+            self._order = None  # 已按日期排序，名次即行号
+            self._sorted = dates
+        else:
+            self._order = np.argsort(dates, kind='stable')
+            self._sorted = dates[self._order]
+        self._postings = {}
+        for key in self.keys:
+            codes = self._codes[key].values()
+            if self._order is not None:
+                codes = codes[self._order]
+            ranks = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[ranks], np.arange(len(self._values[key]) + 1))
+            self._postings[key] = {
+                value: AppendBuffer(ranks.dtype, ranks[bounds[code]:bounds[code + 1]])
+                for value, code in self._values[key].items()
+            }
+
+    def append(self, rows):
+        """追加新行；新行日期不早于已有数据时直接接在末尾，否则重建"""
+        if rows.empty:
+            return
+        new_dates = rows['date'].to_numpy()
+        new_codes = {key: self._encode(key, rows[key]) for key in self.keys}
+        n = len(self._dates)
+        in_order = (self._order is None
+                    and (n == 0 or new_dates.min() >= self._sorted[-1])
+                    and (np.diff(new_dates) >= np.timedelta64(0)).all())
+
+        self._dates.extend(new_dates)
+        for key in self.keys:
+            self._codes[key].extend(new_codes[key])
+        if not in_order:
+            self._build()
+            return
+
+        for key in self.keys:
+            postings = self._postings[key]
+            values = list(self._values[key])
+            # 新行按编码分组，每个取值只追加自己的新名次
+            ranks = np.argsort(new_codes[key], kind='stable')
+            codes, starts = np.unique(new_codes[key][ranks], return_index=True)
+            for code, group in zip(codes, np.split(n + ranks, starts[1:])):
+                if code < 0:
+                    continue
+                buffer = postings.get(values[code])
+                if buffer is None:
+                    buffer = postings[values[code]] = AppendBuffer(group.dtype)
+                buffer.extend(group)
+        self._sorted = self._dates.values()
+
+    def __len__(self):
+        return len(self._dates)
+
+    def value_positions(self, key, value):
+        """某列取某值的全部行号(升序)"""
+        buffer = self._postings[key].get(value)
+        if buffer is None:
+            return np.array([], dtype=np.int64)
+        ranks = buffer.values()
+        return ranks if self._order is None else np.sort(self._order[ranks])
+
+    def positions(self, start=None, end=None, filters=None):
+        """满足筛选条件的行号(升序)
+
+        start/end 为闭区间日期；filters 为 {列: 取值列表}，取值列表为 None 表示不筛选
+        """
+        lo = 0 if start is None else np.searchsorted(self._sorted, np.datetime64(pd.Timestamp(start)), 'left')
+        hi = len(self._sorted) if end is None else np.searchsorted(
+            self._sorted, np.datetime64(pd.Timestamp(end).normalize()) + DAY, 'left')
+        if hi <= lo:
+            return np.array([], dtype=np.int64)
+
+        mask = None
+        for key, values in (filters or {}).items():
+            if values is None:
+                continue
+            hit = np.zeros(hi - lo, dtype=bool)
+            postings = self._postings[key]
+            for value in values:
+                buffer = postings.get(value)
+                if buffer is None:
+                    continue
+                ranks = buffer.values()
+                a, b = np.searchsorted(ranks, [lo, hi])
+                hit[ranks[a:b] - lo] = True
+            mask = hit if mask is None else mask & hit
+
+        ranks = np.arange(lo, hi) if mask is None else lo + np.flatnonzero(mask)
+        if self._order is None:
+            return ranks
+        return np.sort(self._order[ranks])
+
+
+class FilterEngine:
+    """所有视图共用的筛选引擎，每个数据源一个索引，随增量接入同步更新"""
+
+    def __init__(self, sources=('sales', 'product')):
+        self.indexes = {name: FilterIndex(INDEX_KEYS.get(name, DEFAULT_KEYS)) for name in sources}
+
+    def on_ingest(self, name, rows, reset):
+        """增量接入器的回调"""
+        index = self.indexes.get(name)
+        if index is None:
+            return
+        if reset:
+            index.reset(rows)
+        else:
+            index.append(rows)
+
+    def select(self, name, frame, start=None, end=None, countries=None, categories=None):
+        """按侧边栏条件筛选 frame，countries/categories 为 None 表示全部"""
+        pos = self.indexes[name].positions(
+            start, end, {'country': countries, 'category': categories})
+        # 其他会话可能已经接入了更新的数据，只取当前 frame 中存在的行
+        pos = pos[pos < len(frame)]
+        return frame.iloc[pos]
+
+    def lookup(self, name, frame, key, value):
+        """frame 中某列取某值的行，只查索引"""
+        pos = self.indexes[name].value_positions(key, value)
+        return frame.iloc[pos[pos < len(frame)]]
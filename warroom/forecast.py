@@ -0,0 +1,186 @@
+"""
+销售预测
+为每个 国家 × 品类 的日销售额序列训练一个轻量模型(岭回归: 周趋势 + 星期几)，
+拟合好的模型连同序列水位(最后有数据的日期、行数、销售额合计)保存到本地磁盘。
+数据更新后只重新拟合水位变化了的序列，需要拟合的序列多时分块交给进程池。
+
+模型只用日历特征，不依赖滞后值，任意日期都可以直接预测；
+任意筛选条件下的预测是所选序列预测之和，一次矩阵乘法即可得到
+"""
+import multiprocessing
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from warroom.store import STORE_DIR
+
+FORECAST_MODELS_PATH = os.path.join(STORE_DIR, 'forecast_models.pkl')
+
+# 模型或特征变化时递增，旧的模型文件随之作废
+FORECAST_VERSION = 1
+
+FORECAST_HORIZON = 14
+
+# 每个序列用截止其最后有数据日期的最近若干天拟合
+HISTORY_DAYS = 56
+
+RIDGE_ALPHA = 1.0
+
+# 预测区间: ±Z × 残差标准差(约95%)
+INTERVAL_Z = 1.96
+
+# 需要拟合的序列少于此值时在当前进程内拟合
+MIN_PARALLEL_SERIES = 200
+
+SERIES_PER_TASK = 64
+
+# 趋势特征的起点(按周计)，固定起点让各序列的系数可以直接相加
+EPOCH = pd.Timestamp('2000-01-01')
+
+
+def calendar_features(dates):
+    """日期的特征矩阵: 距 EPOCH 的周数，以及星期二到星期日的哑变量(星期一并入截距)"""
+    dates = pd.DatetimeIndex(dates)
+    weeks = ((dates - EPOCH).days.to_numpy(dtype=float)) / 7
+    weekday = np.eye(7)[dates.dayofweek.to_numpy()][:, 1:]
+    return np.column_stack([weeks, weekday])
+
+
+def series_watermarks(sales, rows):
+    """各序列的水位 (最后有数据的日期, 行数, 销售额合计)，sales/rows 为 daily_series 的结果"""
+    counts = rows.to_numpy()
+    has_rows = counts > 0
+    # 每列最后一个有数据的行
+    last = len(counts) - 1 - np.argmax(has_rows[::-1], axis=0)
+    return {
+        key: (rows.index[last[i]], int(counts[:, i].sum()), round(float(sales.iloc[:, i].sum()), 6))
+        for i, key in enumerate(rows.columns) if has_rows[:, i].any()
+    }
+
+
+def _fit_chunk(features, windows, targets):
+    """拟合一组序列(进程池任务)，返回每个序列的 (截距, 系数, 残差标准差)"""
+    from sklearn.linear_model import Ridge
+
+    fitted = []
+    for (start, stop), y in zip(windows, targets):
+        X = features[start:stop]
+        model = Ridge(alpha=RIDGE_ALPHA).fit(X, y)
+        residuals = y - model.predict(X)
+        sigma = float(np.sqrt(np.mean(residuals ** 2))) if len(y) > 1 else 0.0
+        fitted.append((float(model.intercept_), model.coef_.astype(float), sigma))
+    return fitted
+
+
+class SalesForecaster:
+    """各 (国家, 品类) 序列的拟合模型缓存(进程内共用一个实例，线程安全)
+
+    path 为空时不落盘
+    """
+
+    def __init__(self, path=FORECAST_MODELS_PATH, workers=None):
+        self.path = path
+        self.workers = workers
+        self.models = {}           # (国家, 品类) -> {'watermark', 'intercept', 'coef', 'sigma'}
+        self.end_date = None       # 全部数据的最后一天，预测从下一天开始
+        self.last_update = {}      # 最近一次更新: {'series', 'refit', 'seconds'}
+        self._lock = threading.Lock()
+        self._read()
+
+    def _read(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                saved = pickle.load(f)
+        except Exception as e:
+            print(f"⚠️ 预测模型文件无法读取，将重新拟合: {e}")
+            return
+        if saved.get('version') == FORECAST_VERSION:
+            self.models = saved['models']
+
+    def _write(self):
+        """先写临时文件再替换"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'version': FORECAST_VERSION, 'models': self.models}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+
+    # ========== 拟合 ==========
+    def update(self, backend):
+        """按数据后端的当前数据更新模型: 只拟合新出现或水位变化了的序列，返回拟合的序列数"""
+        started = time.perf_counter()
+        sales = backend.daily_series('sales_amount')
+        rows = backend.daily_series('rows').reindex(index=sales.index, columns=sales.columns, fill_value=0)
+        with self._lock:
+            watermarks = series_watermarks(sales, rows)
+            stale = [key for key, watermark in watermarks.items()
+                     if self.models.get(key, {}).get('watermark') != watermark]
+            if stale:
+                self._refit(sales, stale, watermarks)
+            removed = [key for key in self.models if key not in watermarks]
+            for key in removed:
+                del self.models[key]
+            if self.path and (stale or removed):
+                self._write()
+            self.end_date = sales.index.max() if len(sales.index) else None
+            self.last_update = {'series': len(watermarks), 'refit': len(stale),
+                                'seconds': time.perf_counter() - started}
+        return len(stale)
+
+    def _refit(self, sales, keys, watermarks):
+        # 连续的日期轴(缺失的日期销售额为0)，特征矩阵整体算一次，各序列取其中一段
+        dates = pd.date_range(sales.index.min(), sales.index.max(), freq='D')
+        values = sales[keys].reindex(dates, fill_value=0.0).to_numpy()
+        features = calendar_features(dates)
+        ends = dates.get_indexer([watermarks[key][0] for key in keys]) + 1
+        windows = [(max(0, end - HISTORY_DAYS), end) for end in ends]
+        targets = [values[start:stop, i] for i, (start, stop) in enumerate(windows)]
+
+        tasks = [(features, windows[i:i + SERIES_PER_TASK], targets[i:i + SERIES_PER_TASK])
+                 for i in range(0, len(keys), SERIES_PER_TASK)]
+        workers = self.workers or os.cpu_count() or 1
+        if workers > 1 and len(keys) >= MIN_PARALLEL_SERIES:
+            # spawn: 不在多线程的Streamlit进程里 fork
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks)),
+                                     mp_context=multiprocessing.get_context('spawn')) as pool:
+                chunks = list(pool.map(_fit_chunk, *zip(*tasks)))
+        else:
+            chunks = [_fit_chunk(*task) for task in tasks]
+
+        fitted = [result for chunk in chunks for result in chunk]
+        for key, (intercept, coef, sigma) in zip(keys, fitted):
+            self.models[key] = {'watermark': watermarks[key], 'intercept': intercept, 'coef': coef, 'sigma': sigma}
+
+    # ========== 预测 ==========
+    def forecast(self, countries=None, categories=None, horizon=FORECAST_HORIZON):
+        """筛选范围内各序列预测之和 [date, forecast, low, high]，从数据最后一天的下一天开始
+
+        预测值按序列截断在0以上；区间假设各序列残差独立
+        """
+        with self._lock:
+            keys = [key for key in self.models
+                    if (countries is None or key[0] in countries) and (categories is None or key[1] in categories)]
+            if not keys or self.end_date is None:
+                return pd.DataFrame(columns=['date', 'forecast', 'low', 'high'])
+            intercepts = np.array([self.models[key]['intercept'] for key in keys])
+            coefs = np.vstack([self.models[key]['coef'] for key in keys])
+            sigmas = np.array([self.models[key]['sigma'] for key in keys])
+            end_date = self.end_date
+
+        dates = pd.date_range(end_date + pd.Timedelta(days=1), periods=horizon, freq='D')
+        predicted = np.maximum(calendar_features(dates) @ coefs.T + intercepts, 0).sum(axis=1)
+        spread = INTERVAL_Z * np.sqrt(np.sum(sigmas ** 2))
+        return pd.DataFrame({
+            'date': dates,
+            'forecast': predicted,
+            'low': np.maximum(predicted - spread, 0),
+            'high': predicted + spread,
+        })
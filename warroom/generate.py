@@ -0,0 +1,254 @@
+"""
+模拟数据生成器
+按现有CSV的结构生成销售、产品、A/B测试、价格弹性数据，规模可配置(1万到1000万行)，
+相同参数和随机种子总是生成相同的数据
+
+    python -m warroom.generate --sales-rows 100000 --out bench_data
+    python -m warroom.generate --sources elasticity --out .
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from warroom.store import DATA_SOURCES
+
+# ========== 维度定义(与 test_*.csv 一致) ==========
+COUNTRIES = {
+    '美国': (37.0902, -95.7129),
+    '英国': (55.3781, -3.4360),
+    '德国': (51.1657, 10.4515),
+    '法国': (46.6034, 1.8883),
+    '日本': (36.2048, 138.2529),
+    '韩国': (35.9078, 127.7669),
+    '澳大利亚': (-25.2744, 133.7751),
+    '加拿大': (56.1304, -106.3468),
+    '新加坡': (1.3521, 103.8198),
+    '巴西': (-14.2350, -51.9253),
+}
+
+PRODUCTS = {
+    '电子产品': ['iPhone 15', 'MacBook Pro', 'AirPods Pro', 'iPad Air', 'Apple Watch'],
+    '服装': ['男士夹克', '女士连衣裙', '运动鞋', '牛仔裤', '羽绒服'],
+    '家居': ['智能音箱', '空气净化器', '咖啡机', '扫地机器人', '电动牙刷'],
+    '美妆': ['精华液', '粉底液', '口红', '面膜', '防晒霜'],
+    '食品': ['巧克力', '咖啡豆', '坚果', '茶叶', '蜂蜜'],
+    '玩具': ['乐高积木', '拼图', '遥控车', '玩偶', '棋盘游戏'],
+    '运动户外': ['瑜伽垫', '跑步鞋', '登山包', '自行车', '帐篷'],
+    '图书': ['小说', '技术书籍', '儿童绘本', '烹饪书', '旅行指南'],
+}
+
+EXPERIMENTS = {
+    '首页设计': ['A版（传统）', 'B版（新设计）'],
+    '价格策略': ['A价格（原价）', 'B价格（95折）', 'C价格（9折）'],
+    '促销文案': ['A文案（直接）', 'B文案（情感）', 'C文案（紧迫）'],
+    '配送选项': ['A（标准）', 'B（加急）', 'C（免费退换）'],
+}
+
+PRICE_MULTIPLIERS = [0.8, 0.9, 1.0, 1.1, 1.2]
+
+START_DATE = '2025-10-30'
+
+DEFAULT_SALES_ROWS = 7280
+
+# 超过这个天数后通过增加模拟市场扩大规模，避免日期跨度过大
+MAX_DAYS = 730
+
+
+def plan_dimensions(sales_rows, products_per_category=5):
+    """根据目标销售行数确定 (天数, 国家列表, 品类 -> 产品列表)"""
+    categories = list(PRODUCTS)
+    countries = dict(COUNTRIES)
+    days = -(-sales_rows // (len(countries) * len(categories)))
+    if days > MAX_DAYS:
+        rng = np.random.default_rng(len(countries))
+        n_markets = -(-sales_rows // (MAX_DAYS * len(categories)))
+        for i in range(len(countries), n_markets):
+            countries[f'市场{i + 1:04d}'] = (round(rng.uniform(-60, 70), 4), round(rng.uniform(-180, 180), 4))
+        days = -(-sales_rows // (len(countries) * len(categories)))
+
+    products = {}
+    for category, names in PRODUCTS.items():
+        extra = [f'{category}SKU{i:05d}' for i in range(len(names) + 1, products_per_category + 1)]
+        products[category] = (names + extra)[:products_per_category]
+    return days, countries, products
+
+
+def _rank_within(values, groups):
+    """组内按值降序的名次(从1开始)"""
+    order = np.lexsort((-values, groups))
+    ranks = np.empty(len(values), dtype=np.int64)
+    starts = np.r_[True, groups[order][1:] != groups[order][:-1]]
+    first = np.maximum.accumulate(np.where(starts, np.arange(len(order)), 0))
+    ranks[order] = np.arange(len(order)) - first + 1
+    return ranks
+
+
+def generate_sales(rng, dates, countries, categories):
+    """每天 × 国家 × 品类 一行"""
+    n_c, n_k = len(countries), len(categories)
+    n = len(dates) * n_c * n_k
+    date_idx = np.repeat(np.arange(len(dates)), n_c * n_k)
+    country_idx = np.tile(np.repeat(np.arange(n_c), n_k), len(dates))
+    category_idx = np.tile(np.arange(n_k), len(dates) * n_c)
+
+    # 国家规模 × 品类热度 × 临近年底的大促趋势
+    market_size = rng.uniform(0.5, 3.0, n_c)[country_idx]
+    category_pull = rng.uniform(0.7, 1.4, n_k)[category_idx]
+    season = 1 + 0.6 * (date_idx / max(len(dates) - 1, 1))
+    visitors = np.maximum(60, rng.normal(600, 150, n) * market_size * category_pull * season).astype(np.int64)
+    conversion = rng.uniform(2.0, 8.0, n)
+    orders = np.maximum(4, np.round(visitors * conversion / 100)).astype(np.int64)
+    aov = rng.uniform(50, 175, n)
+    sales = orders * aov
+
+    lat = np.array([v[0] for v in countries.values()])[country_idx]
+    lon = np.array([v[1] for v in countries.values()])[country_idx]
+    cell = date_idx * n_c + country_idx
+    return pd.DataFrame({
+        'date': dates[date_idx],
+        'country': np.array(list(countries), dtype=object)[country_idx],
+        'category': np.array(categories, dtype=object)[category_idx],
+        'sales_amount': sales,
+        'orders': orders,
+        'visitors': visitors,
+        'conversion_rate': np.round(orders / visitors * 100, 2),
+        'avg_order_value': np.round(sales / orders, 2),
+        'category_rank': _rank_within(sales, cell),
+        'latitude': lat,
+        'longitude': lon,
+    })
+
+
+def generate_products(rng, sales, products):
+    """每个销售单元格按随机份额拆分到该品类的各个产品"""
+    per_category = {k: len(v) for k, v in products.items()}
+    counts = sales['category'].map(per_category).to_numpy()
+    cell = np.repeat(np.arange(len(sales)), counts)
+    offset = np.arange(len(cell)) - np.repeat(np.cumsum(counts) - counts, counts)
+    names = _product_names(sales['category'].to_numpy(), products, counts)
+
+    catalog = [p for items in products.values() for p in items]
+    base_price = pd.Series(rng.uniform(50, 520, len(catalog)), index=catalog)
+    price = base_price.reindex(names).to_numpy() * rng.uniform(0.9, 1.1, len(cell))
+    weights = rng.gamma(1.0, 1.0, len(cell))
+    sales_amount = sales['sales_amount'].to_numpy()[cell] * weights / np.bincount(cell, weights)[cell]
+    return pd.DataFrame({
+        'date': sales['date'].to_numpy()[cell],
+        'country': sales['country'].to_numpy()[cell],
+        'category': sales['category'].to_numpy()[cell],
+        'product': names,
+        'sales_amount': sales_amount,
+        'price': price,
+        'units_sold': np.floor(sales_amount / price).astype(np.int64),
+        'product_rank': offset + 1,
+        'profit_margin': rng.uniform(0.2, 0.4, len(cell)),
+    })
+
+
+def _product_names(categories, products, counts):
+    """按品类批量展开每个单元格的产品名"""
+    names = np.empty(counts.sum(), dtype=object)
+    starts = np.cumsum(counts) - counts
+    for category, items in products.items():
+        rows = np.flatnonzero(categories == category)
+        for j, item in enumerate(items):
+            names[starts[rows] + j] = item
+    return names
+
+
+def generate_ab(rng, dates):
+    """每个实验、每个变体每天一行，非A变体带随机效果"""
+    rows = []
+    for experiment, variants in EXPERIMENTS.items():
+        base = rng.uniform(2.0, 3.5)
+        for variant in variants:
+            effect = rng.uniform(0.9, 1.5) if variant[0] != 'A' else 1.0
+            visitors = rng.integers(1000, 5000, len(dates))
+            rate = np.clip(rng.normal(base * effect, 0.2, len(dates)), 0.5, None)
+            conversions = np.round(visitors * rate / 100).astype(np.int64)
+            revenue = conversions * rng.uniform(80, 160, len(dates))
+            rows.append(pd.DataFrame({
+                'experiment': experiment,
+                'variant': variant,
+                'date': dates,
+                'visitors': visitors,
+                'conversions': conversions,
+                'conversion_rate': conversions / visitors * 100,
+                'revenue': revenue,
+            }))
+    return pd.concat(rows, ignore_index=True)
+
+
+def generate_elasticity(rng, dates, products):
+    """每天 × 产品 × 价格系数 一行"""
+    names = np.array([p for items in products.values() for p in items], dtype=object)
+    multipliers = np.array(PRICE_MULTIPLIERS)
+    n_d, n_p, n_m = len(dates), len(names), len(multipliers)
+    date_idx = np.repeat(np.arange(n_d), n_p * n_m)
+    product_idx = np.tile(np.repeat(np.arange(n_p), n_m), n_d)
+    mult = np.tile(multipliers, n_d * n_p)
+
+    # 每个产品一个固定弹性，需求 = 基础需求 × 价格系数^弹性 × 噪声
+    elasticity = rng.uniform(-2.5, -0.3, n_p)[product_idx]
+    base_demand = rng.uniform(50, 300, n_p)[product_idx]
+    base_price = rng.uniform(50, 520, n_p)[product_idx]
+    demand = base_demand * mult ** elasticity * rng.uniform(0.85, 1.15, len(mult))
+    return pd.DataFrame({
+        'date': dates[date_idx],
+        'product': names[product_idx],
+        'price_multiplier': mult,
+        'demand': demand,
+        'sales': demand * base_price * mult,
+    })
+
+
+def generate(sales_rows=DEFAULT_SALES_ROWS, products_per_category=5, seed=0, start_date=START_DATE,
+             sources=None):
+    """生成数据，返回 {数据源: DataFrame}"""
+    sources = list(sources or DATA_SOURCES)
+    days, countries, products = plan_dimensions(sales_rows, products_per_category)
+    dates = pd.date_range(start_date, periods=days, freq='D').strftime('%Y-%m-%d').to_numpy(dtype=object)
+
+    frames = {}
+    sales = generate_sales(np.random.default_rng([seed, 1]), dates, countries, list(products)).head(sales_rows)
+    if 'sales' in sources:
+        frames['sales'] = sales
+    if 'product' in sources:
+        frames['product'] = generate_products(np.random.default_rng([seed, 2]), sales, products)
+    if 'ab' in sources:
+        # A/B实验只覆盖最后30天
+        frames['ab'] = generate_ab(np.random.default_rng([seed, 3]), dates[-30:])
+    if 'elasticity' in sources:
+        frames['elasticity'] = generate_elasticity(np.random.default_rng([seed, 4]), dates[-30:], products)
+    return frames
+
+
+def write_frames(frames, out_dir):
+    """按 DATA_SOURCES 中的文件名写出CSV"""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {}
+    for name, frame in frames.items():
+        paths[name] = os.path.join(out_dir, DATA_SOURCES[name])
+        frame.to_csv(paths[name], index=False, encoding='utf-8-sig')
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='生成仪表板模拟数据')
+    parser.add_argument('--sales-rows', type=int, default=DEFAULT_SALES_ROWS, help='销售数据行数')
+    parser.add_argument('--products-per-category', type=int, default=5, help='每个品类的产品数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--start-date', default=START_DATE)
+    parser.add_argument('--sources', nargs='+', choices=list(DATA_SOURCES), help='只生成部分数据源')
+    parser.add_argument('--out', default='.', help='输出目录')
+    args = parser.parse_args(argv)
+
+    frames = generate(args.sales_rows, args.products_per_category, args.seed, args.start_date, args.sources)
+    for name, path in write_frames(frames, args.out).items():
+        print(f"✅ {path}: {len(frames[name]):,} 行")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""
+增量数据接入
+按数据源记录已读取的文件偏移和行数水位，CSV追加新行时由列式存储只解析并写入新增部分，
+数据重新取为映射的视图，新增行推送给已注册的派生聚合
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from warroom.schema import apply_column_types, dimension_attributes, merge_dimension, split_dimension
+from warroom.store import (
+    CHUNK_BYTES,
+    DATA_SOURCES,
+    ColumnarStore,
+    csv_header,
+    iter_csv_chunks,
+    prefix_checksum,
+)
+
+
+class SourceState:
+    """单个数据源的接入状态
+
+    流式数据源不保留数据行: frame 为只有列结构的空表，streamed 为已推送给订阅者的行数
+    """
+
+    def __init__(self, name, frame, offset, prefix_crc):
+        self.name = name
+        self.columns = list(frame.columns)  # CSV中的列顺序，解析追加行时使用
+        self.frame, self.dimension = split_dimension(name, frame)
+        self.offset = offset          # 已解析到的CSV字节偏移
+        self.prefix_crc = prefix_crc  # 已解析部分末尾的校验和
+        self.generation = 0           # 发生整体重载的次数
+        self.streamed = 0
+        self.mapped = False           # 数据直接引用内存映射的列式文件
+
+    @property
+    def rows(self):
+        """行数水位"""
+        return len(self.frame) + self.streamed
+
+
+class IncrementalIngestor:
+    """增量接入器
+
+    首次加载走列式存储，之后每次 refresh 只检查文件大小，
+    有追加时解析新增字节；文件被改写或截断时整体重载该数据源。
+    首次加载时各数据源在线程池中并行读取(Arrow读取和CSV解析时释放GIL)，
+    load_workers=1 时依次读取。
+    streaming 中的数据源按 chunk_bytes 分块读取CSV，逐块推送给订阅者后即丢弃，
+    内存只与块大小和订阅者的汇总结果有关
+    """
+
+    def __init__(self, store=None, sources=None, load_workers=None, streaming=(), chunk_bytes=CHUNK_BYTES):
+        self.store = store or ColumnarStore()
+        self.sources = list(sources or DATA_SOURCES)
+        self.load_workers = load_workers or len(self.sources)
+        self.streaming = set(streaming)
+        self.chunk_bytes = chunk_bytes
+        self.states = {}
+        # 最近一次首次加载的计时: {'workers', 'seconds', 'sources': {名称: {'seconds', 'rows'}}}
+        self.load_report = None
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        """注册派生聚合
+
+        callback(name, new_rows, reset)：reset 为 True 表示该数据源整体重载，
+        new_rows 为重载后的完整数据
+        """
+        self._subscribers.append(callback)
+
+    def attach(self, callback):
+        """注册派生聚合，并先用当前已加载的完整数据初始化它"""
+        with self._lock:
+            for name, state in self.states.items():
+                callback(name, state.frame, True)
+            self._subscribers.append(callback)
+
+    def _notify(self, name, new_rows, reset):
+        for callback in self._subscribers:
+            callback(name, new_rows, reset)
+
+    def _csv_path(self, name):
+        return os.path.join(self.store.base_dir, DATA_SOURCES[name])
+
+    def _read_full(self, name):
+        """读取一个数据源的完整数据，不改动接入器状态，可以在工作线程中执行"""
+        frame, offset = self.store.load_prefix(name)
+        state = SourceState(name, frame, offset, None)
+        state.mapped = name in self.store.mapped
+        csv_path = self._csv_path(name)
+        if os.path.exists(csv_path):
+            state.prefix_crc = prefix_checksum(csv_path, offset)
+        return state
+
+    def _install(self, state):
+        previous = self.states.get(state.name)
+        if previous is not None:
+            state.generation = previous.generation + 1
+        self.states[state.name] = state
+        return state
+
+    def _reload(self, name):
+        """整体重载一个数据源并通知订阅者，返回行数"""
+        if name in self.streaming:
+            return self._stream_full(name).rows
+        state = self._install(self._read_full(name))
+        self._notify(name, state.frame, True)
+        return state.rows
+
+    def _stream_full(self, name):
+        """流式数据源: 先用空表重置订阅者，再逐块推送整个CSV"""
+        csv_path = self._csv_path(name)
+        names, header_bytes = csv_header(csv_path)
+        empty = apply_column_types(pd.DataFrame({col: pd.Series(dtype=object) for col in names}))
+        state = self._install(SourceState(name, empty, header_bytes, None))
+        self._notify(name, state.frame, True)
+        self._stream_from(state)
+        return state
+
+    def _stream_from(self, state):
+        """逐块推送 offset 之后新增的完整行，返回新增行数"""
+        csv_path = self._csv_path(state.name)
+        added = 0
+        for chunk, offset in iter_csv_chunks(csv_path, state.columns, state.offset, self.chunk_bytes):
+            state.streamed += len(chunk)
+            state.offset = offset
+            added += len(chunk)
+            self._notify(state.name, chunk, False)
+        state.prefix_crc = prefix_checksum(csv_path, state.offset)
+        return added
+
+    def _load_initial(self, names):
+        """并行读取尚未加载的数据源，按数据源顺序安装并通知订阅者；流式数据源随后依次推送"""
+        def timed_read(name):
+            start = time.perf_counter()
+            state = self._read_full(name)
+            return state, time.perf_counter() - start
+
+        start = time.perf_counter()
+        streamed = [name for name in names if name in self.streaming]
+        names = [name for name in names if name not in self.streaming]
+        workers = min(self.load_workers, len(names))
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='warroom-load') as pool:
+                results = list(pool.map(timed_read, names))
+        else:
+            results = [timed_read(name) for name in names]
+
+        for state, _ in results:
+            self._install(state)
+            self._notify(state.name, state.frame, True)
+        for name in streamed:
+            stream_start = time.perf_counter()
+            results.append((self._stream_full(name), time.perf_counter() - stream_start))
+
+        self.load_report = {
+            'workers': workers,
+            'seconds': time.perf_counter() - start,
+            'sources': {state.name: {'seconds': seconds, 'rows': state.rows} for state, seconds in results},
+        }
+        return {state.name: state.rows for state, _ in results}
+
+    def _read_appended(self, state):
+        """列式存储写入 offset 之后新增的完整行，数据换成同步后的映射视图，返回新增行
+
+        列式存储已被其他进程同步到更靠后的位置时，新增行也包括那些行
+        """
+        frame, end = self.store.load_prefix(state.name)
+        old_rows = len(state.frame)
+        if end == state.offset or len(frame) < old_rows:
+            return None
+        new_rows, new_dimension = split_dimension(state.name, frame.iloc[old_rows:])
+        state.dimension = merge_dimension(state.dimension, new_dimension)
+        # 只去掉维度属性列，数据列仍是映射的视图
+        state.frame = frame.drop(columns=dimension_attributes(state.name, frame.columns))
+        state.mapped = state.name in self.store.mapped
+        state.offset = end
+        state.prefix_crc = prefix_checksum(self._csv_path(state.name), end)
+        return new_rows
+
+    def refresh(self):
+        """检查所有数据源，返回 {数据源: 新增行数}"""
+        changes = {}
+        with self._lock:
+            missing = [name for name in self.sources if name not in self.states]
+            if missing:
+                changes.update(self._load_initial(missing))
+
+            for name in self.sources:
+                if name in missing:
+                    continue
+                state = self.states[name]
+                csv_path = self._csv_path(name)
+                if not os.path.exists(csv_path):
+                    continue
+                size = os.path.getsize(csv_path)
+                if size == state.offset:
+                    continue
+                if size < state.offset or prefix_checksum(csv_path, state.offset) != state.prefix_crc:
+                    # 不是纯追加，整体重载
+                    changes[name] = self._reload(name)
+                    continue
+
+                if name in self.streaming:
+                    added = self._stream_from(state)
+                    if added:
+                        changes[name] = added
+                    continue
+
+                new_rows = self._read_appended(state)
+                if new_rows is not None:
+                    self._notify(name, new_rows, False)
+                    changes[name] = len(new_rows)
+        return changes
+
+    def frames(self):
+        """按数据源顺序返回当前数据"""
+        return tuple(self.states[name].frame for name in self.sources)
+
+    def snapshot(self):
+        """同时取出当前数据和对应的数据版本，保证两者一致"""
+        with self._lock:
+            return self.frames(), self.version
+
+    def dimension(self, name):
+        """数据源拆出的维度表(如销售数据的国家经纬度)，没有时为 None"""
+        return self.states[name].dimension
+
+    def source_version(self, name):
+        """单个数据源的版本: (重载次数, 行数水位)"""
+        state = self.states[name]
+        return state.generation, state.rows
+
+    @property
+    def version(self):
+        """数据版本: 各数据源的(重载次数, 行数水位)"""
+        return tuple(self.source_version(name) for name in self.sources if name in self.states)
@@ -0,0 +1,22 @@
+"""
+延迟导入
+图表库只在真正绘图时才导入，冷启动和不绘图的重跑不承担导入开销
+"""
+import importlib
+
+
+class LazyModule:
+    """首次访问属性时才导入的模块代理"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f'<LazyModule {self._name} ({state})>'
@@ -0,0 +1,225 @@
+"""
+实时模式
+从本地数据流(追加写入的CSV文件，或本地socket上的 JSON Lines 订单事件)消费新记录，
+按 (日期, 国家, 品类) 维护累加器，KPI和环比的更新代价只与新事件数量有关
+"""
+import bisect
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from warroom.cube import MEASURES
+from warroom.schema import apply_column_types
+from warroom.store import csv_header, iter_csv_chunks, prefix_checksum
+
+# 事件中必须有的字段
+EVENT_FIELDS = ['date', 'country', 'category', 'sales_amount', 'orders', 'visitors']
+
+DAY = pd.Timedelta(days=1)
+
+
+class KPIAccumulator:
+    """按 (日期, 国家, 品类) 累加 sales_amount / orders / visitors / rows
+
+    _days[日期][(国家, 品类)] 为长度为4的累加数组，日期另存一份有序列表
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._days = {}
+        self._dates = []
+        self.events = 0
+
+    def add(self, rows):
+        """累加一批事件，代价与批大小成正比"""
+        if rows.empty:
+            return
+        cells = rows.groupby(['date', 'country', 'category'], observed=True).agg(
+            sales_amount=('sales_amount', 'sum'),
+            orders=('orders', 'sum'),
+            visitors=('visitors', 'sum'),
+            rows=('sales_amount', 'size'),
+        )
+        for (day, country, category), values in zip(cells.index, cells.to_numpy(dtype=float)):
+            day = pd.Timestamp(day).normalize()
+            cells_of_day = self._days.get(day)
+            if cells_of_day is None:
+                cells_of_day = self._days[day] = {}
+                bisect.insort(self._dates, day)
+            key = (country, category)
+            if key in cells_of_day:
+                cells_of_day[key] += values
+            else:
+                cells_of_day[key] = values.copy()
+        self.events += len(rows)
+
+    def day_totals(self, day, countries=None, categories=None):
+        """某天筛选范围内的合计，索引为 cube.MEASURES"""
+        totals = np.zeros(len(MEASURES))
+        countries = None if countries is None else set(countries)
+        categories = None if categories is None else set(categories)
+        for (country, category), values in self._days.get(day, {}).items():
+            if countries is not None and country not in countries:
+                continue
+            if categories is not None and category not in categories:
+                continue
+            totals += values
+        return pd.Series(totals, index=MEASURES)
+
+    def latest(self, start=None, end=None, countries=None, categories=None):
+        """筛选范围内有数据的最后一天及其前一天的合计
+
+        返回 (最后一天, 当天合计, 前一天合计)，没有数据时返回 None
+        """
+        lo = 0 if start is None else bisect.bisect_left(self._dates, pd.Timestamp(start))
+        hi = len(self._dates) if end is None else bisect.bisect_right(self._dates, pd.Timestamp(end))
+        for day in reversed(self._dates[lo:hi]):
+            today = self.day_totals(day, countries, categories)
+            if today['rows'] > 0:
+                previous = day - DAY
+                if start is not None and previous < pd.Timestamp(start):
+                    yesterday = pd.Series(0.0, index=MEASURES)
+                else:
+                    yesterday = self.day_totals(previous, countries, categories)
+                return day, today, yesterday
+        return None
+
+
+# ========== 数据流 ==========
+class FileTail:
+    """跟踪CSV文件末尾新追加的完整行；文件被截断或改写时从头重读"""
+
+    def __init__(self, path):
+        self.path = path
+        self.names = None
+        self.offset = 0
+        self.prefix_crc = None
+
+    def read(self):
+        """返回 (是否需要重置累加器, 新数据块列表)"""
+        if not os.path.exists(self.path):
+            return False, []
+        reset = False
+        size = os.path.getsize(self.path)
+        if size == self.offset:
+            return False, []
+        if (self.names is None or size < self.offset
+                or prefix_checksum(self.path, self.offset) != self.prefix_crc):
+            self.names, self.offset = csv_header(self.path)
+            reset = True
+        chunks = []
+        for chunk, offset in iter_csv_chunks(self.path, self.names, self.offset):
+            chunks.append(chunk)
+            self.offset = offset
+        self.prefix_crc = prefix_checksum(self.path, self.offset)
+        return reset, chunks
+
+    def close(self):
+        pass
+
+    def describe(self):
+        return f'文件 {self.path}'
+
+
+class _ReusableTCPServer(socketserver.ThreadingTCPServer):
+    """重启后可以立即重新绑定端口，连接线程随进程退出"""
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class SocketFeed:
+    """本地TCP端口上接收 JSON Lines 订单事件(订单流的本地替身)
+
+    每行一个JSON对象，至少包含 EVENT_FIELDS；格式不对的行丢弃并计数
+    """
+
+    def __init__(self, host='127.0.0.1', port=9099):
+        self.host, self.port = host, port
+        self.rejected = 0
+        self._queue = queue.SimpleQueue()
+        feed = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        event = json.loads(line)
+                        feed._queue.put({field: event[field] for field in EVENT_FIELDS})
+                    except (ValueError, KeyError, TypeError):
+                        feed.rejected += 1
+
+        self._server = _ReusableTCPServer((host, port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, name='warroom-live-socket', daemon=True)
+        self._thread.start()
+
+    def read(self):
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if not events:
+            return False, []
+        return False, [apply_column_types(pd.DataFrame(events, columns=EVENT_FIELDS))]
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def describe(self):
+        return f'socket {self.host}:{self.port}'
+
+
+def make_feed(spec):
+    """按描述创建数据流: file:<路径> 或 socket:<主机>:<端口>"""
+    kind, _, target = spec.partition(':')
+    if kind == 'file':
+        return FileTail(target)
+    if kind == 'socket':
+        host, _, port = target.rpartition(':')
+        return SocketFeed(host or '127.0.0.1', int(port))
+    raise ValueError(f'未知的实时数据流: {spec}')
+
+
+class LiveMonitor:
+    """实时KPI监控: 各会话共用，poll 时把所有数据流的新事件并入累加器(线程安全)"""
+
+    def __init__(self, feeds):
+        self.feeds = list(feeds)
+        self.accumulator = KPIAccumulator()
+        self.last_poll = None
+        self.last_events = 0
+        self._lock = threading.Lock()
+
+    def poll(self):
+        """消费新事件，返回本次新增的事件数"""
+        with self._lock:
+            added = 0
+            for feed in self.feeds:
+                reset, chunks = feed.read()
+                if reset:
+                    # 文件从头重读时累加器一并重建，此前从其他数据流收到的事件不再计入
+                    self.accumulator.reset()
+                for chunk in chunks:
+                    self.accumulator.add(chunk)
+                    added += len(chunk)
+            self.last_poll = time.time()
+            self.last_events = added
+            return added
+
+    def latest(self, start=None, end=None, countries=None, categories=None):
+        with self._lock:
+            return self.accumulator.latest(start, end, countries, categories)
+
+    def close(self):
+        for feed in self.feeds:
+            feed.close()
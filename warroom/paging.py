@@ -0,0 +1,108 @@
+"""
+服务端分页与图表降采样
+明细表在服务端完成搜索、排序和分页，只把当前页发送给浏览器；
+时间序列按点数预算降采样(LTTB / 分桶最大最小值)
+"""
+import numpy as np
+import pandas as pd
+
+DEFAULT_POINT_BUDGET = 500
+
+
+# ========== 分页 ==========
+def search_mask(frame, text):
+    """文本列(含分类列)中包含 text 的行"""
+    mask = np.zeros(len(frame), dtype=bool)
+    for col in frame.columns:
+        column = frame[col]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            # 只在类别上做字符串匹配，再按编码筛选
+            categories = column.cat.categories.astype(str)
+            hit = np.flatnonzero(categories.str.contains(text, regex=False))
+            if len(hit):
+                mask |= np.isin(column.cat.codes.to_numpy(), hit)
+        elif pd.api.types.is_string_dtype(column.dtype) or column.dtype == object:
+            mask |= column.astype(str).str.contains(text, regex=False).to_numpy()
+    return mask
+
+
+def page_order(frame, sort_by=None, ascending=True, search=None):
+    """搜索、排序后的行位置"""
+    positions = np.arange(len(frame))
+    if search:
+        positions = positions[search_mask(frame, search)]
+    if sort_by:
+        column = frame[sort_by].iloc[positions].reset_index(drop=True)
+        order = column.sort_values(ascending=ascending, kind='stable').index.to_numpy()
+        positions = positions[order]
+    return positions
+
+
+def page_count(total_rows, page_size):
+    return max(1, -(-total_rows // page_size))
+
+
+def take_page(frame, positions, page, page_size):
+    """取出第 page 页(从1开始)的行"""
+    start = (page - 1) * page_size
+    return frame.iloc[positions[start:start + page_size]]
+
+
+# ========== 降采样 ==========
+def lttb_indices(x, y, budget):
+    """Largest-Triangle-Three-Buckets 降采样，返回保留点的下标
+
+    首尾点固定保留，中间按桶选出与相邻桶构成三角形面积最大的点，保留曲线形状
+    """
+    n = len(x)
+    if budget >= n or budget < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, budget - 1).astype(int)
+    keep = np.empty(budget, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(budget - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[nxt_lo:nxt_hi].mean()
+        avg_y = y[nxt_lo:nxt_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        keep[i + 1] = a
+    return keep
+
+
+def minmax_indices(y, budget):
+    """分桶保留每桶的最小值和最大值，适合有尖峰的序列"""
+    n = len(y)
+    if budget >= n or budget < 2:
+        return np.arange(n)
+    buckets = np.array_split(np.arange(n), budget // 2)
+    keep = set()
+    for bucket in buckets:
+        values = y[bucket]
+        keep.add(bucket[values.argmin()])
+        keep.add(bucket[values.argmax()])
+    return np.array(sorted(keep))
+
+
+def downsample(frame, x, y, budget=DEFAULT_POINT_BUDGET, by=None, method='lttb'):
+    """按点数预算降采样时间序列，by 为分组列(每条曲线分到相同的预算)"""
+    if len(frame) <= budget:
+        return frame
+    if by is not None:
+        groups = [g for _, g in frame.groupby(by, observed=True, sort=False)]
+        per_series = max(3, budget // max(len(groups), 1))
+        return pd.concat([downsample(g, x, y, per_series, method=method) for g in groups])
+
+    frame = frame.sort_values(x)
+    xs = frame[x].to_numpy()
+    if np.issubdtype(xs.dtype, np.datetime64):
+        xs = xs.astype('datetime64[ns]').astype(np.int64).astype(float)
+    ys = frame[y].to_numpy(dtype=float)
+    if method == 'minmax':
+        keep = minmax_indices(ys, budget)
+    else:
+        keep = lttb_indices(xs.astype(float), ys, budget)
+    return frame.iloc[keep]
@@ -0,0 +1,162 @@
+"""
+批量预计算
+不启动Streamlit，按多组筛选条件并行计算KPI、排行、A/B结果和价格弹性表，
+写成JSON/Parquet快照，供早会大屏预热和其他内部工具读取
+
+    python -m warroom.precompute --output snapshots --days 1 7 30 --by country category
+    python -m warroom.precompute --backend sqlite --format json --workers 8
+
+输出目录结构:
+    manifest.json              生成时间、数据版本、各视图的筛选条件和文件
+    ab_results.<ext>           所有实验的变体结果
+    elasticity.<ext>           全品目价格弹性
+    price_optimization.<ext>   全品目最优价格系数及置信区间
+    views/<视图>/kpis.json     最后一天的KPI及较昨日增长率
+    views/<视图>/<表>.<ext>    按日汇总、国家/品类/产品排行
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from warroom.backends import BACKENDS, make_backend
+from warroom.engine import AnalyticsEngine, as_json_value, default_filter
+from warroom.ingest import IncrementalIngestor
+from warroom.store import STORE_DIR, ColumnarStore
+
+FORMATS = ('parquet', 'json')
+
+
+def open_backend(kind, data_dir='.', db_path=None):
+    """以 data_dir 下的CSV为数据源创建数据后端，列式存储/数据库文件放在 data_dir/.data_store"""
+    store_dir = os.path.join(data_dir, STORE_DIR)
+    if kind == 'sqlite':
+        return make_backend('sqlite', db_path=db_path or os.path.join(store_dir, 'warroom.sqlite'), base_dir=data_dir)
+    ingestor = IncrementalIngestor(store=ColumnarStore(store_dir=store_dir, base_dir=data_dir))
+    return make_backend('memory', ingestor=ingestor)
+
+
+def view_filters(overview, days=(7,), by=()):
+    """要预计算的视图: 侧边栏默认视图，以及每个时间窗口下的全部数据和按维度逐个取值的切片
+
+    返回 [(视图名, 筛选条件)]
+    """
+    max_date = overview['max_date'].date()
+    dimensions = {'country': ('countries', overview['countries']),
+                  'category': ('categories', overview['categories'])}
+    views = [('default', default_filter(overview))]
+    for window in days:
+        window_filter = dict(start=max_date - timedelta(days=window), end=max_date)
+        views.append((f'{window}d_all', window_filter))
+        for dim in by:
+            arg, values = dimensions[dim]
+            for value in values:
+                views.append((f'{window}d_{dim}_{value}', {**window_filter, arg: [value]}))
+    return views
+
+
+def safe_name(name):
+    """视图名用作目录名时去掉路径分隔符等字符"""
+    return re.sub(r'[\\/:*?"<>|\s]+', '-', str(name))
+
+
+def write_table(frame, path_stem, fmt):
+    """写出一张表，返回文件名"""
+    path = f'{path_stem}.{fmt}'
+    if fmt == 'parquet':
+        frame.to_parquet(path, index=False)
+    else:
+        frame.to_json(path, orient='records', date_format='iso', force_ascii=False)
+    return os.path.basename(path)
+
+
+def write_json(obj, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2, default=as_json_value)
+
+
+def export_view(engine, out_dir, name, filter_args, fmt, k):
+    """计算并写出一个视图，返回清单条目"""
+    started = time.perf_counter()
+    view = engine.view(k, **filter_args)
+    view_dir = os.path.join(out_dir, 'views', safe_name(name))
+    os.makedirs(view_dir, exist_ok=True)
+    kpis = view.pop('kpis')
+    write_json(kpis, os.path.join(view_dir, 'kpis.json'))
+    files = ['kpis.json'] + [write_table(table, os.path.join(view_dir, table_name), fmt)
+                             for table_name, table in view.items()]
+    return {
+        'name': name,
+        'dir': os.path.join('views', safe_name(name)),
+        'filter': {key: value for key, value in filter_args.items() if value is not None},
+        'files': files,
+        'seconds': round(time.perf_counter() - started, 4),
+    }
+
+
+def precompute(engine, out_dir, views, fmt='parquet', workers=None, k=20):
+    """并行计算所有视图和全局表并写出快照，返回清单
+
+    先写到临时目录，全部完成后整体替换 out_dir，读取方不会看到写了一半的快照
+    """
+    started = time.perf_counter()
+    tmp_dir = f'{out_dir.rstrip(os.sep)}.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        ab_future = pool.submit(lambda: write_table(engine.ab_results(), os.path.join(tmp_dir, 'ab_results'), fmt))
+        elasticity_future = pool.submit(
+            lambda: write_table(engine.elasticity(), os.path.join(tmp_dir, 'elasticity'), fmt))
+        pricing_future = pool.submit(
+            lambda: write_table(engine.price_optimization(), os.path.join(tmp_dir, 'price_optimization'), fmt))
+        view_futures = [pool.submit(export_view, engine, tmp_dir, name, filter_args, fmt, k)
+                        for name, filter_args in views]
+        entries = [future.result() for future in view_futures]
+        tables = [ab_future.result(), elasticity_future.result(), pricing_future.result()]
+
+    manifest = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'data_version': engine.backend.version,
+        'format': fmt,
+        'tables': tables,
+        'views': entries,
+        'seconds': round(time.perf_counter() - started, 4),
+    }
+    write_json(manifest, os.path.join(tmp_dir, 'manifest.json'))
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='批量预计算仪表板视图并导出快照')
+    parser.add_argument('--data-dir', default='.', help='CSV数据所在目录')
+    parser.add_argument('--backend', choices=BACKENDS, default='memory')
+    parser.add_argument('--sqlite-path', help='sqlite 后端的数据库文件')
+    parser.add_argument('--output', default='snapshots', help='快照输出目录(整体替换)')
+    parser.add_argument('--format', choices=FORMATS, default='parquet', help='表格的文件格式')
+    parser.add_argument('--days', type=int, nargs='+', default=[1, 7, 30], help='时间窗口(截止最后一天的天数)')
+    parser.add_argument('--by', nargs='*', choices=['country', 'category'], default=[],
+                        help='按维度逐个取值生成切片视图')
+    parser.add_argument('--top', type=int, default=20, help='产品排行条数')
+    parser.add_argument('--workers', type=int, help='并行线程数，默认由线程池决定')
+    parser.add_argument('--price-workers', type=int, help='价格优化的进程数，默认取CPU数')
+    args = parser.parse_args(argv)
+
+    load_started = time.perf_counter()
+    engine = AnalyticsEngine(open_backend(args.backend, args.data_dir, args.sqlite_path), args.price_workers)
+    load_seconds = time.perf_counter() - load_started
+    views = view_filters(engine.overview(), args.days, args.by)
+    manifest = precompute(engine, args.output, views, args.format, args.workers, args.top)
+    print(f"加载 {load_seconds:.2f}s，{len(views)} 个视图写入 {args.output}，"
+          f"计算与写出 {manifest['seconds']:.2f}s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+价格优化
+对每个产品的弹性观测拟合需求曲线，用自助法(bootstrap)重抽样估计不确定性，
+给出全品目的最优价格系数、价格弹性和预期收入提升及其置信区间。
+
+    log(销售额) = a + b·x + c·x²,  x = log(价格系数)
+
+二次项让收入曲线可以在观测价格范围内出现拐点；最优价格系数在观测范围内的网格上取
+预测销售额最高的一点，不外推。每个产品的重抽样用抽中次数的权重矩阵一次算出全部
+矩统计量，批量解正规方程；产品分块后分给进程池
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+BOOTSTRAP_SAMPLES = 500
+CONFIDENCE = 0.95
+
+# 最优价格系数的搜索网格点数(在每个产品观测到的最低、最高价格系数之间)
+GRID_POINTS = 81
+
+# 产品数少于此值时在当前进程内计算，进程池的启动开销不划算
+MIN_PARALLEL_PRODUCTS = 200
+
+# 每个进程池任务的产品数上限
+PRODUCTS_PER_TASK = 500
+
+# 结果表的列(产品名之外)
+RESULT_COLUMNS = [
+    'observations', 'price_points',
+    'elasticity', 'elasticity_low', 'elasticity_high',
+    'optimal_multiplier', 'multiplier_low', 'multiplier_high',
+    'revenue_lift', 'lift_low', 'lift_high',
+]
+
+
+def _moment_columns(x, log_sales, log_demand):
+    """每个观测的矩列: 1, x, x², x³, x⁴, y, x·y, x²·y, z, x·z(y 为 log 销售额，z 为 log 需求)"""
+    x2 = x * x
+    return np.column_stack([
+        np.ones_like(x), x, x2, x2 * x, x2 * x2,
+        log_sales, x * log_sales, x2 * log_sales,
+        log_demand, x * log_demand,
+    ])
+
+
+def _fit(moments):
+    """由矩统计量(k×10)批量求二次收入曲线系数(k×3)和需求弹性(k)"""
+    s0, s1, s2, s3, s4, t0, t1, t2, u0, u1 = moments.T
+    normal = np.stack([
+        np.stack([s0, s1, s2], axis=-1),
+        np.stack([s1, s2, s3], axis=-1),
+        np.stack([s2, s3, s4], axis=-1),
+    ], axis=-2)
+    # 很小的岭项: 重抽样偶尔只抽到两个价格档时方程组奇异
+    normal = normal + np.eye(3) * 1e-9 * np.maximum(s0, 1)[:, None, None]
+    coef = np.linalg.solve(normal, np.stack([t0, t1, t2], axis=-1)[..., None])[..., 0]
+    denom = s0 * s2 - s1 * s1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        elasticity = np.where(denom > 1e-12, (s0 * u1 - s1 * u0) / denom, np.nan)
+    return coef, elasticity
+
+
+def _predict(coef, x):
+    """二次曲线在 x 处的 log 销售额，coef 为 (k×3)，x 为 (k×g) 或 (g,)"""
+    return coef[:, :1] + coef[:, 1:2] * x + coef[:, 2:3] * x * x
+
+
+def optimize_product(x, log_sales, log_demand, rng, samples=BOOTSTRAP_SAMPLES):
+    """单个产品的点估计和自助法置信区间，返回与 RESULT_COLUMNS 对应的数组"""
+    n = len(x)
+    result = np.full(len(RESULT_COLUMNS), np.nan)
+    result[0] = n
+    result[1] = len(np.unique(x))
+    if n < 3 or result[1] < 2:
+        return result
+
+    columns = _moment_columns(x, log_sales, log_demand)
+    # 权重矩阵第一行为原始样本，其余行为每次重抽样中各观测被抽中的次数(一次 bincount 算出)，
+    # 权重矩阵乘矩列即得全部重抽样的矩统计量
+    draws = rng.integers(0, n, (samples + 1, n)) + (np.arange(samples + 1) * n)[:, None]
+    weights = np.bincount(draws.ravel(), minlength=(samples + 1) * n).reshape(samples + 1, n).astype(float)
+    weights[0] = 1.0
+    coef, elasticity = _fit(weights @ columns)
+
+    grid = np.linspace(x.min(), x.max(), GRID_POINTS)
+    best = np.argmax(_predict(coef, grid), axis=1)
+    optimal = np.exp(grid[best])
+    # 预期提升: 点估计的最优价格相对当前价格(系数1)，在每次重抽样的曲线下的销售额变化
+    x_best = grid[best[0]]
+    lift = (np.exp(_predict(coef, np.array([x_best]))[:, 0] - coef[:, 0]) - 1) * 100
+
+    tail = (1 - CONFIDENCE) / 2 * 100
+    for offset, values in ((2, elasticity), (5, optimal), (8, lift)):
+        result[offset] = values[0]
+        boot = values[1:][np.isfinite(values[1:])]
+        if len(boot):
+            result[offset + 1], result[offset + 2] = np.percentile(boot, [tail, 100 - tail])
+    return result
+
+
+def _optimize_chunk(first_code, bounds, x, log_sales, log_demand, samples, seed):
+    """一组相邻产品(进程池任务)，bounds 为各产品在数组中的起止位置"""
+    results = np.empty((len(bounds) - 1, len(RESULT_COLUMNS)))
+    for i in range(len(bounds) - 1):
+        rows = slice(bounds[i], bounds[i + 1])
+        # 每个产品按 (种子, 产品序号) 取独立随机流，结果与分块方式和进程数无关
+        rng = np.random.default_rng([seed, first_code + i])
+        results[i] = optimize_product(x[rows], log_sales[rows], log_demand[rows], rng, samples)
+    return results
+
+
+def optimize_catalog(elasticity_data, samples=BOOTSTRAP_SAMPLES, seed=0, workers=None):
+    """全品目价格优化表，索引为产品名，列见 RESULT_COLUMNS
+
+    revenue_lift 及其区间为百分比。workers 为进程数，默认取CPU数；
+    workers=1 或产品数较少时在当前进程内计算
+    """
+    data = elasticity_data
+    positive = ((data['demand'] > 0) & (data['sales'] > 0) & (data['price_multiplier'] > 0)).to_numpy()
+    products, codes = np.unique(data['product'].to_numpy(dtype=object)[positive], return_inverse=True)
+    order = np.argsort(codes, kind='stable')
+    x = np.log(data['price_multiplier'].to_numpy(dtype=float)[positive][order])
+    log_sales = np.log(data['sales'].to_numpy(dtype=float)[positive][order])
+    log_demand = np.log(data['demand'].to_numpy(dtype=float)[positive][order])
+    bounds = np.searchsorted(codes[order], np.arange(len(products) + 1))
+
+    n = len(products)
+    workers = workers or os.cpu_count() or 1
+    per_task = max(1, min(PRODUCTS_PER_TASK, -(-n // (workers * 4))))
+    tasks = [
+        (start, bounds[start:stop + 1] - bounds[start],
+         x[bounds[start]:bounds[stop]], log_sales[bounds[start]:bounds[stop]],
+         log_demand[bounds[start]:bounds[stop]], samples, seed)
+        for start, stop in ((start, min(start + per_task, n)) for start in range(0, n, per_task))
+    ]
+
+    if workers > 1 and n >= MIN_PARALLEL_PRODUCTS:
+        # spawn: 不在多线程的Streamlit进程里 fork
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)),
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            chunks = list(pool.map(_optimize_chunk, *zip(*tasks)))
+    else:
+        chunks = [_optimize_chunk(*task) for task in tasks]
+
+    table = pd.DataFrame(
+        np.vstack(chunks) if chunks else np.empty((0, len(RESULT_COLUMNS))),
+        columns=RESULT_COLUMNS, index=pd.Index(products, name='product'))
+    table[['observations', 'price_points']] = table[['observations', 'price_points']].astype(int)
+    # 提升的置信区间整体在0以上才建议调价
+    table['recommended'] = table['lift_low'] > 0
+    return table
@@ -0,0 +1,175 @@
+"""
+重跑性能埋点
+每次脚本重跑(或单独重跑的片段)记录各段耗时、进程内存峰值及本次抬高的部分和结果缓存命中情况，
+追加写入本地JSON Lines日志(超过大小上限后轮转)，供侧边栏调试面板和线上会话分析使用
+"""
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，不记录内存峰值
+    resource = None
+
+DEFAULT_LOG_PATH = 'perf_log.jsonl'
+
+# 日志超过该大小时改名为 <路径>.1(覆盖上一份)，重新开始写，磁盘上最多保留两份
+MAX_LOG_BYTES = 20 * 1024 * 1024
+
+HISTORY_SIZE = 20
+
+
+def peak_rss_mb():
+    """进程启动以来的常驻内存峰值(MB)，无法获取时返回 None
+
+    这是整个进程生命周期的峰值，只增不减；某次重跑或某一段用了多少，
+    看前后两次读数的差(见 Profiler 记录中的 rss_growth_mb)
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以KB为单位，macOS 以字节为单位
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _growth(before, after):
+    """两次峰值读数之差(MB)，无法获取时返回 None"""
+    if before is None or after is None:
+        return None
+    return round(after - before, 1)
+
+
+class PerfLog:
+    """JSON Lines 性能日志，各会话共用一个实例(线程安全)；path 为空时不写文件
+
+    文件超过 max_bytes 时轮转为 <路径>.1，长期运行的进程不会把磁盘写满
+    """
+
+    def __init__(self, path=DEFAULT_LOG_PATH, max_bytes=MAX_LOG_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        if not self.path:
+            return
+        line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+        with self._lock:
+            self._rotate()
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+    def _rotate(self):
+        if not self.max_bytes:
+            return
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size >= self.max_bytes:
+            os.replace(self.path, f'{self.path}.1')
+
+
+class Profiler:
+    """单个会话的计时器
+
+    begin() 与 end() 之间为一次完整重跑；不在重跑内的最外层 span(单独重跑的片段)
+    自成一条记录。span 可以嵌套，名称用 / 连接
+    """
+
+    def __init__(self, session, log=None, cache=None):
+        self.session = session
+        self.log = log
+        self.cache = cache
+        self.history = deque(maxlen=HISTORY_SIZE)
+        self._run = None
+        self._stack = []
+
+    def begin(self, kind='script'):
+        """开始一次重跑的记录，上一次未结束的记录(如被 st.stop 中断)直接丢弃"""
+        self._stack = []
+        self._run = {
+            'kind': kind,
+            'started': time.perf_counter(),
+            'peak_before': peak_rss_mb(),
+            'spans': [],
+            'cache_hits': 0,
+            'cache_misses': 0,
+        }
+
+    def end(self):
+        """结束当前记录，写入日志并返回记录"""
+        run, self._run = self._run, None
+        if run is None:
+            return None
+        lookups = run['cache_hits'] + run['cache_misses']
+        peak = peak_rss_mb()
+        record = {
+            'ts': datetime.now().isoformat(timespec='milliseconds'),
+            'session': self.session,
+            'kind': run['kind'],
+            'seconds': round(time.perf_counter() - run['started'], 6),
+            'peak_rss_mb': peak,
+            # 本次重跑把进程峰值抬高了多少；为0表示没有超过之前的峰值
+            'rss_growth_mb': _growth(run['peak_before'], peak),
+            'spans': run['spans'],
+            'cache_hits': run['cache_hits'],
+            'cache_misses': run['cache_misses'],
+            'cache_hit_rate': run['cache_hits'] / lookups if lookups else None,
+        }
+        if self.cache is not None:
+            record['result_cache'] = self.cache.stats()
+        self.history.append(record)
+        if self.log is not None:
+            self.log.write(record)
+        return record
+
+    @contextmanager
+    def span(self, name):
+        """计时一段代码"""
+        standalone = self._run is None
+        if standalone:
+            self.begin(f'fragment:{name}')
+        self._stack.append(name)
+        path = '/'.join(self._stack)
+        peak_before = peak_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self._stack.pop()
+            if self._run is not None:
+                self._run['spans'].append({
+                    'name': path,
+                    'seconds': round(seconds, 6),
+                    'rss_growth_mb': _growth(peak_before, peak_rss_mb()),
+                })
+            if standalone:
+                self.end()
+
+    def timed(self, name):
+        """装饰器形式的 span，用在 st.fragment 函数上时单独重跑片段也会计时"""
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def count_cache(self, hit):
+        """记录一次结果缓存查找"""
+        if self._run is not None:
+            self._run['cache_hits' if hit else 'cache_misses'] += 1
+
+    @property
+    def last(self):
+        return self.history[-1] if self.history else None
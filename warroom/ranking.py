@@ -0,0 +1,229 @@
+"""
+产品销量排行索引
+按 (日期, 国家, 品类, 产品) 预先汇总销售额，排行只对候选产品做部分选择(argpartition)，
+各品类的全时段TOP列表用堆随增量数据维护。
+同时是产品维度表: 每个产品的品类、价格、销售额、销量和利润的全时段合计随接入累加，
+产品详情和下钻面板都是字典查找。
+索引只依赖逐批 add 的汇总结果，产品数据可以分块流式接入而不保留明细行
+"""
+import heapq
+
+import numpy as np
+import pandas as pd
+
+from warroom.buffers import AppendBuffer
+from warroom.filters import encode_values
+
+KEYS = ['date', 'country', 'category', 'product']
+
+DAY = np.timedelta64(1, 'D')
+
+
+class ProductRankingIndex:
+    """产品销量排行索引
+
+    产品以 (品类, 产品) 为单位编号；_cells 为按日期排序的汇总单元格
+    (日期, 国家编号, 品类编号, 产品编号, 销售额)
+    """
+
+    def __init__(self, category_top_k=20, source='product'):
+        self.source = source
+        self.category_top_k = category_top_k
+        self._reset()
+
+    def _reset(self):
+        self._countries = {}
+        self._categories = {}
+        self._products = {}
+        self._items = {}
+        self._item_category = []
+        self._item_product = []
+        self._product_items = {}  # 产品名 -> [产品编号]
+        # 单元格各列的追加缓冲区；_cells 为各列已写入部分的视图，整体一次替换
+        self._cell_buffers = self._new_cell_buffers()
+        self._cells = tuple(buffer.values() for buffer in self._cell_buffers)
+        self._totals = np.zeros(0)
+        self._price_sums = np.zeros(0)
+        self._price_rows = np.zeros(0)
+        self._units = np.zeros(0)
+        self._profit = np.zeros(0)
+        # 产品名 -> 全时段销售额名次，数据变化后第一次查询时重新计算
+        self._ranks = None
+        # 品类 -> [(累计销售额, 产品编号)]，按销售额降序
+        self._category_top = {}
+
+    @staticmethod
+    def _new_cell_buffers(columns=None):
+        dtypes = ('datetime64[ns]', np.int32, np.int32, np.int32, float)
+        columns = columns or (None,) * len(dtypes)
+        return tuple(AppendBuffer(dtype, values) for dtype, values in zip(dtypes, columns))
+
+    # ========== 构建与增量更新 ==========
+    def on_ingest(self, name, rows, reset):
+        """增量接入器的回调"""
+        if name != self.source:
+            return
+        if reset:
+            self._reset()
+        self.add(rows)
+
+    def add(self, rows):
+        """把一批产品数据行汇总后并入索引"""
+        if rows.empty:
+            return
+        cells = rows.assign(profit=rows['sales_amount'] * rows['profit_margin']).groupby(KEYS, observed=True).agg(
+            sales_amount=('sales_amount', 'sum'),
+            price_sum=('price', 'sum'),
+            price_rows=('price', 'count'),
+            units=('units_sold', 'sum'),
+            profit=('profit', 'sum'),
+        ).reset_index()
+
+        country = encode_values(self._countries, cells['country'])
+        category = encode_values(self._categories, cells['category'])
+        product = encode_values(self._products, cells['product'])
+
+        # (品类, 产品) 组合只对不同的组合做字典查找
+        pairs, inverse = np.unique(category.astype(np.int64) << 32 | product, return_inverse=True)
+        categories, products = list(self._categories), list(self._products)
+        pair_codes = np.empty(len(pairs), dtype=np.int32)
+        for i, pair in enumerate(pairs):
+            key = (categories[pair >> 32], products[pair & 0xFFFFFFFF])
+            code = self._items.get(key)
+            if code is None:
+                code = self._items[key] = len(self._items)
+                self._item_category.append(key[0])
+                self._item_product.append(key[1])
+                self._product_items.setdefault(key[1], []).append(code)
+            pair_codes[i] = code
+        item = pair_codes[inverse.ravel()]
+        sales = cells['sales_amount'].to_numpy(dtype=float)
+
+        old_date = self._cells[0]
+        new_columns = (cells['date'].to_numpy(), country, category, item, sales)
+        if len(old_date) and cells['date'].min() < old_date[-1]:
+            # 新数据早于已有数据时重新按日期排序
+            merged = tuple(np.concatenate([old, new]) for old, new in zip(self._cells, new_columns))
+            order = np.argsort(merged[0], kind='stable')
+            self._cell_buffers = self._new_cell_buffers(tuple(a[order] for a in merged))
+        else:
+            for buffer, values in zip(self._cell_buffers, new_columns):
+                buffer.extend(values)
+        self._cells = tuple(buffer.values() for buffer in self._cell_buffers)
+
+        n_items = len(self._items)
+        delta = np.bincount(item, sales, minlength=n_items)
+        self._totals = _grow(self._totals, n_items) + delta
+        self._price_sums = _grow(self._price_sums, n_items) + np.bincount(
+            item, cells['price_sum'].to_numpy(dtype=float), minlength=n_items)
+        self._price_rows = _grow(self._price_rows, n_items) + np.bincount(
+            item, cells['price_rows'].to_numpy(dtype=float), minlength=n_items)
+        self._units = _grow(self._units, n_items) + np.bincount(
+            item, cells['units'].to_numpy(dtype=float), minlength=n_items)
+        self._profit = _grow(self._profit, n_items) + np.bincount(
+            item, cells['profit'].to_numpy(dtype=float), minlength=n_items)
+        self._ranks = None
+        self._update_category_top(np.flatnonzero(delta), (sales < 0).any())
+
+    def _update_category_top(self, touched, has_negative):
+        """更新受影响品类的TOP列表
+
+        销售额只增不减时，只需在旧TOP列表和本次变化的产品中用堆选出前K名；
+        出现负数(退款冲减)时整个品类重新选择
+        """
+        by_category = {}
+        for code in touched:
+            by_category.setdefault(self._item_category[code], []).append(code)
+        for category, codes in by_category.items():
+            if has_negative:
+                codes = [c for c, cat in enumerate(self._item_category) if cat == category]
+            else:
+                codes = set(codes) | {c for _, c in self._category_top.get(category, [])}
+            self._category_top[category] = heapq.nlargest(
+                self.category_top_k, ((self._totals[c], c) for c in codes))
+
+    # ========== 查询 ==========
+    def top_products(self, k=20, start=None, end=None, countries=None, categories=None):
+        """筛选范围内销售额TOP K产品，返回按名次排列的 [category, product, sales_amount]"""
+        if start is None and end is None and countries is None and categories is None:
+            # 全时段直接用累计销售额，不扫描单元格
+            return self._ranked(np.arange(len(self._items)), self._totals, k)
+        dates, country, category, item, sales = self._cells
+        lo = 0 if start is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(start)), 'left')
+        hi = len(dates) if end is None else np.searchsorted(
+            dates, np.datetime64(pd.Timestamp(end).normalize()) + DAY, 'left')
+
+        mask = np.ones(max(hi - lo, 0), dtype=bool)
+        if countries is not None:
+            mask &= np.isin(country[lo:hi], _codes(self._countries, countries))
+        if categories is not None:
+            mask &= np.isin(category[lo:hi], _codes(self._categories, categories))
+
+        n_items = len(self._items)
+        hit_items = item[lo:hi][mask]
+        totals = np.bincount(hit_items, sales[lo:hi][mask], minlength=n_items)
+        present = np.flatnonzero(np.bincount(hit_items, minlength=n_items))
+        return self._ranked(present, totals[present], k)
+
+    def category_top(self, category, k=5):
+        """某品类全时段销售额TOP K产品"""
+        top = self._category_top.get(category, [])[:k]
+        return pd.DataFrame({
+            'product': [self._item_product[c] for _, c in top],
+            'sales_amount': [s for s, _ in top],
+        })
+
+    def product_summary(self, product):
+        """产品维度: 品类、平均价格、全时段销售额、销量、利润率(按销售额加权)和销售额名次，
+        产品不存在时返回 None
+        """
+        codes = self._product_items.get(product)
+        if not codes:
+            return None
+        rows = self._price_rows[codes].sum()
+        total_sales = self._totals[codes].sum()
+        return {
+            'category': self._item_category[codes[0]],
+            'avg_price': self._price_sums[codes].sum() / rows if rows else float('nan'),
+            'total_sales': total_sales,
+            'units': int(self._units[codes].sum()),
+            'margin': self._profit[codes].sum() / total_sales if total_sales else float('nan'),
+            'rank': self._product_ranks()[product],
+        }
+
+    def _product_ranks(self):
+        """产品名 -> 全时段销售额名次(同一产品名跨品类时合并)"""
+        ranks = self._ranks
+        if ranks is None:
+            names = list(self._product_items)
+            totals = np.array([self._totals[codes].sum() for codes in self._product_items.values()])
+            order = np.argsort(-totals, kind='stable')
+            ranks = self._ranks = {names[i]: rank for rank, i in enumerate(order, 1)}
+        return ranks
+
+    def _ranked(self, codes, values, k):
+        """部分选择出前K名再排序，代价 O(n + k log k)"""
+        k = min(k, len(codes))
+        if k == 0:
+            top = np.array([], dtype=np.int64)
+        elif k < len(codes):
+            top = np.argpartition(-values, k - 1)[:k]
+        else:
+            top = np.arange(len(codes))
+        top = top[np.argsort(-values[top], kind='stable')]
+        return pd.DataFrame({
+            'category': [self._item_category[c] for c in codes[top]],
+            'product': [self._item_product[c] for c in codes[top]],
+            'sales_amount': values[top],
+        })
+
+
+def _grow(array, n):
+    """把按产品编号排列的累计数组补零到 n 个产品"""
+    grown = np.zeros(n)
+    grown[:len(array)] = array
+    return grown
+
+
+def _codes(mapping, values):
+    return [mapping[v] for v in values if v in mapping]
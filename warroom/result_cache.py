@@ -0,0 +1,102 @@
+"""
+结果缓存
+按 (结果名称, 数据版本, 规范化的筛选条件) 缓存派生结果，各标签页、各会话、每次重跑共用，
+按占用内存做LRU淘汰，并统计命中率
+"""
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def normalize_filter(start=None, end=None, countries=None, categories=None):
+    """把侧边栏筛选条件规范化为可哈希的元组，多选的先后顺序不影响结果"""
+    return (
+        None if start is None else str(start),
+        None if end is None else str(end),
+        None if countries is None else tuple(sorted(map(str, countries))),
+        None if categories is None else tuple(sorted(map(str, categories))),
+    )
+
+
+def estimate_size(value):
+    """估算结果占用的字节数"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(index=True)
+        return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value.values())
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """按内存上限淘汰的LRU结果缓存(线程安全)"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, name, version, params, compute):
+        """命中则直接返回缓存结果，否则调用 compute() 计算并缓存
+
+        返回的结果在会话之间共享，调用方不能原地修改
+        """
+        key = (name, version, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        value = compute()
+        self._store(key, value)
+        return value
+
+    def put(self, name, version, params, value):
+        """直接放入一项结果(例如从磁盘快照恢复的结果)，不计入命中率，已有的结果不覆盖"""
+        self._store((name, version, params), value)
+
+    def _store(self, key, value):
+        size = estimate_size(value)
+        with self._lock:
+            if key not in self._entries and size <= self.max_bytes:
+                self._entries[key] = (value, size)
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    _, (_, evicted) = self._entries.popitem(last=False)
+                    self._bytes -= evicted
+                    self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """命中、未命中、淘汰次数与当前占用"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
@@ -0,0 +1,91 @@
+"""
+数据模式
+加载时统一设置列类型: 日期列转为datetime64，重复字符串转为分类类型，
+金额、比率降为float32，计数降为int32；按国家不变的经纬度拆到单独的维度表
+"""
+import numpy as np
+import pandas as pd
+
+# 模式变化时递增，列式存储据此判断旧文件是否需要重建
+SCHEMA_VERSION = 2
+
+DATE_COLUMN = 'date'
+
+# 重复出现的字符串列，存为分类类型(字典编码)
+CATEGORY_COLUMNS = ['country', 'category', 'product', 'experiment', 'variant']
+
+# 金额、比率、需求量: float32 约7位有效数字，汇总时再转为float64累加
+FLOAT32_COLUMNS = [
+    'sales_amount', 'avg_order_value', 'conversion_rate',
+    'price', 'profit_margin', 'revenue', 'demand', 'sales',
+]
+
+# 计数与名次
+INT32_COLUMNS = ['orders', 'visitors', 'conversions', 'units_sold', 'category_rank', 'product_rank']
+
+# 数据源 -> (维度键, 只依赖维度键的属性列)
+DIMENSIONS = {
+    'sales': ('country', ['latitude', 'longitude']),
+}
+
+INT32_MIN, INT32_MAX = np.iinfo(np.int32).min, np.iinfo(np.int32).max
+
+
+def downcast(frame):
+    """金额、比率降为float32，计数降为int32；有缺失值或超出int32范围的计数列保持不变"""
+    for col in FLOAT32_COLUMNS:
+        if col in frame.columns and frame[col].dtype != np.float32:
+            frame[col] = frame[col].astype(np.float32)
+    for col in INT32_COLUMNS:
+        if col not in frame.columns or frame[col].dtype == np.int32:
+            continue
+        column = frame[col]
+        if not pd.api.types.is_integer_dtype(column.dtype):
+            continue
+        if len(column) and (column.min() < INT32_MIN or column.max() > INT32_MAX):
+            continue
+        frame[col] = column.astype(np.int32)
+    return frame
+
+
+def apply_column_types(frame):
+    """日期列转为datetime64，重复字符串列转为分类类型，数值列降精度"""
+    if DATE_COLUMN in frame.columns:
+        frame[DATE_COLUMN] = pd.to_datetime(frame[DATE_COLUMN])
+    for col in CATEGORY_COLUMNS:
+        if col in frame.columns:
+            frame[col] = frame[col].astype('category')
+    return downcast(frame)
+
+
+def dimension_attributes(name, columns):
+    """数据源中拆到维度表的属性列"""
+    if name not in DIMENSIONS:
+        return []
+    return [col for col in DIMENSIONS[name][1] if col in columns]
+
+
+def split_dimension(name, frame):
+    """把维度属性列拆到维度表，返回 (事实表, 维度表)
+
+    维度表以维度键为索引；没有维度定义或缺少属性列时维度表为 None
+    """
+    attributes = dimension_attributes(name, frame.columns)
+    if not attributes:
+        return frame, None
+    key = DIMENSIONS[name][0]
+    dimension = (frame[[key] + attributes]
+                 .drop_duplicates(key, keep='last')
+                 .set_index(key)
+                 .sort_index())
+    dimension.index = dimension.index.astype(str)
+    return frame.drop(columns=attributes), dimension
+
+
+def merge_dimension(dimension, new_dimension):
+    """合并新出现的维度行，同一个键以新值为准"""
+    if dimension is None:
+        return new_dimension
+    if new_dimension is None:
+        return dimension
+    return new_dimension.combine_first(dimension)
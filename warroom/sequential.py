@@ -0,0 +1,291 @@
+"""
+序贯A/B检验
+按 (实验, 变体) 维护充分统计量(访客、转化、收入，以及每日每访客收入的和与平方和)，
+每追加一天的数据只做常数次更新。检验用混合序贯概率比检验(mSPRT)：
+随时查看都有效的p值和置信区间，达到显著即可提前结束实验，不需要预先固定样本量，
+也不必在大促中途重新扫描全部历史
+"""
+import math
+import threading
+
+import pandas as pd
+
+SIGNIFICANCE_LEVEL = 0.05
+
+# mSPRT 正态混合先验的标准差相对对照组水平的比例(预期相对提升的量级)。
+# 每个实验在第一个可检验的观测窗口按对照组当时的水平确定一次，之后固定不变；
+# 先验随数据变化时似然比不再是鞅，随时有效的保证就不成立了
+MIXTURE_RELATIVE_TAU = 0.1
+
+# 每访客收入以天为观测单位，天数太少时方差估计不可靠，不做检验
+MIN_RPV_DAYS = 7
+
+DECISION_CONTINUE = '继续观察'
+DECISION_WIN = '显著胜出'
+DECISION_LOSE = '显著落后'
+
+
+def msprt(theta, variance, tau):
+    """正态混合 mSPRT: 返回 (似然比 Λ, 置信区间半宽)
+
+    theta 为差值估计，variance 为其方差，tau 为混合先验标准差。
+    Λ ≥ 1/α 时拒绝原假设；置信区间为 {θ: Λ(θ) < 1/α}，任意时刻查看都保持覆盖率
+    """
+    if variance <= 0 or tau <= 0:
+        return 1.0, math.inf
+    tau2 = tau * tau
+    total = variance + tau2
+    log_lambda = 0.5 * math.log(variance / total) + theta * theta * tau2 / (2 * variance * total)
+    half_width = math.sqrt(variance * total / tau2
+                           * (2 * math.log(1 / SIGNIFICANCE_LEVEL) + math.log(total / variance)))
+    return math.exp(min(log_lambda, 700.0)), half_width
+
+
+class VariantStats:
+    """单个变体的充分统计量"""
+
+    __slots__ = ('visitors', 'conversions', 'revenue', 'days', 'rpv_sum', 'rpv_sq')
+
+    def __init__(self):
+        self.visitors = self.conversions = self.revenue = 0.0
+        self.days = 0
+        self.rpv_sum = self.rpv_sq = 0.0
+
+    def add_day(self, visitors, conversions, revenue, sign=1):
+        """累加(sign=-1 时撤销)一天的合计"""
+        self.visitors += sign * visitors
+        self.conversions += sign * conversions
+        self.revenue += sign * revenue
+        if visitors > 0:
+            rpv = revenue / visitors
+            self.days += sign
+            self.rpv_sum += sign * rpv
+            self.rpv_sq += sign * rpv * rpv
+
+    @property
+    def conversion_rate(self):
+        return self.conversions / self.visitors if self.visitors > 0 else 0.0
+
+    @property
+    def rpv_mean(self):
+        return self.rpv_sum / self.days if self.days else 0.0
+
+    @property
+    def rpv_variance(self):
+        """每日每访客收入的样本方差"""
+        if self.days < 2:
+            return 0.0
+        return max(self.rpv_sq - self.days * self.rpv_mean ** 2, 0.0) / (self.days - 1)
+
+
+class ExperimentState:
+    """单个实验的运行状态: 每日合计、各变体累计统计量和逐日的检验路径"""
+
+    def __init__(self):
+        self.variants = []     # 按首次出现顺序，第一个为对照组
+        self.daily = {}        # 日期 -> {变体: [访客, 转化, 收入]}
+        self.totals = {}       # 变体 -> VariantStats
+        self.path = {}         # 变体 -> [检验点]，每天一个
+        self.last_date = None
+        # 混合先验标准差(转化率差、每访客收入差)，首次可检验时确定，补录重放时沿用
+        self.tau = None
+        self.rpv_tau = None
+
+    @property
+    def control(self):
+        return self.variants[0] if self.variants else None
+
+    def add_rows(self, cells):
+        """cells 为按 (date, variant) 汇总的 [(日期, 变体, 访客, 转化, 收入)]"""
+        for _, variant, *_ in cells:
+            if variant not in self.totals:
+                self.variants.append(variant)
+                self.totals[variant] = VariantStats()
+                self.path[variant] = []
+        first_date = min(day for day, *_ in cells)
+        if self.last_date is not None and first_date < self.last_date:
+            # 补录了已经检验过的日期: 只重放本实验的每日合计(O(天数))
+            for day, variant, visitors, conversions, revenue in cells:
+                self._merge_daily(day, variant, visitors, conversions, revenue)
+            self._replay()
+            return
+        by_day = {}
+        for day, *values in cells:
+            by_day.setdefault(day, []).append(values)
+        for day in sorted(by_day):
+            for variant, visitors, conversions, revenue in by_day[day]:
+                old = self._merge_daily(day, variant, visitors, conversions, revenue)
+                stats = self.totals[variant]
+                if old is not None:
+                    stats.add_day(*old, sign=-1)
+                stats.add_day(*self.daily[day][variant])
+            self._evaluate(day)
+
+    def _merge_daily(self, day, variant, visitors, conversions, revenue):
+        """合并一天的合计，返回合并前的值(没有时为 None)"""
+        cells = self.daily.setdefault(day, {})
+        old = cells.get(variant)
+        cells[variant] = [visitors, conversions, revenue] if old is None else [
+            old[0] + visitors, old[1] + conversions, old[2] + revenue]
+        return old
+
+    def _replay(self):
+        self.totals = {variant: VariantStats() for variant in self.variants}
+        self.path = {variant: [] for variant in self.variants}
+        self.last_date = None
+        for day in sorted(self.daily):
+            for variant, values in self.daily[day].items():
+                self.totals[variant].add_day(*values)
+            self._evaluate(day)
+
+    def _evaluate(self, day):
+        """计算当天收盘时各实验组相对对照组的检验点，同一天重复计算时替换"""
+        control = self.totals[self.control]
+        for variant in self.variants:
+            points = self.path[variant]
+            if points and points[-1]['date'] == day:
+                points.pop()
+            previous = points[-1] if points else None
+            points.append(self._test(variant, self.totals[variant], control, day, previous))
+        self.last_date = day
+
+    def _test(self, variant, stats, control, day, previous):
+        is_control = variant == self.control
+        p1, p0 = stats.conversion_rate, control.conversion_rate
+        point = {
+            'date': day,
+            'variant': variant,
+            'is_control': is_control,
+            'visitors': stats.visitors,
+            'conversions': stats.conversions,
+            'conversion_rate': p1 * 100,
+            'revenue_per_visitor': stats.revenue / stats.visitors if stats.visitors > 0 else 0.0,
+            'days': stats.days,
+        }
+        if is_control:
+            point.update(lift=0.0, lift_low=0.0, lift_high=0.0, diff_low=-math.inf, diff_high=math.inf,
+                         msprt_lambda=1.0, p_value=1.0,
+                         rpv_lift=0.0, rpv_p_value=1.0, decision=DECISION_CONTINUE, stop=False)
+            return point
+        if stats.visitors == 0 or control.visitors == 0 or p0 <= 0:
+            # 当天无法检验(对照组还没有转化等): 沿用之前的随时有效结果；还没有检验过时区间不设限，
+            # 之后取交集、取最小值时不会被这个占位点收窄
+            if previous is not None:
+                point.update({key: previous[key] for key in (
+                    'lift', 'lift_low', 'lift_high', 'diff_low', 'diff_high', 'msprt_lambda',
+                    'p_value', 'rpv_lift', 'rpv_p_value', 'decision', 'stop')})
+            else:
+                point.update(lift=0.0, lift_low=math.nan, lift_high=math.nan,
+                             diff_low=-math.inf, diff_high=math.inf, msprt_lambda=1.0, p_value=1.0,
+                             rpv_lift=0.0, rpv_p_value=1.0, decision=DECISION_CONTINUE, stop=False)
+            return point
+
+        # 转化率差的 mSPRT(按访客计的二项方差)
+        theta = p1 - p0
+        variance = p1 * (1 - p1) / stats.visitors + p0 * (1 - p0) / control.visitors
+        if self.tau is None:
+            self.tau = MIXTURE_RELATIVE_TAU * p0
+        lam, half = msprt(theta, variance, self.tau)
+        low, high = theta - half, theta + half
+        p_value = min(1.0, 1 / lam)
+        if previous is not None:
+            # 随时有效: p值取历史最小值，(转化率差的)置信区间取历史交集
+            p_value = min(p_value, previous['p_value'])
+            low = max(low, previous['diff_low'])
+            high = min(high, previous['diff_high'])
+
+        # 每访客收入差的 mSPRT(以天为观测单位)
+        rpv_theta = stats.rpv_mean - control.rpv_mean
+        rpv_p = 1.0
+        if min(stats.days, control.days) >= MIN_RPV_DAYS:
+            rpv_variance = stats.rpv_variance / stats.days + control.rpv_variance / control.days
+            if self.rpv_tau is None and control.rpv_mean > 0:
+                self.rpv_tau = MIXTURE_RELATIVE_TAU * control.rpv_mean
+            rpv_lam, _ = msprt(rpv_theta, rpv_variance, self.rpv_tau or 0.0)
+            rpv_p = min(1.0, 1 / rpv_lam)
+        if previous is not None:
+            rpv_p = min(rpv_p, previous['rpv_p_value'])
+
+        significant = p_value < SIGNIFICANCE_LEVEL
+        point.update(
+            lift=theta / p0 * 100,
+            lift_low=low / p0 * 100,
+            lift_high=high / p0 * 100,
+            diff_low=low,
+            diff_high=high,
+            msprt_lambda=lam,
+            p_value=p_value,
+            rpv_lift=rpv_theta / control.rpv_mean * 100 if control.rpv_mean > 0 else 0.0,
+            rpv_p_value=rpv_p,
+            decision=(DECISION_WIN if theta > 0 else DECISION_LOSE) if significant else DECISION_CONTINUE,
+            stop=significant,
+        )
+        return point
+
+
+class SequentialABTest:
+    """所有实验的序贯检验，作为增量接入器的订阅者随新数据更新(线程安全)
+
+    相对提升及其置信区间以对照组当前转化率折算
+    """
+
+    def __init__(self, source='ab'):
+        self.source = source
+        self.rows = 0
+        self._experiments = {}
+        self._lock = threading.Lock()
+
+    def on_ingest(self, name, rows, reset):
+        """增量接入器的回调"""
+        if name != self.source:
+            return
+        if reset:
+            self.reset()
+        self.add(rows)
+
+    def reset(self):
+        with self._lock:
+            self._experiments = {}
+            self.rows = 0
+
+    def add(self, rows):
+        """合并一批原始行，代价与新行数成正比"""
+        if rows.empty:
+            return
+        cells = rows.groupby(['experiment', 'date', 'variant'], observed=True, sort=False).agg(
+            visitors=('visitors', 'sum'),
+            conversions=('conversions', 'sum'),
+            revenue=('revenue', 'sum'),
+        )
+        # 分组保持首次出现的顺序，变体顺序因此与原始行一致(与 ABTestAnalyzer 相同，第一个为对照组)
+        by_experiment = {}
+        for (experiment, day, variant), values in zip(cells.index, cells.to_numpy(dtype=float)):
+            by_experiment.setdefault(experiment, []).append((pd.Timestamp(day), variant, *values))
+        with self._lock:
+            for experiment, experiment_cells in by_experiment.items():
+                self._experiments.setdefault(experiment, ExperimentState()).add_rows(experiment_cells)
+            self.rows += len(rows)
+
+    @property
+    def experiments(self):
+        with self._lock:
+            return list(self._experiments)
+
+    def results(self, experiment=None):
+        """各变体的当前检验结果(每个变体最新的检验点)"""
+        with self._lock:
+            points = [
+                {'experiment': name, **state.path[variant][-1]}
+                for name, state in self._experiments.items() if experiment is None or name == experiment
+                for variant in state.variants if state.path[variant]
+            ]
+        return pd.DataFrame(points)
+
+    def lift_path(self, experiment):
+        """实验组逐日的累计提升、随时有效置信区间和p值，用于累计提升趋势图"""
+        with self._lock:
+            state = self._experiments.get(experiment)
+            if state is None:
+                return pd.DataFrame()
+            points = [point for variant in state.variants[1:] for point in state.path[variant]]
+        return pd.DataFrame(points)
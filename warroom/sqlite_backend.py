@@ -0,0 +1,392 @@
+"""
+嵌入式SQLite后端
+CSV数据按块写入本地SQLite文件(WAL模式)，在 date/country/category/product 上建索引；
+侧边栏筛选、排行分组、KPI合计和A/B汇总都下推为SQL查询，进程内只保留查询结果。
+同步进度(文件偏移、前缀校验和、修改时间、行数)记录在数据库中，多个仪表板进程可以共用一个数据库文件，
+由拿到写锁的进程负责同步
+"""
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from warroom.analyzers import ABTestAnalyzer
+from warroom.backends import DataBackend
+from warroom.cube import MEASURES
+from warroom.schema import DATE_COLUMN, DIMENSIONS, apply_column_types, split_dimension
+from warroom.sequential import SequentialABTest
+from warroom.store import (
+    CHUNK_BYTES,
+    DATA_SOURCES,
+    STORE_DIR,
+    csv_header,
+    iter_csv_chunks,
+    prefix_checksum,
+)
+
+DEFAULT_DB_PATH = os.path.join(STORE_DIR, 'warroom.sqlite')
+
+# 数据源 -> 索引列组合(日期放在最后，便于等值列加日期范围的查询)
+INDEXES = {
+    'sales': [('date',), ('country', 'date'), ('category', 'date')],
+    'product': [('date',), ('country', 'date'), ('category', 'date'), ('product',)],
+    'ab': [('experiment', 'variant')],
+    'elasticity': [('product',)],
+}
+
+DATE_FORMAT = '%Y-%m-%d'
+
+
+def _sql_type(dtype):
+    if pd.api.types.is_integer_dtype(dtype):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL'
+    return 'TEXT'
+
+
+def _to_rows(frame):
+    """数据块转为可以绑定到SQL参数的行(日期存为ISO文本，numpy标量转为Python类型)"""
+    columns = []
+    for col in frame.columns:
+        column = frame[col]
+        if col == DATE_COLUMN:
+            columns.append(column.dt.strftime(DATE_FORMAT).tolist())
+        else:
+            columns.append(column.astype(object).where(column.notna(), None).tolist())
+    return list(zip(*columns))
+
+
+def where_clause(start=None, end=None, countries=None, categories=None):
+    """筛选条件转为 (WHERE子句, 参数)"""
+    terms, params = [], []
+    if start is not None:
+        terms.append('date >= ?')
+        params.append(pd.Timestamp(start).strftime(DATE_FORMAT))
+    if end is not None:
+        terms.append('date <= ?')
+        params.append(pd.Timestamp(end).strftime(DATE_FORMAT))
+    for col, values in (('country', countries), ('category', categories)):
+        if values is None:
+            continue
+        values = [str(v) for v in values]
+        if not values:
+            terms.append('0')
+            continue
+        terms.append(f"{col} IN ({', '.join('?' * len(values))})")
+        params.extend(values)
+    return (' WHERE ' + ' AND '.join(terms)) if terms else '', params
+
+
+class SQLiteBackend(DataBackend):
+    """SQLite数据后端，连接按线程创建(各会话的脚本线程并发只读)"""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, base_dir='.', sources=None, chunk_bytes=CHUNK_BYTES):
+        self.db_path = db_path
+        self.base_dir = base_dir
+        self.sources = list(sources or DATA_SOURCES)
+        self.chunk_bytes = chunk_bytes
+        self.load_report = None
+        self._local = threading.local()
+        self._sync_lock = threading.Lock()
+        self._versions = {}
+        # 序贯A/B检验在进程内维护: (A/B表的重载次数, 已读到的rowid, 检验状态)
+        self._sequential = None
+        self._sequential_lock = threading.Lock()
+        # 产品维度表在进程内缓存: (产品表版本, {产品名: 维度})
+        self._product_dimension = None
+        self._dimension_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS _sources (name TEXT PRIMARY KEY, columns TEXT, '
+                'byte_offset INTEGER, prefix_crc INTEGER, generation INTEGER, row_count INTEGER, mtime_ns INTEGER)')
+            if 'mtime_ns' not in {row[1] for row in conn.execute('PRAGMA table_info(_sources)')}:
+                # 旧数据库没有修改时间，各数据源下次同步时按改写处理
+                conn.execute('ALTER TABLE _sources ADD COLUMN mtime_ns INTEGER')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # isolation_level=None: 事务由 BEGIN/COMMIT 显式控制
+            conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def query(self, sql, params=()):
+        return pd.read_sql_query(sql, self._connect(), params=params)
+
+    # ========== 同步 ==========
+    def _csv_path(self, name):
+        return os.path.join(self.base_dir, DATA_SOURCES[name])
+
+    def _read_progress(self, conn):
+        return {row[0]: row[1:] for row in conn.execute(
+            'SELECT name, byte_offset, generation, row_count, mtime_ns FROM _sources')}
+
+    def _unchanged(self, progress):
+        """各CSV的大小和修改时间都与已同步时一致(或CSV已被移走)时不需要拿写锁"""
+        for name in self.sources:
+            if name not in progress:
+                return False
+            csv_path = self._csv_path(name)
+            if not os.path.exists(csv_path):
+                continue
+            stat = os.stat(csv_path)
+            offset, _, _, mtime_ns = progress[name]
+            if stat.st_size != offset or stat.st_mtime_ns != mtime_ns:
+                return False
+        return True
+
+    def refresh(self):
+        """在写事务中把CSV的变化同步到数据库；追加时只写入新增的行"""
+        changes = {}
+        first_load = not self._versions
+        start = time.perf_counter()
+        timings = {}
+        with self._sync_lock:
+            conn = self._connect()
+            progress = self._read_progress(conn)
+            if not self._unchanged(progress):
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    for name in self.sources:
+                        source_start = time.perf_counter()
+                        added = self._sync_source(conn, name)
+                        timings[name] = time.perf_counter() - source_start
+                        if added:
+                            changes[name] = added
+                    conn.execute('COMMIT')
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+                progress = self._read_progress(conn)
+            self._versions = {name: (generation, rows) for name, (_, generation, rows, _) in progress.items()}
+
+        missing = [name for name in self.sources if name not in self._versions]
+        if missing:
+            raise FileNotFoundError(', '.join(DATA_SOURCES[name] for name in missing))
+        if first_load:
+            # 数据库已由其他进程同步好时各数据源耗时为0
+            self.load_report = {
+                'workers': 1,
+                'seconds': time.perf_counter() - start,
+                'sources': {name: {'seconds': timings.get(name, 0.0), 'rows': self._versions[name][1]}
+                            for name in self.sources},
+            }
+        return changes
+
+    def _sync_source(self, conn, name):
+        csv_path = self._csv_path(name)
+        row = conn.execute(
+            'SELECT columns, byte_offset, prefix_crc, generation, mtime_ns FROM _sources WHERE name = ?', (name,)
+        ).fetchone()
+        if not os.path.exists(csv_path):
+            # CSV已被移走时继续使用数据库中的数据
+            return 0
+
+        # 读取前的修改时间: 读取期间又有写入时，下次同步会再检查一遍
+        stat = os.stat(csv_path)
+        if row is not None:
+            columns, offset, crc, generation, mtime_ns = row
+            if stat.st_size == offset and stat.st_mtime_ns == mtime_ns:
+                return 0
+            if stat.st_size > offset and prefix_checksum(csv_path, offset) == crc:
+                # 纯追加，只写入新增的行
+                return self._insert_chunks(conn, name, columns.split(','), offset, stat.st_mtime_ns)
+            # 变短、已同步部分的末尾变了，或大小不变但修改时间变了(等长改写)
+            generation += 1
+        else:
+            generation = 0
+
+        # 首次同步或文件被改写: 重建表，维度表随事实表一起重建，旧文件的维度行不保留
+        names, header_bytes = csv_header(csv_path)
+        conn.execute(f'DROP TABLE IF EXISTS {name}')
+        if name in DIMENSIONS:
+            conn.execute(f'DROP TABLE IF EXISTS {DIMENSIONS[name][0]}_dim')
+        conn.execute(
+            'INSERT OR REPLACE INTO _sources VALUES (?, ?, ?, ?, ?, 0, NULL)',
+            (name, ','.join(names), header_bytes, prefix_checksum(csv_path, header_bytes), generation))
+        added = self._insert_chunks(conn, name, names, header_bytes, stat.st_mtime_ns)
+        for cols in INDEXES.get(name, []):
+            conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{name}_{'_'.join(cols)} ON {name} ({', '.join(cols)})")
+        conn.execute('ANALYZE')
+        return added
+
+    def _insert_chunks(self, conn, name, names, offset, mtime_ns):
+        """从 offset 开始逐块写入，记录读取时文件的修改时间，返回写入行数"""
+        csv_path = self._csv_path(name)
+        added = 0
+        for chunk, end in iter_csv_chunks(csv_path, names, offset, self.chunk_bytes):
+            chunk, dimension = split_dimension(name, chunk)
+            self._create_tables(conn, name, chunk, dimension)
+            placeholders = ', '.join('?' * len(chunk.columns))
+            conn.executemany(f'INSERT INTO {name} VALUES ({placeholders})', _to_rows(chunk))
+            if dimension is not None:
+                key = DIMENSIONS[name][0]
+                dim_rows = _to_rows(dimension.reset_index())
+                placeholders = ', '.join('?' * (len(dimension.columns) + 1))
+                conn.executemany(f'INSERT OR REPLACE INTO {key}_dim VALUES ({placeholders})', dim_rows)
+            added += len(chunk)
+            offset = end
+        conn.execute(
+            'UPDATE _sources SET byte_offset = ?, prefix_crc = ?, row_count = row_count + ?, mtime_ns = ? '
+            'WHERE name = ?',
+            (offset, prefix_checksum(csv_path, offset), added, mtime_ns, name))
+        return added
+
+    @staticmethod
+    def _create_tables(conn, name, chunk, dimension):
+        columns = ', '.join(f'{col} {_sql_type(chunk[col].dtype)}' for col in chunk.columns)
+        conn.execute(f'CREATE TABLE IF NOT EXISTS {name} ({columns})')
+        if dimension is not None:
+            key = DIMENSIONS[name][0]
+            attributes = ', '.join(f'{col} {_sql_type(dimension[col].dtype)}' for col in dimension.columns)
+            conn.execute(f'CREATE TABLE IF NOT EXISTS {key}_dim ({key} TEXT PRIMARY KEY, {attributes})')
+
+    # ========== 版本 ==========
+    @property
+    def loaded(self):
+        return bool(self._versions)
+
+    @property
+    def version(self):
+        return tuple(self._versions[name] for name in self.sources if name in self._versions)
+
+    def source_version(self, name):
+        return self._versions[name]
+
+    # ========== 查询 ==========
+    def overview(self):
+        conn = self._connect()
+        min_date, max_date, rows = conn.execute('SELECT MIN(date), MAX(date), COUNT(*) FROM sales').fetchone()
+        # 按首次出现的顺序，与内存后端一致
+        countries = [r[0] for r in conn.execute('SELECT country FROM sales GROUP BY country ORDER BY MIN(rowid)')]
+        categories = [r[0] for r in conn.execute('SELECT category FROM sales GROUP BY category ORDER BY MIN(rowid)')]
+        return {
+            'min_date': pd.Timestamp(min_date),
+            'max_date': pd.Timestamp(max_date),
+            'rows': rows,
+            'countries': countries,
+            'categories': categories,
+        }
+
+    def by(self, axis, start=None, end=None, countries=None, categories=None):
+        if axis not in ('date', 'country', 'category'):
+            raise ValueError(f'不支持的汇总维度: {axis}')
+        where, params = where_clause(start, end, countries, categories)
+        order = 'date' if axis == 'date' else 'MIN(rowid)'
+        result = self.query(
+            f'SELECT {axis}, SUM(sales_amount) AS sales_amount, SUM(orders) AS orders, '
+            f'SUM(visitors) AS visitors, COUNT(*) AS "rows" FROM sales{where} '
+            f'GROUP BY {axis} ORDER BY {order}', params)
+        if axis == 'date':
+            result['date'] = pd.to_datetime(result['date'])
+        return result.set_index(axis)[MEASURES].astype(float)
+
+    def daily_series(self, measure='sales_amount'):
+        if measure not in MEASURES:
+            raise ValueError(f'不支持的汇总指标: {measure}')
+        value = 'COUNT(*)' if measure == 'rows' else f'SUM({measure})'
+        cells = self.query(
+            f'SELECT date, country, category, {value} AS value FROM sales GROUP BY date, country, category')
+        cells['date'] = pd.to_datetime(cells['date'])
+        return cells.pivot_table(index='date', columns=['country', 'category'], values='value',
+                                 aggfunc='sum', fill_value=0).astype(float)
+
+    def select(self, name, start=None, end=None, countries=None, categories=None):
+        where, params = where_clause(start, end, countries, categories)
+        return apply_column_types(self.query(f'SELECT * FROM {name}{where} ORDER BY rowid', params))
+
+    def top_products(self, k=20, start=None, end=None, countries=None, categories=None):
+        where, params = where_clause(start, end, countries, categories)
+        return self.query(
+            f'SELECT category, product, SUM(sales_amount) AS sales_amount FROM product{where} '
+            f'GROUP BY category, product ORDER BY sales_amount DESC LIMIT ?', params + [int(k)])
+
+    def category_top(self, category, k=5):
+        return self.query(
+            'SELECT product, SUM(sales_amount) AS sales_amount FROM product WHERE category = ? '
+            'GROUP BY product ORDER BY sales_amount DESC LIMIT ?', (str(category), int(k)))
+
+    def product_summary(self, product):
+        """产品维度表每个产品表版本只用一次分组查询生成，之后是字典查找"""
+        summary = self._dimension().get(product)
+        return None if summary is None else dict(summary)
+
+    def _dimension(self):
+        version = self._versions.get('product')
+        with self._dimension_lock:
+            if self._product_dimension is None or self._product_dimension[0] != version:
+                table = self.query(
+                    'SELECT product, MIN(category) AS category, AVG(price) AS avg_price, '
+                    'SUM(sales_amount) AS total_sales, SUM(units_sold) AS units, '
+                    'SUM(sales_amount * profit_margin) AS profit FROM product GROUP BY product ORDER BY MIN(rowid)')
+                ranks = np.empty(len(table), dtype=np.int64)
+                ranks[np.argsort(-table['total_sales'].to_numpy(dtype=float), kind='stable')] = np.arange(1, len(table) + 1)
+                dimension = {
+                    row.product: {
+                        'category': row.category,
+                        'avg_price': row.avg_price,
+                        'total_sales': row.total_sales,
+                        'units': int(row.units),
+                        'margin': row.profit / row.total_sales if row.total_sales else float('nan'),
+                        'rank': int(rank),
+                    }
+                    for row, rank in zip(table.itertuples(index=False), ranks)
+                }
+                self._product_dimension = (version, dimension)
+            return self._product_dimension[1]
+
+    def product_rows(self, product):
+        return apply_column_types(self.query(
+            'SELECT * FROM product WHERE product = ? ORDER BY rowid', (str(product),)))
+
+    def ab_analyzer(self):
+        """变体合计与每日趋势都在数据库中汇总，样本标准差由平方和计算"""
+        totals = self.query(
+            'SELECT experiment, variant, SUM(visitors) AS total_visitors, '
+            'SUM(conversions) AS total_conversions, SUM(revenue) AS total_revenue, '
+            'AVG(conversion_rate) AS avg_conversion, COUNT(*) AS n, '
+            'SUM(conversion_rate * conversion_rate) AS sum_sq '
+            'FROM ab GROUP BY experiment, variant ORDER BY MIN(rowid)')
+        n = totals.pop('n').to_numpy(dtype=float)
+        sum_sq = totals.pop('sum_sq').to_numpy(dtype=float)
+        mean = totals['avg_conversion'].to_numpy(dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variance = np.where(n > 1, (sum_sq - n * mean * mean) / (n - 1), np.nan)
+        totals['std_conversion'] = np.sqrt(np.maximum(variance, 0))
+        daily = apply_column_types(self.query(
+            'SELECT experiment, variant, date, AVG(conversion_rate) AS conversion_rate, '
+            'SUM(revenue) AS revenue FROM ab GROUP BY experiment, variant, date '
+            'ORDER BY experiment, variant, date'))
+        return ABTestAnalyzer.from_aggregates(totals, daily)
+
+    def sequential_ab(self):
+        """每次只读取上次之后新写入的A/B行(按 rowid)并入检验状态，A/B表重建时从头累计"""
+        generation = self._versions['ab'][0]
+        with self._sequential_lock:
+            if self._sequential is None or self._sequential[0] != generation:
+                self._sequential = (generation, 0, SequentialABTest())
+            _, last_rowid, sequential = self._sequential
+            rows = self.query(
+                'SELECT rowid AS row_id, experiment, variant, date, visitors, conversions, revenue '
+                'FROM ab WHERE rowid > ? ORDER BY rowid', (last_rowid,))
+            if not rows.empty:
+                self._sequential = (generation, int(rows['row_id'].max()), sequential)
+                sequential.add(apply_column_types(rows.drop(columns='row_id')))
+        return sequential
+
+    def elasticity_data(self):
+        return apply_column_types(self.query('SELECT * FROM elasticity ORDER BY rowid'))
+
+    def dimension(self, name):
+        """数据源拆出的维度表，没有时为 None"""
+        if name not in DIMENSIONS:
+            return None
+        key = DIMENSIONS[name][0]
+        return self.query(f'SELECT * FROM {key}_dim ORDER BY {key}').set_index(key)
@@ -0,0 +1,400 @@
+"""
+列式数据存储
+把CSV数据文件按列转换为 .npy 文件，冷启动时通过内存映射读取，CSV发生变化时自动同步。
+读取后的各列(分类列为其编码)直接引用映射的文件页(零拷贝、只读)，进程内各会话共用同一份数据，
+多个服务进程映射同一文件时共享操作系统的页缓存。
+列文件预留容量: CSV只在末尾追加时只解析新增的行，写入列文件末尾的空位，已映射的部分不动；
+容量用完时按倍数扩容重写，摊还后每行的代价是常数。CSV被改写或截断时整体重建
+"""
+import contextlib
+import io
+import json
+import mmap
+import os
+import uuid
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from warroom.schema import SCHEMA_VERSION, apply_column_types
+
+try:
+    import fcntl
+except ImportError:  # 非POSIX平台不加进程间文件锁
+    fcntl = None
+
+# ========== 数据源定义 ==========
+DATA_SOURCES = {
+    'sales': 'test_sales_data.csv',
+    'product': 'test_product_data.csv',
+    'ab': 'test_ab_data.csv',
+    'elasticity': 'test_elasticity_data.csv',
+}
+
+STORE_DIR = '.data_store'
+
+# 列式文件布局，变化时重建: 3 为每列一个预留容量的 .npy 文件(可零拷贝读取、原地追加)
+STORE_FORMAT = 3
+
+# 列文件的最小容量(行)；写入时容量取所需行数的 GROWTH_FACTOR 倍，未写入的部分是稀疏文件的空洞
+MIN_CAPACITY = 1024
+GROWTH_FACTOR = 2
+
+# 校验已转换前缀时读取的末尾字节数
+PREFIX_CHECK_BYTES = 4096
+
+# 流式读取时每块的字节数
+CHUNK_BYTES = 16 * 1024 * 1024
+
+
+def source_fingerprint(csv_path):
+    """CSV文件指纹: 大小 + 修改时间"""
+    stat = os.stat(csv_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def unmapped_columns(frame):
+    """数据不在内存映射文件上的列(分类列看编码)，全部为映射视图时返回空列表"""
+    unmapped = []
+    for col in frame.columns:
+        series = frame[col]
+        # Series.cat.codes 会复制编码，直接取分类数组上的编码视图
+        values = series.array.codes if isinstance(series.dtype, pd.CategoricalDtype) else series.to_numpy()
+        # 沿 base 一直找到底层缓冲区；复制出来的数组可能仍是 np.memmap 类型，要看是不是 mmap 对象
+        while isinstance(values, np.ndarray):
+            values = values.base
+        if not isinstance(values, mmap.mmap):
+            unmapped.append(col)
+    return unmapped
+
+
+def codes_dtype(categories):
+    """pandas 为这么多类别选用的编码类型；编码按此类型存放，读取时才不需要转换"""
+    return pd.Categorical([], categories=categories).codes.dtype
+
+
+def _fits(values, dtype):
+    """新数据能否无损写入已有类型的列"""
+    if values.dtype == dtype or (values.dtype.kind == 'M' and dtype.kind == 'M'):
+        return True
+    if dtype.kind == 'f':
+        return values.dtype.kind in 'iuf'
+    if dtype.kind in 'iu' and values.dtype.kind in 'iu':
+        info = np.iinfo(dtype)
+        return len(values) == 0 or (values.min() >= info.min and values.max() <= info.max)
+    return False
+
+
+def encode_columns(frame, manifest=None):
+    """数据帧转为 ({列: 数组}, 列布局 {'dtypes', 'categories', 'objects'})
+
+    数值列和日期列原样存放；分类列(以及其他字符串列，记在 objects 中)存编码，
+    类别列表只在末尾追加新值，已有的编码不变。manifest 为追加时已有的清单，
+    新数据无法无损写入已有的列类型时返回 (None, None)
+    """
+    dtypes = dict(manifest['dtypes']) if manifest else {}
+    categories = {col: list(values) for col, values in manifest['categories'].items()} if manifest else {}
+    objects = list(manifest['objects']) if manifest else []
+    arrays = {}
+    for col in frame.columns:
+        column = frame[col]
+        if manifest is None:
+            encoded = not (pd.api.types.is_numeric_dtype(column.dtype) or pd.api.types.is_datetime64_dtype(column.dtype))
+        else:
+            encoded = col in categories
+        if not encoded:
+            values = column.to_numpy()
+            if manifest is None:
+                dtypes[col] = values.dtype.str
+            elif not _fits(values, np.dtype(dtypes[col])):
+                return None, None
+            arrays[col] = values
+            continue
+        if not isinstance(column.dtype, pd.CategoricalDtype):
+            if manifest is None:
+                objects.append(col)
+            column = column.astype('category')
+        known = categories.setdefault(col, [])
+        seen = set(known)
+        known.extend(v for v in column.cat.categories.tolist() if v not in seen)
+        dtype = codes_dtype(known)
+        arrays[col] = pd.Categorical(column, categories=known).codes.astype(dtype, copy=False)
+        dtypes[col] = dtype.str
+    return arrays, {'dtypes': dtypes, 'categories': categories, 'objects': objects}
+
+
+def _capacity(rows):
+    return max(MIN_CAPACITY, rows * GROWTH_FACTOR)
+
+
+def prefix_checksum(csv_path, offset):
+    """文件前 offset 字节中最后一段的校验和，用来判断文件是否只是在末尾追加"""
+    start = max(0, offset - PREFIX_CHECK_BYTES)
+    with open(csv_path, 'rb') as f:
+        f.seek(start)
+        return zlib.crc32(f.read(offset - start))
+
+
+def read_complete_lines(csv_path, start=0):
+    """读取 start 之后的完整行，末尾写了一半的行留到下次读取
+
+    返回 (字节内容, 读到的文件偏移)
+    """
+    with open(csv_path, 'rb') as f:
+        f.seek(start)
+        data = f.read()
+    end = data.rfind(b'\n') + 1
+    return data[:end], start + end
+
+
+def csv_header(csv_path):
+    """CSV表头，返回 (列名列表, 表头行的字节数)"""
+    with open(csv_path, 'rb') as f:
+        header = f.readline()
+    return list(pd.read_csv(io.BytesIO(header)).columns), len(header)
+
+
+def iter_csv_chunks(csv_path, names, start, chunk_bytes=CHUNK_BYTES):
+    """从 start 开始按字节块流式解析CSV数据行，每块在完整行处截断
+
+    逐块 yield (已设置列类型的数据块, 该块结束处的文件偏移)，内存占用只与块大小有关；
+    末尾写了一半的行不解析
+    """
+    with open(csv_path, 'rb') as f:
+        f.seek(start)
+        offset, tail = start, b''
+        while True:
+            block = f.read(chunk_bytes)
+            if not block:
+                break
+            data = tail + block
+            end = data.rfind(b'\n') + 1
+            data, tail = data[:end], data[end:]
+            if not data:
+                continue
+            offset += len(data)
+            chunk = pd.read_csv(io.BytesIO(data), header=None, names=names)
+            yield apply_column_types(chunk), offset
+
+
+class ColumnarStore:
+    """列式存储，每个数据源一个清单文件加每列一个 .npy 文件
+
+    同一存储目录可以由多个进程共用，写入和读取映射都在数据源的文件锁内进行
+    """
+
+    def __init__(self, store_dir=STORE_DIR, base_dir='.'):
+        self.store_dir = store_dir
+        self.base_dir = base_dir
+        # 最近一次读取结果为内存映射(零拷贝)的数据源
+        self.mapped = set()
+        # 数据源 -> (文件标记, {列: 整个容量的只读映射})；原地追加的行通过同一映射可见
+        self._maps = {}
+
+    def _csv_path(self, name):
+        return os.path.join(self.base_dir, DATA_SOURCES[name])
+
+    def _column_path(self, name, token, i):
+        return os.path.join(self.store_dir, f'{name}.{token}.{i}.npy')
+
+    def _manifest_path(self, name):
+        return os.path.join(self.store_dir, f'{name}.json')
+
+    @contextlib.contextmanager
+    def _locked(self, name):
+        """数据源的进程间文件锁(同一进程的不同线程各自打开锁文件，同样互斥)"""
+        os.makedirs(self.store_dir, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.store_dir, f'{name}.lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_manifest(self, name):
+        try:
+            with open(self._manifest_path(name), encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_manifest(self, name, manifest):
+        tmp_path = self._manifest_path(name) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, self._manifest_path(name))
+
+    def _has_current_schema(self, manifest, name):
+        return (manifest is not None
+                and manifest.get('schema_version') == SCHEMA_VERSION
+                and manifest.get('store_format') == STORE_FORMAT
+                and all(os.path.exists(self._column_path(name, manifest['token'], i))
+                        for i in range(len(manifest['columns']))))
+
+    def is_fresh(self, name):
+        """列式文件存在、按当前模式写出且与当前CSV指纹一致"""
+        manifest = self._read_manifest(name)
+        if not self._has_current_schema(manifest, name):
+            return False
+        csv_path = self._csv_path(name)
+        if not os.path.exists(csv_path):
+            # CSV已被移走时直接使用已有的列式文件
+            return True
+        return manifest['fingerprint'] == source_fingerprint(csv_path)
+
+    # ========== 写入 ==========
+    def build(self, name):
+        """从CSV重建列式文件，返回映射读取的完整数据"""
+        with self._locked(name):
+            return self._read_mapped(name, self._build(name))
+
+    def _build(self, name):
+        csv_path = self._csv_path(name)
+        fingerprint = source_fingerprint(csv_path)
+        data, covered = read_complete_lines(csv_path)
+        frame = apply_column_types(pd.read_csv(io.BytesIO(data)))
+        arrays, layout = encode_columns(frame)
+        manifest = {
+            'source': DATA_SOURCES[name],
+            'schema_version': SCHEMA_VERSION,
+            'store_format': STORE_FORMAT,
+            'fingerprint': fingerprint,
+            'covered_bytes': covered,
+            'prefix_crc': prefix_checksum(csv_path, covered),
+            'rows': len(frame),
+            'columns': list(frame.columns),
+            **layout,
+        }
+        # 解析出的数据写入列文件后随即释放，调用方改为映射读取
+        return self._write_columns(name, manifest, {col: [arrays[col]] for col in frame.columns},
+                                   _capacity(len(frame)))
+
+    def _append(self, name, manifest):
+        """把CSV中已覆盖部分之后新增的完整行写入列文件末尾的空位，返回新的清单"""
+        csv_path = self._csv_path(name)
+        data, covered = read_complete_lines(csv_path, manifest['covered_bytes'])
+        if not data:
+            return manifest
+        new_rows = apply_column_types(pd.read_csv(io.BytesIO(data), header=None, names=manifest['columns']))
+        arrays, layout = encode_columns(new_rows, manifest)
+        if arrays is None:
+            # 新数据无法无损写入已有的列类型(如计数列出现缺失值)，整体重建
+            return self._build(name)
+
+        start = manifest['rows']
+        updated = {
+            **manifest,
+            **layout,
+            'fingerprint': source_fingerprint(csv_path),
+            'covered_bytes': covered,
+            'prefix_crc': prefix_checksum(csv_path, covered),
+            'rows': start + len(new_rows),
+        }
+        if updated['rows'] > manifest['capacity'] or layout['dtypes'] != manifest['dtypes']:
+            # 容量用完，或类别增多后编码需要更宽的类型: 按倍数扩容重写，已有的行从映射直接复制
+            old = self._open_columns(name, manifest)
+            parts = {col: [old[col][:start], arrays[col]] for col in manifest['columns']}
+            return self._write_columns(name, updated, parts, _capacity(updated['rows']))
+
+        # 先写数据再替换清单，其他进程在清单替换前只会读到原来的行数
+        for i, col in enumerate(manifest['columns']):
+            column = np.load(self._column_path(name, manifest['token'], i), mmap_mode='r+')
+            column[start:updated['rows']] = arrays[col]
+            column.flush()
+            del column
+        self._write_manifest(name, updated)
+        return updated
+
+    def _write_columns(self, name, manifest, parts, capacity):
+        """把各列写入一组新的列文件(预留 capacity 行)并替换清单，parts 为 {列: [依次写入的数组]}"""
+        token = uuid.uuid4().hex[:12]
+        for i, col in enumerate(manifest['columns']):
+            column = np.lib.format.open_memmap(
+                self._column_path(name, token, i), mode='w+', dtype=np.dtype(manifest['dtypes'][col]),
+                shape=(capacity,))
+            start = 0
+            for values in parts[col]:
+                column[start:start + len(values)] = values
+                start += len(values)
+            column.flush()
+            del column
+        manifest = {**manifest, 'token': token, 'capacity': capacity}
+        self._write_manifest(name, manifest)
+        self._remove_stale(name, token)
+        return manifest
+
+    def _remove_stale(self, name, token):
+        """删除旧的列文件(含旧格式的 .feather)；已映射旧文件的进程仍可继续读取"""
+        for file in os.listdir(self.store_dir):
+            if (file.startswith(f'{name}.') and file.endswith(('.npy', '.feather'))
+                    and not file.startswith(f'{name}.{token}.')):
+                try:
+                    os.remove(os.path.join(self.store_dir, file))
+                except OSError:
+                    pass
+
+    def _sync(self, name):
+        """把列式文件同步到CSV当前的完整行，返回清单
+
+        CSV只在末尾追加时只写入新增的行，其他变化(改写、截断)则重建；
+        CSV已被移走时继续使用已有的列式文件
+        """
+        manifest = self._read_manifest(name)
+        current = self._has_current_schema(manifest, name)
+        csv_path = self._csv_path(name)
+        if current and not os.path.exists(csv_path):
+            return manifest
+        if current:
+            covered = manifest['covered_bytes']
+            size = os.path.getsize(csv_path)
+            if size >= covered and prefix_checksum(csv_path, covered) == manifest['prefix_crc']:
+                return self._append(name, manifest) if size > covered else manifest
+        return self._build(name)
+
+    # ========== 读取 ==========
+    def _open_columns(self, name, manifest):
+        cached = self._maps.get(name)
+        if cached is None or cached[0] != manifest['token']:
+            cached = self._maps[name] = (manifest['token'], {
+                col: np.load(self._column_path(name, manifest['token'], i), mmap_mode='r')
+                for i, col in enumerate(manifest['columns'])
+            })
+        return cached[1]
+
+    def _read_mapped(self, name, manifest, columns=None):
+        """内存映射读取清单中的行，各列都是映射的只读视图，修改时由pandas写时复制"""
+        mapped = self._open_columns(name, manifest)
+        rows = manifest['rows']
+        data = {}
+        for col in columns or manifest['columns']:
+            values = mapped[col][:rows]
+            if col in manifest['categories']:
+                values = pd.Categorical.from_codes(values, categories=manifest['categories'][col], validate=False)
+                if col in manifest['objects']:
+                    values = values.astype(object)
+            data[col] = values
+        self.mapped.add(name)
+        return pd.DataFrame(data, copy=False)
+
+    def load(self, name, columns=None):
+        """读取一个数据源，columns 为需要的列(列投影)"""
+        with self._locked(name):
+            return self._read_mapped(name, self._sync(name), columns)
+
+    def load_prefix(self, name):
+        """读取与CSV同步后的列式文件及其覆盖到的CSV字节偏移
+
+        追加的行已写入列式文件，调用方只需要处理同步之后才写到一半的行
+        """
+        with self._locked(name):
+            manifest = self._sync(name)
+            return self._read_mapped(name, manifest), manifest['covered_bytes']
+
+    def load_all(self, columns=None):
+        """按 DATA_SOURCES 顺序读取全部数据源，columns 为 {名称: 列列表}"""
+        columns = columns or {}
+        return tuple(self.load(name, columns.get(name)) for name in DATA_SOURCES)
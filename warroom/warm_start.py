@@ -0,0 +1,179 @@
+"""
+预热快照
+把默认视图(最近7天、前三个国家和品类)的结果连同数据指纹保存到本地磁盘。
+进程启动时指纹与数据文件一致则直接用快照回答首屏，数据在后台线程加载；
+数据文件变化后快照失效，在后台线程重新生成
+"""
+import hashlib
+import os
+import pickle
+import threading
+import time
+
+from warroom.engine import default_filter, hot_products, sales_rank
+from warroom.result_cache import normalize_filter
+from warroom.schema import SCHEMA_VERSION
+from warroom.store import DATA_SOURCES, STORE_DIR, prefix_checksum, source_fingerprint
+
+WARM_START_PATH = os.path.join(STORE_DIR, 'warm_start.pkl')
+
+# 快照内容(结果名称或格式)变化时递增，旧快照随之失效
+WARM_START_VERSION = 1
+
+
+def snapshot_fingerprint(base_dir='.', sources=None):
+    """快照的数据指纹: 各CSV的文件指纹(大小、修改时间)加末尾校验和的摘要，不读取整个文件
+
+    任何数据文件不存在时返回 None
+    """
+    digest = hashlib.sha1(f'{SCHEMA_VERSION}:{WARM_START_VERSION}'.encode())
+    for name in sources or DATA_SOURCES:
+        path = os.path.join(base_dir, DATA_SOURCES[name])
+        try:
+            stat = source_fingerprint(path)
+            digest.update(f"{name}:{stat['size']}:{stat['mtime_ns']}:{prefix_checksum(path, stat['size'])}".encode())
+        except FileNotFoundError:
+            return None
+    return digest.hexdigest()
+
+
+def default_view_entries(backend):
+    """默认视图的结果 {(结果名称, 参数): 结果}，名称和参数与 app.py 中 cached 的调用一致"""
+    overview = backend.overview()
+    filter_args = default_filter(overview)
+    filter_key = normalize_filter(**filter_args)
+    return {
+        ('overview', ()): overview,
+        ('daily_totals', filter_key): backend.by('date', **filter_args),
+        ('country_rank', filter_key): sales_rank(backend, 'country', **filter_args),
+        ('product_rank', filter_key): backend.top_products(20, **filter_args),
+        ('top_products', ()): hot_products(backend),
+        ('ab_analyzer', ()): backend.ab_analyzer().compact(),
+    }
+
+
+class DeferredBackend:
+    """后台加载期间代替数据后端: 访问任何属性都等待加载完成
+
+    快照里有的结果不会走到这里，快照之外的查询等到数据加载完再回答
+    """
+
+    def __init__(self, backend, ready, errors):
+        self._backend = backend
+        self._ready = ready
+        self._errors = errors
+
+    def __getattr__(self, name):
+        self._ready.wait()
+        if self._errors:
+            raise self._errors[0]
+        return getattr(self._backend, name)
+
+
+class WarmStart:
+    """预热快照的读取、后台加载和后台重建(进程内共用一个实例)"""
+
+    def __init__(self, path=WARM_START_PATH, base_dir='.'):
+        self.path = path
+        self.base_dir = base_dir
+        self.snapshot = None       # {'fingerprint', 'data_version', 'entries', 'created', 'seconds'}
+        self.saved_fingerprint = None
+        self.rebuilds = 0
+        self._ready = threading.Event()
+        self._errors = []
+        self._loader = None
+        self._rebuilder = None
+        self._lock = threading.Lock()
+        self._read()
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def _read(self):
+        """读取磁盘上的快照，指纹与当前数据文件一致才采用"""
+        if not self.enabled or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                snapshot = pickle.load(f)
+        except Exception as e:
+            print(f"⚠️ 预热快照无法读取，将重新生成: {e}")
+            return
+        self.saved_fingerprint = snapshot.get('fingerprint')
+        if self.saved_fingerprint is not None and self.saved_fingerprint == snapshot_fingerprint(self.base_dir):
+            self.snapshot = snapshot
+
+    def seed(self, result_cache):
+        """把快照中的结果放进结果缓存，键的数据版本为生成快照时的版本"""
+        if self.snapshot is None:
+            return 0
+        version = self.snapshot['data_version']
+        for (name, params), value in self.snapshot['entries'].items():
+            result_cache.put(name, version, params, value)
+        return len(self.snapshot['entries'])
+
+    # ========== 后台加载 ==========
+    def load_in_background(self, backend):
+        """在后台线程完成数据后端的首次加载(只启动一次)，返回加载期间使用的代理后端"""
+        with self._lock:
+            if self._loader is None:
+                def load():
+                    try:
+                        backend.refresh()
+                    except Exception as e:
+                        self._errors.append(e)
+                    finally:
+                        self._ready.set()
+                self._loader = threading.Thread(target=load, name='warroom-warm-load', daemon=True)
+                self._loader.start()
+        return DeferredBackend(backend, self._ready, self._errors)
+
+    @property
+    def loading(self):
+        """后台加载已启动但尚未完成"""
+        return self._loader is not None and not self._ready.is_set()
+
+    # ========== 后台重建 ==========
+    def ensure_current(self, backend, fingerprint):
+        """快照与 fingerprint(刷新数据之前取得的指纹)不一致时在后台重建
+
+        指纹先于数据刷新取得，快照里的数据不会比指纹描述的文件旧；
+        文件在两者之间又有变化时，下次启动指纹不一致，快照只会失效而不会被误用
+        """
+        if not self.enabled or fingerprint is None or fingerprint == self.saved_fingerprint:
+            return False
+        with self._lock:
+            if self._rebuilder is not None and self._rebuilder.is_alive():
+                return False
+            self._rebuilder = threading.Thread(
+                target=self._rebuild, args=(backend, fingerprint), name='warroom-warm-rebuild', daemon=True)
+            self._rebuilder.start()
+        return True
+
+    def _rebuild(self, backend, fingerprint):
+        started = time.perf_counter()
+        try:
+            data_version = backend.version
+            entries = default_view_entries(backend)
+            snapshot = {
+                'fingerprint': fingerprint,
+                'data_version': data_version,
+                'entries': entries,
+                'created': time.time(),
+                'seconds': time.perf_counter() - started,
+            }
+            self._write(snapshot)
+            self.saved_fingerprint = fingerprint
+            self.rebuilds += 1
+            print(f"🔥 预热快照已更新 ({snapshot['seconds']:.2f} 秒, {len(entries)} 项)")
+        except Exception as e:
+            print(f"⚠️ 预热快照生成失败: {e}")
+
+    def _write(self, snapshot):
+        """先写临时文件再替换，读取方不会看到写了一半的快照"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)